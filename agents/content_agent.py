@@ -1,4 +1,4 @@
-from typing import Any, Dict
+from typing import Any, Awaitable, Callable, Dict, Optional
 
 from llm.client import LLMClient
 
@@ -7,19 +7,24 @@ class ContentAgent:
     def __init__(self) -> None:
         self.client = LLMClient()
 
-    async def generate(self, task: Dict[str, Any], plan: Dict[str, Any]) -> Dict[str, Any]:
+    async def generate(
+        self,
+        task: Dict[str, Any],
+        plan: Dict[str, Any],
+        on_delta: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+    ) -> Dict[str, Any]:
+        """传入 on_delta 时改为流式生成，每收到一个分片回调一次（见 LLMClient.astream）。"""
         payload = task.get("payload", {})
         messages = [
             {"role": "system", "content": "You are ContentAgent. Generate article/script/marketing copy."},
             {"role": "user", "content": f"Write content for topic={payload.get('topic')} with style={payload.get('style')}."},
             {"role": "user", "content": f"Plan summary: {plan.get('summary', '')}"},
         ]
-        res = await self.client.chat(messages)
+        content = await self.client.complete_text(messages, on_delta=on_delta)
         return {
             "title": f"{payload.get('topic', 'Untitled')} - Draft",
-            "body": res["content"],
+            "body": content,
             "tags": [payload.get("platform", "generic")],
             "schema": "content.draft.v1",
         }
 
-
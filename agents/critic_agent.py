@@ -1,4 +1,4 @@
-from typing import Any, Dict
+from typing import Any, Awaitable, Callable, Dict, Optional
 
 from llm.client import LLMClient
 
@@ -7,17 +7,23 @@ class CriticAgent:
     def __init__(self) -> None:
         self.client = LLMClient()
 
-    async def refine(self, task: Dict[str, Any], draft: Dict[str, Any]) -> Dict[str, Any]:
+    async def refine(
+        self,
+        task: Dict[str, Any],
+        draft: Dict[str, Any],
+        on_delta: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+    ) -> Dict[str, Any]:
+        """传入 on_delta 时改为流式生成，每收到一个分片回调一次（见 LLMClient.astream）。"""
         payload = task.get("payload", {})
         messages = [
             {"role": "system", "content": "You are CriticAgent. Proofread and improve tone/style."},
             {"role": "user", "content": f"Refine the content for platform={payload.get('platform')}"},
             {"role": "user", "content": f"Draft: {draft.get('body', '')}"},
         ]
-        res = await self.client.chat(messages)
+        content = await self.client.complete_text(messages, on_delta=on_delta)
         return {
             "title": draft.get("title", "Refined"),
-            "body": res["content"],
+            "body": content,
             "tags": draft.get("tags", []),
             "schema": "content.refined.v1",
         }
@@ -1,24 +1,34 @@
 from typing import Any, Dict
 
+# 各平台正文长度上限（字符）；未列出的平台不截断
+PLATFORM_LIMITS = {"twitter": 280, "weibo": 2000, "xiaohongshu": 1000, "linkedin": 3000}
+
 
 class ExecutionAgent:
     def __init__(self) -> None:
         self._published = {}
 
+    def adapt(self, content: Dict[str, Any], platform: str) -> Dict[str, Any]:
+        """按平台规则改写精修稿（长度上限、平台标签），多平台分发时每个平台一份，不再调用 LLM。"""
+        body = content.get("body", "")
+        limit = PLATFORM_LIMITS.get(platform)
+        if limit is not None and len(body) > limit:
+            body = body[: limit - 1].rstrip() + "…"
+        tags = [platform] + [tag for tag in content.get("tags", []) if tag != platform and tag not in PLATFORM_LIMITS]
+        return {**content, "body": body, "tags": tags, "platform": platform, "schema": "content.adapted.v1"}
+
     async def publish(self, task: Dict[str, Any], content: Dict[str, Any]) -> Dict[str, Any]:
         task_id = task["task_id"]
+        platform = task.get("payload", {}).get("platform", "mock")
         result = {
-            "platform": task.get("payload", {}).get("platform", "mock"),
+            "platform": platform,
             "post_id": f"mock-{task_id}",
             "status": "posted",
             "schema": "publish.result.v1",
         }
-        self._published[task_id] = result
+        self._published[(task_id, platform)] = result
         return result
 
     async def rollback(self, task: Dict[str, Any]) -> None:
-        task_id = task["task_id"]
-        if task_id in self._published:
-            del self._published[task_id]
-
-
+        # 同一任务可能发布到多个平台，只回滚当前平台
+        self._published.pop((task["task_id"], task.get("payload", {}).get("platform", "mock")), None)
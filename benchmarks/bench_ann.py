@@ -0,0 +1,80 @@
+"""
+ANN 召回率-延迟曲线：以 SimpleVectorStore 精确结果为基准，扫描 IVF 的 nprobe 与 HNSW 的 ef。
+数据为高斯混合簇（更接近真实嵌入的分布），hnswlib / faiss-cpu 未安装时跳过 HNSW。
+
+    python -m benchmarks.bench_ann --size 100000 --dim 128 --queries 200
+"""
+import argparse
+import time
+from typing import Any, Callable, List
+
+import numpy as np
+
+from vectorstore.ann import HNSWVectorStore, IVFVectorStore
+from vectorstore.memory import SimpleVectorStore
+
+
+def _clustered(rng: np.random.Generator, n: int, centers: np.ndarray) -> np.ndarray:
+    clusters, dim = centers.shape
+    return centers[rng.integers(0, clusters, n)] + 1.0 * rng.standard_normal((n, dim), dtype=np.float32)
+
+
+def _ids(results: List[List[dict]]) -> List[set]:
+    return [{r["meta"]["id"] for r in res} for res in results]
+
+
+def _measure(query: Callable[[], Any], truth: List[set], top_k: int, queries: int) -> str:
+    start = time.perf_counter()
+    found = _ids(query())
+    per_query = (time.perf_counter() - start) / queries * 1000
+    recall = sum(len(f & t) for f, t in zip(found, truth)) / (top_k * queries)
+    return f"recall@{top_k} {recall:6.3f}  {per_query:8.3f} ms/q"
+
+
+def _build(store: Any, data: np.ndarray, metas: List[dict]) -> float:
+    start = time.perf_counter()
+    for offset in range(0, len(data), 50_000):
+        store.add_many(data[offset : offset + 50_000], metas[offset : offset + 50_000])
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--ef", type=int, nargs="+", default=[16, 64, 256])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((max(1, args.size // 100), args.dim), dtype=np.float32)
+    data = _clustered(rng, args.size, centers)
+    queries = _clustered(rng, args.queries, centers)
+    metas = [{"id": i} for i in range(args.size)]
+
+    exact = SimpleVectorStore(dim=args.dim)
+    print(f"exact  build {_build(exact, data, metas):7.2f}s")
+    start = time.perf_counter()
+    truth = _ids(exact.query_many(queries, top_k=args.top_k))
+    print(f"exact  {(time.perf_counter() - start) / args.queries * 1000:8.3f} ms/q (query_many)")
+
+    ivf = IVFVectorStore(dim=args.dim, nlist=args.nlist)
+    print(f"ivf    build {_build(ivf, data, metas):7.2f}s  (nlist={args.nlist})")
+    for nprobe in args.nprobe:
+        print(f"ivf    nprobe={nprobe:<4} " + _measure(lambda: ivf.query_many(queries, args.top_k, nprobe=nprobe), truth, args.top_k, args.queries))
+
+    try:
+        hnsw = HNSWVectorStore(dim=args.dim)
+    except RuntimeError as exc:
+        print(f"hnsw   skipped: {exc}")
+        return
+    print(f"hnsw   build {_build(hnsw, data, metas):7.2f}s  (backend={hnsw.backend})")
+    for ef in args.ef:
+        print(f"hnsw   ef={ef:<8} " + _measure(lambda: hnsw.query_many(queries, args.top_k, ef=ef), truth, args.top_k, args.queries))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+对比逐条 INSERT 的 AuditLog 与 COPY 批量写入的 BufferedAuditLog 的事件吞吐。
+
+    python -m benchmarks.bench_audit_log --events 5000 --concurrency 100
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from storage.audit import AuditLog, BufferedAuditLog
+from storage.postgres import close_pools, run_migrations
+
+
+async def _run(audit: AuditLog, events: int, concurrency: int) -> float:
+    sem = asyncio.Semaphore(concurrency)
+    task_ids = [str(uuid.uuid4()) for _ in range(max(1, events // 6))]
+
+    async def one(i: int) -> None:
+        async with sem:
+            await audit.record_event({"type": "bench.event", "task_id": task_ids[i % len(task_ids)], "seq": i})
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(events)))
+    if isinstance(audit, BufferedAuditLog):
+        await audit.close()
+    return time.perf_counter() - start
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--max-batch", type=int, default=500)
+    args = parser.parse_args()
+
+    await run_migrations()
+    elapsed = await _run(AuditLog(), args.events, args.concurrency)
+    print(f"per-event INSERT : {args.events / elapsed:10.1f} events/s")
+
+    buffered = BufferedAuditLog(max_batch=args.max_batch, flush_interval=0.05)
+    elapsed = await _run(buffered, args.events, args.concurrency)
+    stats = buffered.stats()
+    print(
+        f"buffered COPY    : {args.events / elapsed:10.1f} events/s "
+        f"(flushes={stats['flushes']}, last_batch={stats['last_batch_size']})"
+    )
+    await close_pools()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
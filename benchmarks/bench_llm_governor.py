@@ -0,0 +1,115 @@
+"""
+LLM 调用治理基准：本地 mock provider 在滑动窗口内超过 --limit 次请求即返回 429，
+对比“无治理 + 流程式重试”（与 ContentMarketingFlow.with_retry 相同：最多 3 次尝试，0.2s/0.4s 退避）
+与经过 LLMGovernor（rpm 限流 + 并发上限 + single-flight + 429 冷却）的 LLMClient，
+输出成功/失败数、provider 实际调用数与 429 次数、耗时与有效吞吐。
+
+    python -m benchmarks.bench_llm_governor --requests 2000 --limit 100 --window 1 --duplicates 0.3
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List
+
+from llm.client import LLMClient
+from llm.governor import LLMGovernor, RateLimitError
+
+
+class MockProvider:
+    """window 秒内最多接受 limit 个请求，其余立即返回 429；被接受的请求耗时 latency 秒。"""
+
+    def __init__(self, limit: int, window: float, latency: float) -> None:
+        self.limit = limit
+        self.window = window
+        self.latency = latency
+        self.calls = 0
+        self.rejected = 0
+        self._accepted: Deque[float] = deque()
+
+    async def complete(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        self.calls += 1
+        now = time.monotonic()
+        while self._accepted and self._accepted[0] <= now - self.window:
+            self._accepted.popleft()
+        if len(self._accepted) >= self.limit:
+            self.rejected += 1
+            raise RateLimitError("429 Too Many Requests")
+        self._accepted.append(now)
+        await asyncio.sleep(self.latency)
+        content = messages[-1]["content"]
+        return {"role": "assistant", "content": content, "usage": {"prompt_tokens": len(content.split()), "completion_tokens": 12}}
+
+
+class MockClient(LLMClient):
+    def __init__(self, provider: MockProvider, governor: LLMGovernor) -> None:
+        super().__init__(cache=None, model="mock", governor=governor)
+        self.mock = provider
+
+    async def _complete(self, messages: List[Dict[str, str]], **kwargs: Any) -> Dict[str, Any]:
+        return await self.mock.complete(messages)
+
+
+def _prompts(n: int, duplicates: float, seed: int) -> List[List[Dict[str, str]]]:
+    rng = random.Random(seed)
+    unique = max(1, int(n * (1 - duplicates)))
+    return [[{"role": "user", "content": f"topic {rng.randrange(unique)} style professional"}] for _ in range(n)]
+
+
+async def _naive(provider: MockProvider, prompts: List[List[Dict[str, str]]]) -> int:
+    async def one(messages: List[Dict[str, str]]) -> bool:
+        for attempt in range(3):
+            try:
+                await provider.complete(messages)
+                return True
+            except RateLimitError:
+                if attempt < 2:
+                    await asyncio.sleep(0.2 * (attempt + 1))
+        return False
+
+    return sum(await asyncio.gather(*(one(m) for m in prompts)))
+
+
+async def _governed(client: MockClient, prompts: List[List[Dict[str, str]]]) -> int:
+    async def one(messages: List[Dict[str, str]]) -> bool:
+        try:
+            await client.chat(messages)
+            return True
+        except RateLimitError:
+            return False
+
+    return sum(await asyncio.gather(*(one(m) for m in prompts)))
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=100, help="provider 每个窗口接受的请求数")
+    parser.add_argument("--window", type=float, default=1.0)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--duplicates", type=float, default=0.3, help="重复提示所占比例")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    prompts = _prompts(args.requests, args.duplicates, args.seed)
+
+    print(f"{'mode':<10} {'ok':>6} {'failed':>6} {'calls':>7} {'429s':>6} {'seconds':>8} {'ok/s':>8}")
+    for mode in ("naive", "governed"):
+        provider = MockProvider(args.limit, args.window, args.latency)
+        start = time.perf_counter()
+        if mode == "naive":
+            ok = await _naive(provider, prompts)
+        else:
+            # 略低于 provider 配额留出余量
+            governor = LLMGovernor("mock", rpm=args.limit * 60 / args.window * 0.95, max_concurrency=args.concurrency)
+            ok = await _governed(MockClient(provider, governor), prompts)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{mode:<10} {ok:>6} {len(prompts) - ok:>6} {provider.calls:>7} {provider.rejected:>6} "
+            f"{elapsed:>8.2f} {ok / elapsed:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
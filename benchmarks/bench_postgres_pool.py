@@ -0,0 +1,48 @@
+"""
+对比“每次查询新建连接”与共享连接池的吞吐。
+
+    python -m benchmarks.bench_postgres_pool --queries 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import time
+
+from storage.postgres import PostgresClient, close_pools, get_pool
+
+QUERY = "SELECT task_id, status FROM task_state WHERE task_id = %s"
+
+
+async def _run(client: PostgresClient, queries: int, concurrency: int) -> float:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        async with sem:
+            await client.fetch(QUERY, (f"bench-{i % 100}",))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(queries)))
+    return time.perf_counter() - start
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--pool-size", type=int, default=20)
+    parser.add_argument("--dsn", default=None)
+    args = parser.parse_args()
+
+    # 每查询建连时并发过高会触发 max_connections，按池大小限流以公平对比
+    per_query = PostgresClient(args.dsn, pooled=False)
+    elapsed = await _run(per_query, args.queries, min(args.concurrency, args.pool_size))
+    print(f"per-query connect: {args.queries / elapsed:10.1f} q/s ({elapsed:.2f}s)")
+
+    await get_pool(args.dsn, min_size=args.pool_size, max_size=args.pool_size)
+    pooled = PostgresClient(args.dsn)
+    elapsed = await _run(pooled, args.queries, args.concurrency)
+    print(f"pooled           : {args.queries / elapsed:10.1f} q/s ({elapsed:.2f}s)")
+    await close_pools()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+"""
+RedisEventBus 发布路径基准：逐条 PUBLISH + 标准库 json（旧实现） vs 同 tick 合并 pipeline + orjson/msgpack。
+默认连接 REDIS_URL；Redis 不可达时退回 fakeredis（仅反映客户端开销）。
+
+    python -m benchmarks.bench_redis_emit --events 20000 --concurrency 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+from mq.queue import RedisEventBus, redis_async
+
+
+class _LegacyBus:
+    def __init__(self, client, channel: str = "agent-events") -> None:
+        self._redis = client
+        self.channel = channel
+
+    async def emit(self, event) -> None:
+        await self._redis.publish(self.channel, json.dumps(event, ensure_ascii=False))
+
+
+async def _client():
+    url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    if redis_async is not None:
+        client = redis_async.from_url(url)
+        try:
+            await client.ping()
+            return client, url
+        except Exception:
+            pass
+    import fakeredis
+
+    return fakeredis.aioredis.FakeRedis(), "fakeredis"
+
+
+async def _run(bus, events: int, concurrency: int):
+    latencies = []
+    sem = asyncio.Semaphore(concurrency)
+    event = {"type": "content.draft", "task_id": "bench", "draft": {"title": "t", "body": "x" * 512, "tags": ["a"]}}
+
+    async def one() -> None:
+        async with sem:
+            start = time.perf_counter()
+            await bus.emit(event)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(events)))
+    elapsed = time.perf_counter() - start
+    p99 = statistics.quantiles(latencies, n=100)[98]
+    return events / elapsed, p99 * 1000
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    args = parser.parse_args()
+
+    client, target = await _client()
+    print(f"target: {target}")
+    variants = [
+        ("legacy publish+json", _LegacyBus(client)),
+        ("pipelined json", RedisEventBus(client=client, codec="json")),
+        ("pipelined msgpack", RedisEventBus(client=client, codec="msgpack")),
+    ]
+    for label, bus in variants:
+        try:
+            rate, p99 = await _run(bus, args.events, args.concurrency)
+        except RuntimeError as exc:
+            print(f"{label:<20}: skipped ({exc})")
+            continue
+        print(f"{label:<20}: {rate:10.1f} events/s  p99={p99:7.2f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,65 @@
+"""
+埋点开销微基准：对比裸调用与 StageSpan + attempt 包裹的同一协程，输出每个阶段的额外耗时，
+并折算为相对 --stage-ms 毫秒阶段（真实 LLM 调用通常远大于此）的百分比。
+
+    python -m benchmarks.bench_tracing --iterations 20000 --stage-ms 1
+    python -m benchmarks.bench_tracing --otel-sdk      # 同时生成 OpenTelemetry span（SDK，无导出器）时的开销
+"""
+import argparse
+import asyncio
+import time
+
+from monitoring.tracing import IOSpan, StageSpan, TaskSpan, configure_tracing
+
+
+async def _noop() -> None:
+    return None
+
+
+async def _plain(iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await _noop()
+        await _noop()
+    return time.perf_counter() - start
+
+
+async def _instrumented(iterations: int) -> float:
+    start = time.perf_counter()
+    with TaskSpan("bench-task"):
+        for _ in range(iterations):
+            with StageSpan("writer") as stage:
+                with stage.attempt():
+                    await _noop()
+            with IOSpan("bus", "emit"):
+                await _noop()
+    return time.perf_counter() - start
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20_000)
+    parser.add_argument("--stage-ms", type=float, default=1.0)
+    parser.add_argument("--otel-sdk", action="store_true")
+    args = parser.parse_args()
+
+    if args.otel_sdk:
+        from opentelemetry import trace
+        from opentelemetry.sdk.trace import TracerProvider
+
+        trace.set_tracer_provider(TracerProvider())
+        configure_tracing(True)
+
+    # 预热：创建子指标缓存
+    await _plain(1000)
+    await _instrumented(1000)
+    plain = min([await _plain(args.iterations) for _ in range(3)])
+    instrumented = min([await _instrumented(args.iterations) for _ in range(3)])
+    overhead_us = (instrumented - plain) / args.iterations * 1e6
+    print(f"plain        {plain / args.iterations * 1e6:8.2f} us/stage")
+    print(f"instrumented {instrumented / args.iterations * 1e6:8.2f} us/stage (stage + attempt + io span)")
+    print(f"overhead     {overhead_us:8.2f} us/stage = {overhead_us / (args.stage_ms * 1000) * 100:.3f}% of a {args.stage_ms} ms stage")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+"""
+SimpleVectorStore 查询延迟：逐条纯 Python 余弦 + 全排序（旧实现）对比 float32 矩阵 + argpartition，
+以及命中 1% 数据的 where 过滤查询。
+
+    python -m benchmarks.bench_vectorstore --sizes 10000 100000 1000000 --dim 384
+"""
+import argparse
+import math
+import time
+from typing import List
+
+import numpy as np
+
+from vectorstore.memory import SimpleVectorStore
+
+
+def _naive_query(items: List[List[float]], vec: List[float], top_k: int) -> List[int]:
+    def cosine(a: List[float], b: List[float]) -> float:
+        dot = sum(x * y for x, y in zip(a, b))
+        na = math.sqrt(sum(x * x for x in a))
+        nb = math.sqrt(sum(x * x for x in b))
+        return dot / (na * nb) if na and nb else 0.0
+
+    scored = sorted(((cosine(vec, v), i) for i, v in enumerate(items)), reverse=True)
+    return [i for _, i in scored[:top_k]]
+
+
+def _ms(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--naive-limit", type=int, default=10_000, help="only run the pure-Python baseline up to this size")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((args.batch, args.dim), dtype=np.float32)
+    for size in args.sizes:
+        store = SimpleVectorStore(dim=args.dim, index_fields=["bucket"])
+        start = time.perf_counter()
+        for offset in range(0, size, 100_000):
+            n = min(100_000, size - offset)
+            store.add_many(rng.standard_normal((n, args.dim), dtype=np.float32), [{"id": offset + i, "bucket": (offset + i) % 100} for i in range(n)])
+        build = time.perf_counter() - start
+
+        single = _ms(lambda: store.query(queries[0], top_k=args.top_k), 5)
+        batch = _ms(lambda: store.query_many(queries, top_k=args.top_k), 2) / args.batch
+        filtered = _ms(lambda: store.query(queries[0], top_k=args.top_k, where={"bucket": 7}), 5)
+        line = (
+            f"N={size:>9,}  build {build:6.2f}s  query {single:8.2f} ms  query_many {batch:8.2f} ms/q"
+            f"  where(1%) {filtered:7.2f} ms"
+        )
+        if size <= args.naive_limit:
+            items = store._matrix[:size].tolist()  # noqa: SLF001 - 基准直接复用同一份数据
+            line += f"  naive {_ms(lambda: _naive_query(items, queries[0].tolist(), args.top_k), 1):10.1f} ms"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
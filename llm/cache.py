@@ -0,0 +1,291 @@
+"""
+LLM 响应缓存，两级：
+- 精确层：以 (messages, model, params) 的规范化 JSON 的 SHA-256 为键，
+  后端可选进程内 LRU+TTL（默认）、Redis 或 SQLite（多进程/重启后共享）；
+- 语义层（可选）：用户消息的向量与历史请求的余弦相似度超过阈值时复用答案，
+  向量检索复用 vectorstore.memory.SimpleVectorStore，仅在相同 model/params/system 提示的范围内匹配。
+
+    cache = LLMCache(backend=SQLiteCacheBackend("llm_cache.db"), semantic=SemanticCache(threshold=0.95))
+    client = LLMClient(cache=cache)
+
+缓存默认关闭（相同 prompt 的采样结果会被固定下来，需显式开启）：环境变量 LLM_CACHE=memory / redis / sqlite
+决定 LLMClient 默认使用的缓存，off（默认）关闭；LLM_CACHE_TTL 为过期秒数，LLM_CACHE_SEMANTIC_THRESHOLD 设置后启用语义层。
+"""
+import asyncio
+import contextlib
+import copy
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+import weakref
+import zlib
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from prometheus_client import Counter
+
+from vectorstore.memory import SimpleVectorStore
+
+try:  # Optional dependency：redis.asyncio
+    import redis.asyncio as redis_async  # type: ignore
+except Exception:  # pragma: no cover - redis 依赖可选
+    redis_async = None
+
+Messages = Sequence[Dict[str, Any]]
+
+# 命中率 = hit / (hit + miss)；语义层只统计精确层未命中的请求
+LLM_CACHE_REQUESTS = Counter("llm_cache_requests_total", "LLM cache lookups", ["tier", "result"])
+LLM_CACHE_SAVED_SECONDS = Counter(
+    "llm_cache_saved_seconds_total",
+    "Provider latency avoided by cache hits (latency of the original call)",
+    ["tier"],
+)
+
+
+def _canonical(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def cache_key(messages: Messages, model: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """规范化（键排序、紧凑分隔符）后取 SHA-256，字段顺序或空白不同的等价请求得到同一个键。"""
+    payload = {"messages": [dict(m) for m in messages], "model": model, "params": params or {}}
+    return hashlib.sha256(_canonical(payload).encode("utf-8")).hexdigest()
+
+
+class MemoryCacheBackend:
+    """进程内 LRU + TTL。"""
+
+    def __init__(self, max_entries: int = 10_000) -> None:
+        self.max_entries = max_entries
+        self._items: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.time():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return copy.deepcopy(value)
+
+    async def set(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        self._items[key] = (time.time() + ttl, copy.deepcopy(value))
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+
+class RedisCacheBackend:
+    """
+    Redis 后端：SET EX 自带过期，多个 worker 共享同一份缓存。
+    redis.asyncio 客户端绑定创建它的事件循环，未注入 client 时按当前运行的事件循环各建一个，
+    进程内共享的 default_cache() 因此可以跨多次 asyncio.run 使用。
+    """
+
+    def __init__(self, url: str | None = None, prefix: str = "llm:cache:", client: Any = None) -> None:
+        if client is None and redis_async is None:
+            raise RuntimeError("请先安装 `redis` 依赖以启用 RedisCacheBackend。")
+        self.url = url or os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        self.prefix = prefix
+        self._redis = client
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+
+    def _client(self) -> Any:
+        if self._redis is not None:
+            return self._redis
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = redis_async.from_url(self.url)
+        return client
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = await self._client().get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        await self._client().set(self.prefix + key, _canonical(value), ex=max(1, int(ttl)))
+
+
+class SQLiteCacheBackend:
+    """
+    SQLite 后端：单机多进程共享、重启后保留；阻塞调用放到线程池执行。
+    每次读写用一个短连接，closing() 负责关闭，连接自身的上下文只负责提交/回滚。
+    """
+
+    def __init__(self, path: str = "llm_cache.db") -> None:
+        self.path = path
+        with contextlib.closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        with contextlib.closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def _set(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        with contextlib.closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, _canonical(value), time.time() + ttl),
+            )
+            # 顺带清理少量过期行，避免文件无限增长
+            conn.execute(
+                "DELETE FROM llm_cache WHERE rowid IN (SELECT rowid FROM llm_cache WHERE expires_at < ? LIMIT 100)",
+                (time.time(),),
+            )
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        await asyncio.to_thread(self._set, key, value, ttl)
+
+
+def hashing_embedding(text: str, dim: int = 512) -> List[float]:
+    """
+    无需模型的默认嵌入：字符 3-gram 哈希到 dim 维并 L2 归一化，近似衡量文本重合度。
+    生产环境应传入真实的 embedding 函数。
+    """
+    vec = [0.0] * dim
+    text = f"  {text.lower()}  "
+    for i in range(len(text) - 2):
+        vec[zlib.crc32(text[i : i + 3].encode("utf-8")) % dim] += 1.0
+    norm = math.sqrt(sum(x * x for x in vec)) or 1.0
+    return [x / norm for x in vec]
+
+
+class SemanticCache:
+    """
+    语义层：按 scope（model + params + 非用户消息的哈希）分区，只比较用户消息文本的向量。
+    条目数超过 max_entries 时用最近一半的条目重建索引。
+    嵌入与相似度扫描是纯 CPU 计算，LLMCache 在线程池中调用 lookup/add，二者由锁串行化。
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        embed: Callable[[str], Sequence[float]] = hashing_embedding,
+        max_entries: int = 10_000,
+    ) -> None:
+        self.threshold = threshold
+        self.embed = embed
+        self.max_entries = max_entries
+        self._store = SimpleVectorStore(index_fields=["scope", "created_at"])
+        self._recent: Deque[Tuple[Sequence[float], Dict[str, Any]]] = deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def split(messages: Messages, model: str, params: Optional[Dict[str, Any]]) -> Tuple[str, str]:
+        """返回 (scope, 待嵌入文本)。"""
+        context = [m for m in messages if m.get("role") != "user"]
+        scope = cache_key(context, model, params)
+        text = "\n".join(str(m.get("content", "")) for m in messages if m.get("role") == "user")
+        return scope, text
+
+    def lookup(self, scope: str, text: str, ttl: float) -> Optional[Tuple[float, Dict[str, Any]]]:
+        if not len(self._store):
+            return None
+        vec = self.embed(text)
+        where = {"scope": scope, "created_at": {"$gte": time.time() - ttl}}
+        with self._lock:
+            hits = self._store.query(vec, top_k=1, where=where)
+        if hits and hits[0]["score"] >= self.threshold:
+            return hits[0]["score"], copy.deepcopy(hits[0]["meta"]["response"])
+        return None
+
+    def add(self, scope: str, text: str, response: Dict[str, Any]) -> None:
+        vec = self.embed(text)
+        meta = {"scope": scope, "created_at": time.time(), "response": copy.deepcopy(response)}
+        with self._lock:
+            if len(self._store) >= self.max_entries:
+                keep = list(self._recent)[-(self.max_entries // 2) :]
+                self._store = SimpleVectorStore(index_fields=["scope", "created_at"])
+                if keep:
+                    self._store.add_many([v for v, _ in keep], [m for _, m in keep])
+            self._store.add(vec, meta)
+            self._recent.append((vec, meta))
+
+
+class LLMCache:
+    def __init__(
+        self,
+        backend: Any = None,
+        semantic: Optional[SemanticCache] = None,
+        ttl: float = 3600.0,
+    ) -> None:
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.semantic = semantic
+        self.ttl = ttl
+
+    async def get(self, messages: Messages, model: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """命中时返回带 cache 字段（"exact" / "semantic"）的响应副本。"""
+        key = cache_key(messages, model, params)
+        entry = await self.backend.get(key)
+        if entry is not None:
+            return self._hit("exact", entry)
+        LLM_CACHE_REQUESTS.labels("exact", "miss").inc()
+        if self.semantic is None:
+            return None
+        scope, text = SemanticCache.split(messages, model, params)
+        found = await asyncio.to_thread(self.semantic.lookup, scope, text, self.ttl)
+        if found is None:
+            LLM_CACHE_REQUESTS.labels("semantic", "miss").inc()
+            return None
+        score, entry = found
+        response = self._hit("semantic", entry)
+        response["cache_score"] = score
+        return response
+
+    async def put(
+        self,
+        messages: Messages,
+        model: str,
+        params: Optional[Dict[str, Any]],
+        response: Dict[str, Any],
+        latency: float,
+    ) -> None:
+        """latency 为本次真实调用耗时，命中时累计到“节省耗时”指标。"""
+        entry = {"response": response, "latency": latency}
+        await self.backend.set(cache_key(messages, model, params), entry, self.ttl)
+        if self.semantic is not None:
+            scope, text = SemanticCache.split(messages, model, params)
+            await asyncio.to_thread(self.semantic.add, scope, text, entry)
+
+    @staticmethod
+    def _hit(tier: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+        LLM_CACHE_REQUESTS.labels(tier, "hit").inc()
+        LLM_CACHE_SAVED_SECONDS.labels(tier).inc(entry.get("latency", 0.0))
+        return {**entry["response"], "cache": tier}
+
+
+def cache_from_env() -> Optional[LLMCache]:
+    kind = os.getenv("LLM_CACHE", "off").lower()
+    if kind in ("off", "none", "0", ""):
+        return None
+    if kind == "redis":
+        backend: Any = RedisCacheBackend()
+    elif kind == "sqlite":
+        backend = SQLiteCacheBackend(os.getenv("LLM_CACHE_PATH", "llm_cache.db"))
+    elif kind == "memory":
+        backend = MemoryCacheBackend()
+    else:
+        raise ValueError(f"unknown LLM_CACHE backend: {kind!r}")
+    threshold = os.getenv("LLM_CACHE_SEMANTIC_THRESHOLD")
+    semantic = SemanticCache(threshold=float(threshold)) if threshold else None
+    return LLMCache(backend=backend, semantic=semantic, ttl=float(os.getenv("LLM_CACHE_TTL", "3600")))
@@ -1,9 +1,105 @@
+import asyncio
 import os
-from typing import Any, Dict, List
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from llm.cache import LLMCache, cache_from_env, cache_key
+from llm.governor import LLMGovernor, estimate_tokens, governor_for
+
+_UNSET: Any = object()
+# 本地占位 provider 每个流式分片包含的词数
+_LOCAL_CHUNK_WORDS = 4
+_default_cache: Any = _UNSET
+
+
+def default_cache() -> Optional[LLMCache]:
+    """进程内共享的缓存（按 LLM_CACHE 等环境变量创建一次），各 Agent 的 LLMClient 共用。"""
+    global _default_cache
+    if _default_cache is _UNSET:
+        _default_cache = cache_from_env()
+    return _default_cache
 
 
 class LLMClient:
+    def __init__(self, cache: Any = _UNSET, model: str | None = None, governor: Optional[LLMGovernor] = None) -> None:
+        """cache=None 关闭缓存；不传则使用 default_cache()。governor 默认按 provider 取进程内共享实例。"""
+        self.cache: Optional[LLMCache] = default_cache() if cache is _UNSET else cache
+        self.model = model or os.getenv("LLM_MODEL", "qwen-plus")
+        self.governor = governor or governor_for(self.provider)
+
+    @property
+    def provider(self) -> str:
+        return "qwen" if os.getenv("QWEN_API_KEY") else "local"
+
     async def chat(self, messages: List[Dict[str, str]], **kwargs: Any) -> Dict[str, Any]:
+        """
+        kwargs 为采样参数（temperature 等），参与缓存键；命中时响应带 cache 字段标明命中层级。
+        未命中时经 governor 限流后调用 provider，相同的并发请求合并为一次调用。
+        """
+        if self.cache is not None:
+            cached = await self.cache.get(messages, self.model, kwargs)
+            if cached is not None:
+                return cached
+        key = cache_key(messages, self.model, kwargs)
+        return await self.governor.coalesce(key, lambda: self._call(messages, kwargs))
+
+    async def astream(self, messages: List[Dict[str, str]], **kwargs: Any) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流式调用，逐个产出分片 {"index", "delta"}；最后一个分片带 finish_reason 与 usage。
+        各分片 delta 依次拼接即为完整内容，与 chat() 返回的 content 一致。
+        缓存命中时以单个分片返回（带 cache 字段）；流正常结束后写入缓存，供 chat() 与后续 astream() 复用。
+        """
+        if self.cache is not None:
+            cached = await self.cache.get(messages, self.model, kwargs)
+            if cached is not None:
+                yield {
+                    "index": 0,
+                    "delta": cached["content"],
+                    "finish_reason": "stop",
+                    "usage": cached.get("usage", {}),
+                    "cache": cached["cache"],
+                }
+                return
+        start = time.perf_counter()
+        parts: List[str] = []
+        last: Dict[str, Any] = {}
+        async for chunk in self.governor.stream(
+            lambda: self._stream(messages, **kwargs),
+            estimated_tokens=estimate_tokens(messages) + int(kwargs.get("max_tokens", 0)),
+        ):
+            parts.append(chunk["delta"])
+            last = chunk
+            yield chunk
+        if self.cache is not None and last.get("finish_reason") == "stop":
+            response = {"role": "assistant", "content": "".join(parts), "usage": last.get("usage", {}), "provider": self.provider}
+            await self.cache.put(messages, self.model, kwargs, response, time.perf_counter() - start)
+
+    async def complete_text(
+        self,
+        messages: List[Dict[str, str]],
+        on_delta: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+        **kwargs: Any,
+    ) -> str:
+        """返回完整文本；给出 on_delta 时走 astream() 并对每个分片回调，否则等价于 chat()。"""
+        if on_delta is None:
+            return (await self.chat(messages, **kwargs))["content"]
+        parts: List[str] = []
+        async for chunk in self.astream(messages, **kwargs):
+            parts.append(chunk["delta"])
+            await on_delta(chunk)
+        return "".join(parts)
+
+    async def _call(self, messages: List[Dict[str, str]], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        response = await self.governor.execute(
+            lambda: self._complete(messages, **kwargs),
+            estimated_tokens=estimate_tokens(messages) + int(kwargs.get("max_tokens", 0)),
+        )
+        if self.cache is not None:
+            await self.cache.put(messages, self.model, kwargs, response, time.perf_counter() - start)
+        return response
+
+    async def _complete(self, messages: List[Dict[str, str]], **kwargs: Any) -> Dict[str, Any]:
         """
         Minimal async chat client.
         If QWEN_API_KEY exists, this is where real API integration should go.
@@ -22,4 +118,20 @@ class LLMClient:
             "provider": "qwen" if api_key else "local",
         }
 
-
+    async def _stream(self, messages: List[Dict[str, str]], **kwargs: Any) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Provider streaming call; real integrations should map SSE chunks here.
+        The local placeholder splits the deterministic response into small word chunks.
+        """
+        response = await self._complete(messages, **kwargs)
+        words = response["content"].split(" ")
+        count = (len(words) + _LOCAL_CHUNK_WORDS - 1) // _LOCAL_CHUNK_WORDS
+        for index in range(count):
+            text = " ".join(words[index * _LOCAL_CHUNK_WORDS : (index + 1) * _LOCAL_CHUNK_WORDS])
+            chunk: Dict[str, Any] = {"index": index, "delta": text if index == 0 else " " + text}
+            if index == count - 1:
+                chunk["finish_reason"] = "stop"
+                chunk["usage"] = response["usage"]
+            yield chunk
+            # 让出事件循环，模拟分片陆续到达
+            await asyncio.sleep(0)
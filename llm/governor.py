@@ -0,0 +1,268 @@
+"""
+LLM 调用的客户端侧治理，按 provider 共享一个 LLMGovernor：
+- 令牌桶限制每分钟请求数（rpm）与 token 数（tpm）：调用前按提示长度预估扣减，返回后按 usage 多退少补；
+- 有界信号量限制同时在途的请求数；
+- single-flight：相同键（缓存键）的并发请求只发起一次调用，其余等待同一结果；
+- 遇到 429（RateLimitError）时整个 provider 进入冷却，按连续限流次数指数退避（优先使用 Retry-After），
+  并把 rpm 速率减半，之后每次成功逐步恢复到配置值（AIMD），避免重试风暴放大负载。
+
+环境变量 LLM_RPM / LLM_TPM（不设置为不限）、LLM_MAX_CONCURRENCY（默认 32）、LLM_MAX_RETRIES（默认 5）。
+"""
+import asyncio
+import os
+import random
+import time
+import weakref
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# 排队等待、在途请求、429 次数与被合并的重复请求
+LLM_GOVERNOR_WAIT_SECONDS = Histogram(
+    "llm_governor_wait_seconds",
+    "Time a request waited for rate limits and 429 cooldown before being sent",
+    ["provider"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+LLM_INFLIGHT = Gauge("llm_inflight_requests", "LLM requests currently in flight", ["provider"])
+LLM_RATE_LIMITED = Counter("llm_rate_limited_total", "Provider 429 responses", ["provider"])
+LLM_COALESCED = Counter("llm_coalesced_total", "Requests served by an identical in-flight call", ["provider"])
+
+
+class RateLimitError(RuntimeError):
+    """provider 返回 429 时由适配层抛出；retry_after 为服务端建议的等待秒数。"""
+
+    def __init__(self, message: str = "rate limited", retry_after: Optional[float] = None) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+_T = TypeVar("_T")
+
+
+def _for_loop(registry: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _T]", factory: Callable[[], _T]) -> _T:
+    """
+    asyncio 原语在首次争用时绑定事件循环；进程内共享的对象在多次 asyncio.run 之间使用时，
+    按当前运行的事件循环各建一份（与 storage.postgres.get_pool 相同的做法）。
+    """
+    loop = asyncio.get_running_loop()
+    value = registry.get(loop)
+    if value is None:
+        value = registry[loop] = factory()
+    return value
+
+
+class TokenBucket:
+    """异步令牌桶：rate 为每秒补充的令牌数，burst 为桶容量。令牌余额跨事件循环共享，等待锁按循环区分。"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = weakref.WeakKeyDictionary()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        # 超过容量的请求按容量计，否则永远等不到
+        amount = min(amount, self.capacity)
+        async with _for_loop(self._locks, asyncio.Lock):
+            while True:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((amount - self._tokens) / self.rate)
+
+    def debit(self, amount: float) -> None:
+        """事后补扣（可为负数即退还）；余额可以为负，后续 acquire 会等到还清。"""
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens - amount)
+
+
+def estimate_tokens(messages: Any) -> int:
+    """调用前的粗略估计，与本地 provider 的 usage 口径（按空白分词）一致。"""
+    return sum(len(str(m.get("content", "")).split()) for m in messages)
+
+
+class LLMGovernor:
+    def __init__(
+        self,
+        provider: str = "local",
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        max_concurrency: int = 32,
+        max_retries: int = 5,
+        base_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+    ) -> None:
+        self.provider = provider
+        self.rpm = rpm
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_concurrency = max_concurrency
+        self._requests = TokenBucket(rpm / 60.0, burst=max(1.0, rpm / 60.0)) if rpm else None
+        self._tokens = TokenBucket(tpm / 60.0, burst=tpm / 6.0) if tpm else None
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.BoundedSemaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._inflight: Dict[str, "asyncio.Future[Dict[str, Any]]"] = {}
+        self._resume_at = 0.0
+        self._consecutive_429 = 0
+        self._wait = LLM_GOVERNOR_WAIT_SECONDS.labels(provider)
+        self._gauge = LLM_INFLIGHT.labels(provider)
+
+    def _semaphore(self) -> asyncio.BoundedSemaphore:
+        # 并发上限按事件循环各自计算；同一时刻通常只有一个循环在运行
+        return _for_loop(self._semaphores, lambda: asyncio.BoundedSemaphore(self.max_concurrency))
+
+    async def coalesce(self, key: str, fn: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        single-flight：同一键已有请求在途时直接等待其结果（异常同样共享），返回各自的浅拷贝。
+        共享的调用在 governor 自己的任务中执行，发起者被取消（超时）不会连带取消其它等待者。
+        """
+        shared = self._inflight.get(key)
+        if shared is not None:
+            LLM_COALESCED.labels(self.provider).inc()
+            return dict(await asyncio.shield(shared))
+        shared = self._inflight[key] = asyncio.ensure_future(fn())
+        shared.add_done_callback(lambda done: self._settle(key, done))
+        return await asyncio.shield(shared)
+
+    def _settle(self, key: str, done: "asyncio.Future[Dict[str, Any]]") -> None:
+        if self._inflight.get(key) is done:
+            del self._inflight[key]
+        if not done.cancelled():
+            # 等待者都已离开时避免 "exception was never retrieved" 警告
+            done.exception()
+
+    async def execute(
+        self,
+        fn: Callable[[], Awaitable[Dict[str, Any]]],
+        estimated_tokens: int = 0,
+    ) -> Dict[str, Any]:
+        """限流后执行一次 provider 调用；遇到 RateLimitError 退避重试，超过 max_retries 后抛出。"""
+        attempt = 0
+        while True:
+            await self._admit(estimated_tokens)
+            try:
+                async with self._semaphore():
+                    self._gauge.inc()
+                    try:
+                        response = await fn()
+                    finally:
+                        self._gauge.dec()
+            except RateLimitError as exc:
+                LLM_RATE_LIMITED.labels(self.provider).inc()
+                self._on_rate_limited(exc)
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                continue
+            self._on_success(response, estimated_tokens)
+            return response
+
+    async def stream(
+        self,
+        open_stream: Callable[[], AsyncIterator[Dict[str, Any]]],
+        estimated_tokens: int = 0,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流式版本的 execute：只在读取上游分片时占用并发名额，分片交给调用方处理期间释放，
+        慢消费者不会挤占其它 LLM 调用；429 只在收到首个分片之前重试，之后的失败直接抛给调用方。
+        token 用量取最后一个分片的 usage。
+        """
+        attempt = 0
+        while True:
+            await self._admit(estimated_tokens)
+            last: Dict[str, Any] = {}
+            started = False
+            upstream = open_stream().__aiter__()
+            try:
+                while True:
+                    async with self._semaphore():
+                        self._gauge.inc()
+                        try:
+                            chunk = await upstream.__anext__()
+                        except StopAsyncIteration:
+                            break
+                        finally:
+                            self._gauge.dec()
+                    started = True
+                    last = chunk
+                    yield chunk
+            except RateLimitError as exc:
+                LLM_RATE_LIMITED.labels(self.provider).inc()
+                self._on_rate_limited(exc)
+                attempt += 1
+                if started or attempt > self.max_retries:
+                    raise
+                continue
+            finally:
+                aclose = getattr(upstream, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+            self._on_success(last, estimated_tokens)
+            return
+
+    async def _admit(self, estimated_tokens: int) -> None:
+        start = time.perf_counter()
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self._requests is not None:
+            await self._requests.acquire()
+        if self._tokens is not None and estimated_tokens:
+            await self._tokens.acquire(estimated_tokens)
+        self._wait.observe(time.perf_counter() - start)
+
+    def _on_rate_limited(self, exc: RateLimitError) -> None:
+        now = time.monotonic()
+        if now < self._resume_at:
+            # 同一批并发请求陆续收到的 429 属于同一次限流，只处理第一次
+            return
+        self._consecutive_429 += 1
+        if exc.retry_after is not None:
+            delay = exc.retry_after
+        else:
+            # 全抖动：[0, base * 2^n]，避免所有等待者在同一时刻重新涌入
+            delay = random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** (self._consecutive_429 - 1)))
+        self._resume_at = now + delay
+        if self._requests is not None:
+            self._requests.rate = max(self.rpm / 600.0, self._requests.rate / 2)
+
+    def _on_success(self, response: Dict[str, Any], estimated_tokens: int) -> None:
+        self._consecutive_429 = 0
+        if self._requests is not None and self._requests.rate < self.rpm / 60.0:
+            self._requests.rate = min(self.rpm / 60.0, self._requests.rate + self.rpm / 60.0 * 0.05)
+        if self._tokens is not None:
+            usage = response.get("usage") or {}
+            used = usage.get("total_tokens") or usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)
+            self._tokens.debit(used - min(estimated_tokens, self._tokens.capacity))
+
+
+_governors: Dict[str, LLMGovernor] = {}
+
+
+def _env_float(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value else None
+
+
+def governor_for(provider: str) -> LLMGovernor:
+    """进程内每个 provider 一个共享实例，参数取自环境变量。"""
+    governor = _governors.get(provider)
+    if governor is None:
+        governor = _governors[provider] = LLMGovernor(
+            provider,
+            rpm=_env_float("LLM_RPM"),
+            tpm=_env_float("LLM_TPM"),
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "32")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "5")),
+        )
+    return governor
@@ -1,21 +1,69 @@
 import os
 import time
-from typing import Any, Dict, List, Tuple
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
 
-from prometheus_client import Counter, Gauge, start_http_server
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+from mq.events import STAGE_BY_EVENT, STATUS_BY_EVENT, TRANSIENT_EVENTS
 
 _started_servers: set[Tuple[str, int]] = set()
-_STATUS_TO_VALUE = {"pending": 0, "running": 1, "success": 2, "human_required": 0.5, "error": -1}
+_TERMINAL_STATUSES = ("success", "error")
+# 阶段耗时可达数十秒（LLM 调用 + 重试退避），任务端到端可达数分钟
+_STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+_TASK_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
 
+# 所有标签均为有界维度（事件类型 / 阶段 / 平台 / 状态），不再按 task_id 打标签
 EVENT_COUNTER = Counter("agent_events_total", "Total number of workflow events", ["event_type"])
 EVENT_TS = Gauge("agent_event_timestamp", "Unix timestamp of last event by type", ["event_type"])
-TASK_LAST_EVENT = Gauge("agent_task_last_event_timestamp", "Unix timestamp of last event per task", ["task_id"])
-TASK_STATUS = Gauge(
-    "agent_task_status_value",
-    "Task status indicator (-1 error,0 pending,0.5 human_required,1 running,2 success)",
-    ["task_id"],
+STAGE_LATENCY = Histogram(
+    "agent_stage_latency_seconds",
+    "Time from the previous task event to the event completing a stage",
+    ["stage", "platform"],
+    buckets=_STAGE_BUCKETS,
+)
+TASK_DURATION = Histogram(
+    "agent_task_duration_seconds",
+    "End-to-end task duration from first event to terminal event",
+    ["platform", "status"],
+    buckets=_TASK_BUCKETS,
+)
+TASK_RETRIES = Histogram(
+    "agent_task_retries",
+    "Stage retries per finished task",
+    ["platform"],
+    buckets=(0, 1, 2, 3, 5, 8, 13),
+)
+STAGE_RETRIES = Counter("agent_stage_retries_total", "Stage retry attempts", ["stage"])
+TASKS_IN_WINDOW = Gauge("agent_tasks_tracked", "Tasks currently tracked in the metrics window, by status", ["status"])
+TASKS_EVICTED = Counter("agent_tasks_evicted_total", "Unfinished tasks dropped from the metrics window", ["reason"])
+# ContentMarketingFlow 内部埋点（monitoring.tracing），与上面基于事件推导的指标互补：
+# 直接以单调时钟测量每个阶段/每次尝试/退避等待，以及总线与状态存储调用；
+# 平均尝试次数 = agent_flow_attempt_seconds_count / agent_flow_stage_seconds_count
+FLOW_STAGE_SECONDS = Histogram(
+    "agent_flow_stage_seconds",
+    "Wall time of one flow stage including retries and backoff",
+    ["stage", "outcome"],
+    buckets=_STAGE_BUCKETS,
+)
+FLOW_ATTEMPT_SECONDS = Histogram(
+    "agent_flow_attempt_seconds",
+    "Wall time of a single stage attempt",
+    ["stage", "outcome"],
+    buckets=_STAGE_BUCKETS,
+)
+FLOW_BACKOFF_SECONDS = Histogram(
+    "agent_flow_backoff_seconds",
+    "Time slept in retry backoff",
+    ["stage"],
+    buckets=(0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10),
+)
+FLOW_IO_SECONDS = Histogram(
+    "agent_flow_io_seconds",
+    "Latency of event bus and task store calls made by the flow",
+    ["component", "op"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
 )
-
 
 def _ensure_server() -> None:
     host = os.getenv("PROMETHEUS_HOST", "0.0.0.0")
@@ -27,29 +75,135 @@ def _ensure_server() -> None:
     _started_servers.add(key)
 
 
+class _BoundedLabel:
+    """把开放取值（如 platform）限制为最先出现的 limit 个，其余归为 other，防止标签基数失控。"""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self._seen: Set[str] = set()
+
+    def __call__(self, value: Optional[str]) -> str:
+        if not value:
+            return "unknown"
+        if value in self._seen:
+            return value
+        if len(self._seen) < self.limit:
+            self._seen.add(value)
+            return value
+        return "other"
+
+
+class _TaskWindow:
+    """按 task_id 保存进行中任务的少量状态；LRU 上限 max_tasks，超过 ttl 秒无事件即淘汰。"""
+
+    def __init__(self, max_tasks: int, ttl: float) -> None:
+        self.max_tasks = max_tasks
+        self.ttl = ttl
+        self._tasks: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def touch(self, task_id: str, now: float) -> Dict[str, Any]:
+        # 先取出当前任务再做淘汰，保证刚收到事件的任务不会被淘汰
+        state = self._tasks.pop(task_id, None)
+        self._expire(now)
+        if state is None:
+            state = {"started": now, "last": now, "platform": None, "status": None, "retries": 0}
+        self._tasks[task_id] = state
+        return state
+
+    def pop(self, task_id: str) -> Optional[Dict[str, Any]]:
+        return self._tasks.pop(task_id, None)
+
+    def _expire(self, now: float) -> None:
+        # 最久未更新的任务在队首，只需检查队首
+        while self._tasks:
+            task_id, state = next(iter(self._tasks.items()))
+            if len(self._tasks) >= self.max_tasks:
+                reason = "capacity"
+            elif now - state["last"] > self.ttl:
+                reason = "ttl"
+            else:
+                return
+            del self._tasks[task_id]
+            TASKS_EVICTED.labels(reason).inc()
+            _set_status(state, None)
+
+
+def _set_status(state: Dict[str, Any], status: Optional[str]) -> None:
+    if state["status"] == status:
+        return
+    if state["status"] is not None:
+        TASKS_IN_WINDOW.labels(state["status"]).dec()
+    if status is not None:
+        TASKS_IN_WINDOW.labels(status).inc()
+    state["status"] = status
+
+
 class Metrics:
-    def __init__(self) -> None:
-        self._events: List[Dict[str, Any]] = []
+    """
+    事件总线订阅者：把工作流事件聚合为有界基数的 Prometheus 指标。
+    进行中任务的状态保存在 LRU/TTL 窗口中，任务结束即移出；最近事件保存在固定大小的环形缓冲里。
+    """
+
+    def __init__(
+        self,
+        max_tasks: int = 10_000,
+        task_ttl: float = 3600.0,
+        recent_events: int = 1000,
+        max_platforms: int = 20,
+    ) -> None:
+        self._events: Deque[Dict[str, Any]] = deque(maxlen=recent_events)
+        self._tasks = _TaskWindow(max_tasks, task_ttl)
+        self._platform = _BoundedLabel(max_platforms)
         _ensure_server()
 
     async def handle_event(self, event: Dict[str, Any]) -> None:
-        self._events.append(event)
         event_type = event.get("type", "unknown")
         task_id = event.get("task_id")
         now = time.time()
         EVENT_COUNTER.labels(event_type).inc()
         EVENT_TS.labels(event_type).set(now)
-        if task_id:
-            TASK_LAST_EVENT.labels(task_id).set(now)
-            status = event.get("status")
-            if not status and isinstance(event.get("meta"), dict):
-                status = event["meta"].get("status")
-            if not status and isinstance(event.get("result"), dict):
-                status = event["result"].get("status")
-            if status:
-                value = _STATUS_TO_VALUE.get(status, 0)
-                TASK_STATUS.labels(task_id).set(value)
+        if event_type in TRANSIENT_EVENTS:
+            return
+        self._events.append(event)
+        if not task_id:
+            return
+        state = self._tasks.touch(task_id, now)
+        if event.get("platform") and state["platform"] is None:
+            state["platform"] = self._platform(event["platform"])
+        platform = state["platform"] or "unknown"
+
+        if event_type == "stage.retry":
+            state["retries"] += 1
+            STAGE_RETRIES.labels(event.get("stage", "unknown")).inc()
+        stage = STAGE_BY_EVENT.get(event_type)
+        if stage is not None:
+            STAGE_LATENCY.labels(stage, platform).observe(now - state["last"])
+        state["last"] = now
+
+        status = event.get("status") or STATUS_BY_EVENT.get(event_type)
+        if not status and isinstance(event.get("meta"), dict):
+            status = event["meta"].get("status")
+        if not status:
+            return
+        if status in _TERMINAL_STATUSES:
+            self._tasks.pop(task_id)
+            _set_status(state, None)
+            TASK_DURATION.labels(platform, status).observe(now - state["started"])
+            TASK_RETRIES.labels(platform).observe(state["retries"])
+        else:
+            _set_status(state, status)
+
+    def recent(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """最近的事件（最多 recent_events 条，按时间顺序）。"""
+        events = list(self._events)
+        return events[-limit:] if limit else events
 
     def all(self) -> List[Dict[str, Any]]:
-        return list(self._events)
+        # 兼容旧接口：只返回环形缓冲中的最近事件
+        return self.recent()
 
+    def tracked_tasks(self) -> int:
+        return len(self._tasks)
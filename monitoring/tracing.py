@@ -0,0 +1,190 @@
+"""
+ContentMarketingFlow 埋点：以单调时钟（perf_counter）测量任务、阶段、每次尝试与退避等待，
+写入 monitoring.metrics 中的 agent_flow_* 直方图；安装了 opentelemetry-api 且 FLOW_OTEL=1
+（或调用 configure_tracing()）时同时生成嵌套 span（flow.run > flow.stage.<name> > flow.attempt.<name>），
+导出方式由应用自行配置的 TracerProvider 决定。
+当前 task_id 通过 contextvars 传递，同一任务内的任意协程都可以用 current_task_id.get() 取得。
+
+    with TaskSpan(task_id):
+        with StageSpan("writer") as stage:
+            with stage.attempt():
+                await writer.generate(...)
+"""
+import asyncio
+import os
+import time
+from contextvars import ContextVar, Token
+from typing import Any, Dict, Optional, Tuple
+
+from monitoring.metrics import (
+    FLOW_ATTEMPT_SECONDS,
+    FLOW_BACKOFF_SECONDS,
+    FLOW_IO_SECONDS,
+    FLOW_STAGE_SECONDS,
+)
+
+try:
+    from opentelemetry import trace as otel_trace
+    from opentelemetry.trace import Status, StatusCode
+except Exception:  # pragma: no cover - 可选依赖
+    otel_trace = None
+
+current_task_id: ContextVar[Optional[str]] = ContextVar("current_task_id", default=None)
+
+_tracer: Any = None
+
+
+def configure_tracing(enabled: bool = True) -> bool:
+    """
+    开启/关闭 OpenTelemetry span（默认读取 FLOW_OTEL=1）。未安装 opentelemetry-api 时恒为关闭，返回实际状态。
+    未配置 SDK 时 span 为空操作但仍有开销，因此默认关闭，只有配置了 TracerProvider 的部署才需要打开。
+    """
+    global _tracer
+    _tracer = otel_trace.get_tracer("content_marketing_flow") if enabled and otel_trace is not None else None
+    return _tracer is not None
+
+
+configure_tracing(os.getenv("FLOW_OTEL", "0") == "1")
+
+
+class _StageMetrics:
+    """labels() 每次都要加锁查表；每个阶段的子指标只解析一次，热路径上直接调用绑定好的 observe。"""
+
+    __slots__ = ("attempt_ok", "attempt_error", "stage_ok", "stage_error", "backoff")
+
+    def __init__(self, stage: str) -> None:
+        self.attempt_ok = FLOW_ATTEMPT_SECONDS.labels(stage, "ok").observe
+        self.attempt_error = FLOW_ATTEMPT_SECONDS.labels(stage, "error").observe
+        self.stage_ok = FLOW_STAGE_SECONDS.labels(stage, "ok").observe
+        self.stage_error = FLOW_STAGE_SECONDS.labels(stage, "error").observe
+        self.backoff = FLOW_BACKOFF_SECONDS.labels(stage).observe
+
+
+_stage_metrics: Dict[str, _StageMetrics] = {}
+_io_metrics: Dict[Tuple[str, str], Any] = {}
+
+
+def _metrics_for(stage: str) -> _StageMetrics:
+    metrics = _stage_metrics.get(stage)
+    if metrics is None:
+        metrics = _stage_metrics[stage] = _StageMetrics(stage)
+    return metrics
+
+
+def _start_span(name: str, **attributes: Any) -> Any:
+    if _tracer is None:
+        return None
+    task_id = current_task_id.get()
+    if task_id is not None:
+        attributes["task_id"] = task_id
+    span_cm = _tracer.start_as_current_span(name, attributes=attributes)
+    span_cm.__enter__()
+    return span_cm
+
+
+def _end_span(span_cm: Any, failed: bool, exc: Optional[BaseException]) -> None:
+    if span_cm is None:
+        return
+    if failed and exc is None:
+        otel_trace.get_current_span().set_status(Status(StatusCode.ERROR))
+    # 异常由 OpenTelemetry 自身记录到 span 并标记为错误
+    span_cm.__exit__(type(exc) if exc is not None else None, exc, exc.__traceback__ if exc is not None else None)
+
+
+class TaskSpan:
+    """设置当前 task_id 并开启根 span；支持嵌套，退出时恢复外层 task_id。"""
+
+    __slots__ = ("task_id", "_token", "_span")
+
+    def __init__(self, task_id: str) -> None:
+        self.task_id = task_id
+        self._token: Optional[Token] = None
+        self._span: Any = None
+
+    def __enter__(self) -> "TaskSpan":
+        self._token = current_task_id.set(self.task_id)
+        self._span = _start_span("flow.run")
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Optional[BaseException], tb: Any) -> bool:
+        _end_span(self._span, exc is not None, exc)
+        assert self._token is not None
+        current_task_id.reset(self._token)
+        return False
+
+
+class _AttemptSpan:
+    __slots__ = ("stage", "_start", "_span")
+
+    def __init__(self, stage: "StageSpan") -> None:
+        self.stage = stage
+
+    def __enter__(self) -> "_AttemptSpan":
+        self.stage.attempts += 1
+        self._span = _start_span(f"flow.attempt.{self.stage.name}", stage=self.stage.name, attempt=self.stage.attempts)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Optional[BaseException], tb: Any) -> bool:
+        elapsed = time.perf_counter() - self._start
+        if exc is None:
+            self.stage.succeeded = True
+            self.stage.metrics.attempt_ok(elapsed)
+        else:
+            self.stage.metrics.attempt_error(elapsed)
+        _end_span(self._span, exc is not None, exc)
+        return False
+
+
+class StageSpan:
+    """一个工作流阶段（含全部重试与退避）；没有任何一次尝试成功即记为 error。"""
+
+    __slots__ = ("name", "metrics", "attempts", "succeeded", "_start", "_span")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.metrics = _metrics_for(name)
+        self.attempts = 0
+        self.succeeded = False
+
+    def __enter__(self) -> "StageSpan":
+        self._span = _start_span(f"flow.stage.{self.name}", stage=self.name)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Optional[BaseException], tb: Any) -> bool:
+        elapsed = time.perf_counter() - self._start
+        failed = exc is not None or not self.succeeded
+        (self.metrics.stage_error if failed else self.metrics.stage_ok)(elapsed)
+        if self._span is not None:
+            otel_trace.get_current_span().set_attribute("attempts", self.attempts)
+        _end_span(self._span, failed, exc)
+        return False
+
+    def attempt(self) -> _AttemptSpan:
+        return _AttemptSpan(self)
+
+    async def backoff(self, delay: float) -> None:
+        start = time.perf_counter()
+        await asyncio.sleep(delay)
+        self.metrics.backoff(time.perf_counter() - start)
+
+
+class IOSpan:
+    """总线 / 状态存储等外部调用计时，用于区分慢在 LLM、总线还是 Postgres。"""
+
+    __slots__ = ("_observe", "_start")
+
+    def __init__(self, component: str, op: str) -> None:
+        observe = _io_metrics.get((component, op))
+        if observe is None:
+            observe = _io_metrics[(component, op)] = FLOW_IO_SECONDS.labels(component, op).observe
+        self._observe = observe
+
+    def __enter__(self) -> "IOSpan":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Optional[BaseException], tb: Any) -> bool:
+        self._observe(time.perf_counter() - self._start)
+        return False
@@ -0,0 +1,27 @@
+"""
+事件类型词表：工作流事件到阶段 / 任务状态的映射。
+回放（storage.replay）、审计（storage.audit）与指标（monitoring.metrics）共用，本模块不依赖任何第三方库。
+"""
+
+# 事件类型 -> 工作流阶段 / 折叠后的任务状态
+STAGE_BY_EVENT = {
+    "plan.created": "strategy",
+    "content.draft": "writer",
+    "content.refined": "critic",
+    "human.review.required": "human_review",
+    "content.published": "publisher",
+    "content.analytics": "monitor",
+}
+STATUS_BY_EVENT = {
+    "task.started": "running",
+    "plan.created": "running",
+    "human.review.required": "human_required",
+    "human.review.approved": "running",
+    "task.resumed": "running",
+    "content.published": "running",
+    "content.analytics": "success",
+    "task.failed": "error",
+}
+# 流式生成的增量事件只用于实时推送，完整内容随 content.draft / content.refined 发出；
+# 审计日志不落库，指标只计数，不影响阶段耗时与任务窗口
+TRANSIENT_EVENTS = frozenset({"content.draft.delta", "content.refined.delta"})
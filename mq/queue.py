@@ -1,29 +1,232 @@
 import asyncio
 import contextlib
 import json
+import logging
 import os
-from typing import Any, Awaitable, Callable, Dict, List, Optional
+import socket
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 try:  # Optional dependency：redis.asyncio
     import redis.asyncio as redis_async  # type: ignore
 except Exception:  # pragma: no cover - redis 依赖可选
     redis_async = None
 
+try:  # Optional dependency：orjson，比标准库 json 快数倍
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover - orjson 依赖可选
+    orjson = None
+
+try:  # Optional dependency：msgpack，紧凑二进制帧
+    import msgpack  # type: ignore
+except Exception:  # pragma: no cover - msgpack 依赖可选
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+# msgpack 帧以 0x01 开头；JSON 帧以 "{" 开头，接收方据此自动识别，允许新旧编码混跑
+_MSGPACK_FRAME = b"\x01"
+
+
+def encode_event(event: Dict[str, Any], codec: str = "json") -> bytes:
+    if codec == "msgpack":
+        if msgpack is None:
+            raise RuntimeError("请先安装 `msgpack` 依赖以启用 msgpack 编码。")
+        return _MSGPACK_FRAME + msgpack.packb(event, use_bin_type=True)
+    if orjson is not None:
+        # 与 json.dumps 一致：非字符串键（如 {1: ...}）转为字符串，而不是抛 TypeError
+        return orjson.dumps(event, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(event, ensure_ascii=False).encode("utf-8")
+
+
+def decode_event(data: bytes | str) -> Dict[str, Any]:
+    if isinstance(data, bytes) and data[:1] == _MSGPACK_FRAME:
+        if msgpack is None:
+            raise RuntimeError("收到 msgpack 帧，请先安装 `msgpack` 依赖。")
+        return msgpack.unpackb(data[1:], raw=False)
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "spill")
+
+
+class _SubscriberWorker:
+    """
+    单个订阅者的有界队列 + 后台 worker。队列满时按 overflow 策略处理：
+    block 阻塞发布方；drop_oldest 丢弃最旧事件；spill 追加写入磁盘文件，worker 追上后按序读回。
+    """
+
+    def __init__(
+        self,
+        cb: Callable[[Dict[str, Any]], Awaitable[None]],
+        maxsize: int,
+        overflow: str,
+        spill_dir: Optional[str] = None,
+        index: int = 0,
+    ) -> None:
+        self.cb = cb
+        # 带上订阅序号：同名回调（如多个实例的同一方法）各自统计
+        self.name = f"{index}:{getattr(cb, '__qualname__', repr(cb))}"
+        self.overflow = overflow
+        self._queue: asyncio.Queue[Dict[str, Any]] = asyncio.Queue(maxsize=maxsize)
+        self._task: Optional[asyncio.Task[None]] = None
+        self._pending = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._spill_path: Optional[Path] = None
+        # 落盘文件的读写都在线程中执行，锁保证追加顺序且读回时不会读到写了一半的行
+        self._spill_lock = asyncio.Lock()
+        self._spill_offset = 0
+        self._spilled = 0
+        if overflow == "spill":
+            fd, path = tempfile.mkstemp(prefix="event-bus-", suffix=".jsonl", dir=spill_dir)
+            os.close(fd)
+            self._spill_path = Path(path)
+        self.stats = {"delivered": 0, "errors": 0, "dropped": 0, "spilled": 0}
+
+    async def put(self, event: Dict[str, Any]) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        if self.overflow == "spill" and (self._spilled or self._queue.full()):
+            # 一旦开始落盘，后续事件也先落盘，保证投递顺序；先占位，写入完成前到达的事件同样落盘
+            self._spilled += 1
+            await self._spill(event)
+        elif self.overflow == "drop_oldest" and self._queue.full():
+            self._queue.get_nowait()
+            self._queue.task_done()
+            self._pending -= 1
+            self.stats["dropped"] += 1
+            self._queue.put_nowait(event)
+        else:
+            # block 策略下队列满时在此等待，形成背压
+            await self._queue.put(event)
+        self._pending += 1
+        self._idle.clear()
+
+    async def drain(self) -> None:
+        await self._idle.wait()
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._spill_path is not None:
+            self._spill_path.unlink(missing_ok=True)
+
+    async def _spill(self, event: Dict[str, Any]) -> None:
+        line = json.dumps(event, ensure_ascii=False) + "\n"
+        async with self._spill_lock:
+            await asyncio.to_thread(self._append_spill, line)
+        self.stats["spilled"] += 1
+
+    def _append_spill(self, line: str) -> None:
+        with open(self._spill_path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    async def _refill_from_spill(self) -> None:
+        limit = min(self._queue.maxsize or 1000, self._spilled)
+        async with self._spill_lock:
+            lines = await asyncio.to_thread(self._read_spill, limit)
+            for line in lines:
+                self._queue.put_nowait(json.loads(line))
+            self._spilled -= len(lines)
+            if not self._spilled:
+                await asyncio.to_thread(self._spill_path.write_bytes, b"")
+                self._spill_offset = 0
+
+    def _read_spill(self, limit: int) -> List[str]:
+        lines: List[str] = []
+        with open(self._spill_path, "r", encoding="utf-8") as f:
+            f.seek(self._spill_offset)
+            while len(lines) < limit:
+                line = f.readline()
+                if not line:
+                    break
+                lines.append(line)
+            self._spill_offset = f.tell()
+        return lines
+
+    async def _run(self) -> None:
+        while True:
+            if self._spilled and self._queue.empty():
+                await self._refill_from_spill()
+            event = await self._queue.get()
+            try:
+                await self.cb(event)
+                self.stats["delivered"] += 1
+            except Exception:  # noqa: BLE001 - 订阅者异常隔离，不影响发布方与其他订阅者
+                self.stats["errors"] += 1
+                logger.exception("event subscriber %s failed on %s", self.name, event.get("type"))
+            finally:
+                self._queue.task_done()
+                self._pending -= 1
+                if self._pending == 0:
+                    self._idle.set()
+
 
 class InMemoryEventBus:
-    def __init__(self) -> None:
+    """
+    dispatch="inline"（默认）时 emit 直接 gather 所有订阅者；
+    dispatch="queued" 时每个订阅者拥有独立有界队列与 worker，emit 只负责入队，
+    订阅者延迟与异常不再进入工作流，关停前调用 drain()/close() 等待投递完成。
+    stats() 以 "<订阅序号>:<回调名>" 为键。
+    """
+
+    def __init__(
+        self,
+        dispatch: str = "inline",
+        queue_size: int = 1000,
+        overflow: str = "block",
+        spill_dir: Optional[str] = None,
+    ) -> None:
+        if dispatch not in ("inline", "queued"):
+            raise ValueError(f"unknown dispatch mode: {dispatch!r}")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"unknown overflow policy: {overflow!r}")
+        self.dispatch = dispatch
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.spill_dir = spill_dir
         self._subscribers: List[Callable[[Dict[str, Any]], Awaitable[None]]] = []
+        self._workers: List[_SubscriberWorker] = []
 
     def subscribe(self, cb: Callable[[Dict[str, Any]], Awaitable[None]]) -> None:
         self._subscribers.append(cb)
+        if self.dispatch == "queued":
+            self._workers.append(
+                _SubscriberWorker(cb, self.queue_size, self.overflow, self.spill_dir, index=len(self._workers))
+            )
 
     async def emit(self, event: Dict[str, Any]) -> None:
+        if self.dispatch == "queued":
+            for worker in self._workers:
+                await worker.put(event)
+            return
         await asyncio.gather(*(cb(event) for cb in self._subscribers))
 
+    async def drain(self) -> None:
+        """等待所有已入队（含落盘）事件投递完毕。"""
+        await asyncio.gather(*(w.drain() for w in self._workers))
+
+    async def close(self) -> None:
+        await self.drain()
+        await asyncio.gather(*(w.close() for w in self._workers))
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {w.name: {**w.stats, "queued": w._queue.qsize()} for w in self._workers}
+
 
 class RedisEventBus:
     """
     使用 Redis Pub/Sub 的事件总线。若未安装 redis.asyncio，将在初始化时抛错。
+    coalesce=True 时，同一事件循环 tick 内的 emit 合并为一次 pipeline 往返；
+    codec 可选 "json"（有 orjson 时使用 orjson）或 "msgpack"。
     """
 
     def __init__(
@@ -31,15 +234,29 @@ class RedisEventBus:
         url: str | None = None,
         channel: str = "agent-events",
         auto_listen: bool = True,
+        codec: str = "json",
+        coalesce: bool = True,
+        max_batch: int = 1000,
+        client: Any = None,
     ) -> None:
-        if redis_async is None:
+        if client is None and redis_async is None:
             raise RuntimeError("请先安装 `redis` 依赖以启用 RedisEventBus。")
+        if codec not in ("json", "msgpack"):
+            raise ValueError(f"unknown codec: {codec!r}")
+        if codec == "msgpack" and msgpack is None:
+            raise RuntimeError("请先安装 `msgpack` 依赖以启用 msgpack 编码。")
         self.url = url or os.getenv("REDIS_URL", "redis://localhost:6379/0")
         self.channel = channel
-        self._redis = redis_async.from_url(self.url, decode_responses=True)
+        self.codec = codec
+        self.coalesce = coalesce
+        self.max_batch = max_batch
+        # 载荷可能是二进制帧，统一以 bytes 收发，由 decode_event 解码
+        self._redis = client if client is not None else redis_async.from_url(self.url)
         self._subscribers: List[Callable[[Dict[str, Any]], Awaitable[None]]] = []
         self._listener_task: Optional[asyncio.Task[None]] = None
         self._auto_listen = auto_listen
+        self._pending: List[Tuple[bytes, asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task[None]] = None
 
     def subscribe(self, cb: Callable[[Dict[str, Any]], Awaitable[None]]) -> None:
         self._subscribers.append(cb)
@@ -47,15 +264,44 @@ class RedisEventBus:
             self._listener_task = asyncio.create_task(self._listen_loop())
 
     async def emit(self, event: Dict[str, Any]) -> None:
-        payload = json.dumps(event, ensure_ascii=False)
-        await self._redis.publish(self.channel, payload)
+        payload = encode_event(event, self.codec)
+        if not self.coalesce:
+            await self._redis.publish(self.channel, payload)
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.append((payload, fut))
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+        await fut
+
+    async def _flush_loop(self) -> None:
+        # 让出一次事件循环，使同一 tick 内其他协程的 emit 进入同一批
+        await asyncio.sleep(0)
+        # 单个 flush 任务串行发送各批，保证发布顺序
+        while self._pending:
+            batch, self._pending = self._pending[: self.max_batch], self._pending[self.max_batch :]
+            try:
+                async with self._redis.pipeline(transaction=False) as pipe:
+                    for payload, _ in batch:
+                        pipe.publish(self.channel, payload)
+                    await pipe.execute()
+            except Exception as exc:  # noqa: BLE001 - 错误回传给各自的 emit 调用方
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(exc)
+            else:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_result(None)
 
     async def close(self) -> None:
+        if self._flush_task is not None:
+            await self._flush_task
         if self._listener_task:
             self._listener_task.cancel()
             with contextlib.suppress(asyncio.CancelledError):
                 await self._listener_task
-        await self._redis.close()
+        await self._redis.aclose()
 
     async def _listen_loop(self) -> None:
         pubsub = self._redis.pubsub()
@@ -64,9 +310,199 @@ class RedisEventBus:
             async for message in pubsub.listen():
                 if message.get("type") != "message":
                     continue
-                data = json.loads(message["data"])
+                data = decode_event(message["data"])
                 await asyncio.gather(*(cb(data) for cb in self._subscribers))
         finally:
             await pubsub.unsubscribe(self.channel)
-            await pubsub.close()
+            await pubsub.aclose()
+
+
+class RedisStreamEventBus:
+    """
+    基于 Redis Streams + 消费组的事件总线：事件持久化在 stream 中，监听方离线期间不丢失；
+    同一消费组内的多个 worker 分摊事件（每条只被一个 worker 处理），而非 Pub/Sub 的全量广播。
+    订阅回调全部成功后才 XACK；失败或 worker 崩溃留下的 pending 条目由 XAUTOCLAIM 认领重投。
+    部分订阅者失败时，已成功的订阅者序号记入 <stream>:progress 哈希，重投时只执行其余订阅者
+    （同一消费组的 worker 需按相同顺序订阅相同回调）；投递次数超过 max_deliveries 或无法解码的条目
+    转入 <stream>:dlq 并确认，不再无限重投。
+    """
+
+    def __init__(
+        self,
+        url: str | None = None,
+        stream: str = "agent-events",
+        group: str = "agent-workers",
+        consumer: str | None = None,
+        maxlen: int = 100_000,
+        batch_size: int = 100,
+        block_ms: int = 1000,
+        claim_idle_ms: int = 60_000,
+        max_deliveries: int = 5,
+        auto_listen: bool = True,
+        client: Any = None,
+    ) -> None:
+        if client is None and redis_async is None:
+            raise RuntimeError("请先安装 `redis` 依赖以启用 RedisStreamEventBus。")
+        self.url = url or os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        self.stream = stream
+        self.dead_letter_stream = f"{stream}:dlq"
+        self.progress_key = f"{stream}:progress"
+        self.group = group
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.maxlen = maxlen
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.claim_idle_ms = claim_idle_ms
+        self.max_deliveries = max_deliveries
+        # client 允许注入 fakeredis 等本地替身
+        self._redis = client if client is not None else redis_async.from_url(self.url, decode_responses=True)
+        self._subscribers: List[Callable[[Dict[str, Any]], Awaitable[None]]] = []
+        self._listener_task: Optional[asyncio.Task[None]] = None
+        self._auto_listen = auto_listen
+        self._group_ready = False
+        self._last_reclaim = float("-inf")
+
+    def subscribe(self, cb: Callable[[Dict[str, Any]], Awaitable[None]]) -> None:
+        self._subscribers.append(cb)
+        if self._auto_listen and self._listener_task is None:
+            self._listener_task = asyncio.create_task(self._listen_loop())
+
+    async def emit(self, event: Dict[str, Any]) -> None:
+        payload = encode_event(event)
+        # MAXLEN ~ 近似裁剪，按宏节点整块删除，开销远低于精确裁剪
+        await self._redis.xadd(self.stream, {"data": payload}, maxlen=self.maxlen, approximate=True)
+
+    async def close(self) -> None:
+        if self._listener_task:
+            self._listener_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._listener_task
+        await self._redis.aclose()
 
+    async def ensure_group(self) -> None:
+        if self._group_ready:
+            return
+        try:
+            await self._redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except Exception as exc:  # noqa: BLE001 - 消费组已存在
+            if "BUSYGROUP" not in str(exc):
+                raise
+        self._group_ready = True
+
+    async def poll(self) -> int:
+        """先认领超时未确认的条目，再读取一批新事件；返回本轮处理的条目数。"""
+        await self.ensure_group()
+        handled = 0
+        now = time.monotonic()
+        # 认领扫描频率与空闲阈值挂钩，避免每轮多一次往返
+        if now - self._last_reclaim >= self.claim_idle_ms / 2000:
+            self._last_reclaim = now
+            handled += await self.reclaim()
+        resp = await self._redis.xreadgroup(
+            self.group, self.consumer, {self.stream: ">"}, count=self.batch_size, block=self.block_ms
+        )
+        for _, entries in resp or []:
+            handled += await self._process(entries)
+        return handled
+
+    async def reclaim(self) -> int:
+        """XAUTOCLAIM 空闲超过 claim_idle_ms 的 pending 条目（如崩溃 worker 遗留）并重新处理。"""
+        handled = 0
+        start_id = "0-0"
+        while True:
+            resp = await self._redis.xautoclaim(
+                self.stream,
+                self.group,
+                self.consumer,
+                min_idle_time=self.claim_idle_ms,
+                start_id=start_id,
+                count=self.batch_size,
+            )
+            start_id, entries = resp[0], resp[1]
+            handled += await self._process(entries, reclaimed=True)
+            if not entries or start_id in ("0-0", b"0-0"):
+                return handled
+
+    async def _process(self, entries: List[Any], reclaimed: bool = False) -> int:
+        acked: List[str] = []
+        dead: List[Tuple[str, Dict[str, Any], str]] = []
+        progress: Dict[str, str] = {}
+        deliveries: Dict[str, int] = {}
+        done_before: Dict[str, List[int]] = {}
+        live = [entry_id for entry_id, fields in entries if fields]
+        if reclaimed and live:
+            # 只有认领重投的条目才可能带有投递次数与部分成功记录，新读取的条目不多一次往返
+            deliveries, done_before = await self._delivery_state(live)
+        for entry_id, fields in entries:
+            if not fields:  # 条目已被 MAXLEN 裁剪
+                acked.append(entry_id)
+                continue
+            if deliveries.get(entry_id, 1) > self.max_deliveries:
+                dead.append((entry_id, fields, f"exceeded {self.max_deliveries} deliveries"))
+                continue
+            try:
+                data = decode_event(fields["data"])
+            except Exception as exc:  # noqa: BLE001 - 畸形载荷重投也不会成功，直接进死信
+                dead.append((entry_id, fields, f"undecodable: {exc!r}"))
+                continue
+            done = done_before.get(entry_id, [])
+            todo = [(index, cb) for index, cb in enumerate(self._subscribers) if index not in done]
+            results = await asyncio.gather(*(cb(data) for _, cb in todo), return_exceptions=True)
+            errors = [r for r in results if isinstance(r, Exception)]
+            if errors:
+                succeeded = done + [index for (index, _), r in zip(todo, results) if not isinstance(r, Exception)]
+                progress[entry_id] = json.dumps(sorted(succeeded))
+                logger.error("stream entry %s failed in %d subscriber(s): %r", entry_id, len(errors), errors[0])
+                continue
+            acked.append(entry_id)
+        if acked or dead or progress:
+            await self._settle(acked, dead, progress, cleanup=reclaimed)
+        return len(entries)
+
+    async def _delivery_state(self, entry_ids: List[str]) -> Tuple[Dict[str, int], Dict[str, List[int]]]:
+        """一次往返取回各条目的投递次数（XPENDING）与已成功的订阅者序号。"""
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for entry_id in entry_ids:
+                pipe.xpending_range(self.stream, self.group, min=entry_id, max=entry_id, count=1)
+            pipe.hmget(self.progress_key, entry_ids)
+            *pending, done = await pipe.execute()
+        deliveries = {rows[0]["message_id"]: rows[0]["times_delivered"] for rows in pending if rows}
+        done_before = {entry_id: json.loads(raw) for entry_id, raw in zip(entry_ids, done) if raw}
+        return deliveries, done_before
+
+    async def _settle(
+        self,
+        acked: List[str],
+        dead: List[Tuple[str, Dict[str, Any], str]],
+        progress: Dict[str, str],
+        cleanup: bool,
+    ) -> None:
+        # 死信写入与 XACK 放在同一事务中，条目不会既在死信里又留在 pending 列表
+        async with self._redis.pipeline(transaction=bool(dead)) as pipe:
+            for entry_id, fields, reason in dead:
+                logger.error("stream entry %s moved to %s: %s", entry_id, self.dead_letter_stream, reason)
+                pipe.xadd(
+                    self.dead_letter_stream,
+                    {**fields, "entry_id": entry_id, "reason": reason},
+                    maxlen=self.maxlen,
+                    approximate=True,
+                )
+            settled = acked + [entry_id for entry_id, _, _ in dead]
+            if settled:
+                # 整批一次 XACK，一个往返确认多条
+                pipe.xack(self.stream, self.group, *settled)
+                if cleanup:
+                    pipe.hdel(self.progress_key, *settled)
+            if progress:
+                pipe.hset(self.progress_key, mapping=progress)
+            await pipe.execute()
+
+    async def _listen_loop(self) -> None:
+        while True:
+            try:
+                await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa: BLE001 - 连接抖动时退避重试
+                logger.exception("redis stream poll failed")
+                await asyncio.sleep(1)
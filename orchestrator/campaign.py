@@ -0,0 +1,315 @@
+"""
+批量营销活动执行器：流式读取 JSONL/CSV 任务，批量写入 task_state，
+以有界并发 + 按平台限流驱动 ContentMarketingFlow，并支持崩溃后断点续跑。
+
+    python -m orchestrator.campaign tasks.jsonl --concurrency 50 --rate twitter=5 --rate weibo=2
+"""
+import argparse
+import asyncio
+import contextlib
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Any, AsyncIterator, Deque, Dict, Iterable, Iterator, List, Optional
+
+from llm.governor import TokenBucket
+from orchestrator.content_marketing_flow import ContentMarketingFlow
+from orchestrator.pipeline import StagedPipeline
+from storage.state import TaskStore
+
+# 断点续跑时直接跳过的终态
+DONE_STATUSES = ("success",)
+
+
+def _task_from_record(record: Dict[str, Any], campaign: str, line_no: int) -> Dict[str, Any]:
+    payload = dict(record.get("payload") or {})
+    for key in ("topic", "style", "platform"):
+        if key in record and key not in payload:
+            payload[key] = record[key]
+    platforms = record.get("platforms")
+    if platforms and "platforms" not in payload:
+        if isinstance(platforms, str):
+            # CSV 中写作 "twitter;weibo"
+            platforms = [p.strip() for p in platforms.split(";") if p.strip()]
+        payload["platforms"] = platforms
+    # 未显式给出 task_id 时按 活动名 + 行号 + 内容 生成确定性 id，重跑同一文件得到相同 id
+    task_id = record.get("task_id") or str(
+        uuid.uuid5(uuid.NAMESPACE_URL, f"{campaign}:{line_no}:{json.dumps(payload, sort_keys=True, ensure_ascii=False)}")
+    )
+    return {
+        "task_id": task_id,
+        "type": record.get("type", "content.generate"),
+        "payload": payload,
+        "meta": {"retries": 0, "status": "pending", "campaign": campaign},
+    }
+
+
+def iter_tasks(path: str | Path, campaign: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """逐行读取 .jsonl / .csv，按需生成任务，不把整个文件载入内存。"""
+    path = Path(path)
+    campaign = campaign or path.stem
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.suffix.lower() == ".csv":
+            for line_no, row in enumerate(csv.DictReader(f), start=1):
+                yield _task_from_record({k: v for k, v in row.items() if v not in (None, "")}, campaign, line_no)
+            return
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if line:
+                yield _task_from_record(json.loads(line), campaign, line_no)
+
+
+def _reject_platforms(tasks: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """读取时逐条检查：只有 --durable 会按 platforms 分发到多个平台，其它模式遇到这类任务立即退出。"""
+    for task in tasks:
+        if task["payload"].get("platforms"):
+            raise SystemExit(f"task {task['task_id']} sets platforms, which requires --durable")
+        yield task
+
+
+class CampaignStats:
+    """吞吐与延迟分位统计；延迟只保留最近 window 个样本，内存恒定。"""
+
+    def __init__(self, window: int = 10_000) -> None:
+        self.started = time.monotonic()
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+        self._latencies: Deque[float] = deque(maxlen=window)
+
+    def observe(self, latency: float, ok: bool) -> None:
+        self._latencies.append(latency)
+        if ok:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+
+    def percentile(self, q: float) -> float:
+        if not self._latencies:
+            return 0.0
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started
+        done = self.succeeded + self.failed
+        return {
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "throughput_per_s": round(done / elapsed, 2) if elapsed > 0 else 0.0,
+            "p50_s": round(self.percentile(0.50), 4),
+            "p95_s": round(self.percentile(0.95), 4),
+            "p99_s": round(self.percentile(0.99), 4),
+        }
+
+
+class CampaignRunner:
+    def __init__(
+        self,
+        store: TaskStore,
+        flow: ContentMarketingFlow,
+        concurrency: int = 50,
+        rate_limits: Optional[Dict[str, float]] = None,
+        batch_size: int = 500,
+        human_auto_approve: bool = True,
+        pipeline: Optional[StagedPipeline] = None,
+        max_parked: int = 10_000,
+    ) -> None:
+        """
+        rate_limits 为每个平台每秒放行的任务数：令牌在任务进入 worker 之前获取，等待期间不占用并发槽位。
+        等待令牌的任务暂存在各平台的等待队列中，所有平台合计最多 max_parked 个；超过后读取才会暂停，
+        此时其它平台的任务也要等待受限平台放行（内存上限与平台隔离之间的取舍）。
+        给出 pipeline 时任务改由分阶段流水线执行，concurrency 与 rate_limits 不再生效（在流水线的阶段配置中设置，
+        限流只作用于 publisher 阶段）。
+        """
+        self.store = store
+        self.flow = flow
+        self.pipeline = pipeline
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.human_auto_approve = human_auto_approve
+        self.limiters = {platform: TokenBucket(rate) for platform, rate in (rate_limits or {}).items()}
+        self.max_parked = max_parked
+        self.stats = CampaignStats()
+
+    async def run(
+        self,
+        tasks: Iterable[Dict[str, Any]],
+        report_every: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        if self.pipeline is not None:
+            await self.pipeline.run(self._load(tasks), on_result=self._on_pipeline_result, report_every=report_every)
+            return {**self.stats.snapshot(), "stages": self.pipeline.stats()["stages"]}
+        queue: asyncio.Queue[Optional[Dict[str, Any]]] = asyncio.Queue(maxsize=self.concurrency * 2)
+        # 限流平台的任务先进各自的等待队列，取到令牌后才进入共享队列：等待令牌不占用 worker，
+        # 在暂存总数达到 max_parked 之前也不会让排在后面的其它平台任务被堵住
+        lanes: Dict[str, asyncio.Queue[Optional[Dict[str, Any]]]] = {
+            platform: asyncio.Queue() for platform in self.limiters
+        }
+        parked = asyncio.Semaphore(self.max_parked)
+        feeders = [
+            asyncio.create_task(self._feed(lane, self.limiters[p], queue, parked)) for p, lane in lanes.items()
+        ]
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.concurrency)]
+        reporter = asyncio.create_task(self._report_loop(report_every)) if report_every else None
+        try:
+            async for task in self._load(tasks):
+                lane = lanes.get(task["payload"].get("platform", ""))
+                if lane is None:
+                    await queue.put(task)
+                else:
+                    await parked.acquire()
+                    lane.put_nowait(task)
+            for lane in lanes.values():
+                lane.put_nowait(None)
+            await asyncio.gather(*feeders)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for worker in [*feeders, *workers]:
+                worker.cancel()
+            if reporter is not None:
+                reporter.cancel()
+        return self.stats.snapshot()
+
+    async def _load(self, tasks: Iterable[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+        """按批 upsert，并依据返回的当前状态跳过已完成任务（断点续跑）。每批在线程中读取，不阻塞事件循环。"""
+        source = iter(tasks)
+        while True:
+            batch = await asyncio.to_thread(list, itertools.islice(source, self.batch_size))
+            if not batch:
+                return
+            async for pending in self._upsert_batch(batch):
+                yield pending
+
+    async def _upsert_batch(self, batch: List[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+        statuses = await self.store.upsert_many(batch)
+        for task in batch:
+            if statuses.get(task["task_id"]) in DONE_STATUSES:
+                self.stats.skipped += 1
+                continue
+            yield task
+
+    async def _feed(
+        self,
+        lane: "asyncio.Queue[Optional[Dict[str, Any]]]",
+        limiter: TokenBucket,
+        queue: "asyncio.Queue[Optional[Dict[str, Any]]]",
+        parked: asyncio.Semaphore,
+    ) -> None:
+        while True:
+            task = await lane.get()
+            if task is None:
+                return
+            parked.release()
+            await limiter.acquire()
+            await queue.put(task)
+
+    async def _worker(self, queue: "asyncio.Queue[Optional[Dict[str, Any]]]") -> None:
+        while True:
+            task = await queue.get()
+            if task is None:
+                return
+            start = time.monotonic()
+            try:
+                result = await self.flow.run(task, human_auto_approve=self.human_auto_approve)
+                ok = "error" not in result
+            except Exception:  # noqa: BLE001 - 单个任务失败不影响整批
+                ok = False
+            self.stats.observe(time.monotonic() - start, ok)
+
+    async def _on_pipeline_result(self, result: Dict[str, Any], latency: float) -> None:
+        self.stats.observe(latency, "error" not in result)
+
+    async def _report_loop(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            print({"campaign": self.stats.snapshot()}, file=sys.stderr, flush=True)
+
+
+def _parse_rates(values: List[str]) -> Dict[str, float]:
+    rates: Dict[str, float] = {}
+    for value in values:
+        platform, _, rate = value.partition("=")
+        rates[platform] = float(rate)
+    return rates
+
+
+async def _main(args: argparse.Namespace) -> None:
+    from monitoring.metrics import Metrics
+    from mq.queue import InMemoryEventBus
+    from storage.audit import BufferedAuditLog
+    from storage.postgres import postgres_lifespan, run_migrations
+
+    if args.durable and args.pipeline:
+        raise SystemExit("--durable cannot be combined with --pipeline")
+    await run_migrations()
+    async with postgres_lifespan(max_size=args.pool_size), contextlib.AsyncExitStack() as stack:
+        store = TaskStore()
+        bus = InMemoryEventBus(dispatch="queued")
+        audit = BufferedAuditLog()
+        bus.subscribe(Metrics().handle_event)
+        bus.subscribe(audit.record_event)
+        flow: Any = ContentMarketingFlow(store, bus)
+        if args.durable:
+            # 每个阶段的产出写入 LangGraph checkpoint，重跑失败任务时从失败的阶段继续
+            from orchestrator.durable_flow import DurableContentMarketingFlow, postgres_checkpointer
+
+            saver = await stack.enter_async_context(postgres_checkpointer())
+            platform_concurrency = {p: int(n) for p, n in _parse_rates(args.platform_concurrency).items()}
+            flow = DurableContentMarketingFlow(flow, saver, platform_concurrency=platform_concurrency)
+        pipeline = None
+        if args.pipeline:
+            # 平台限流放在 publisher 阶段，只阻塞发布，不阻塞上游生成
+            stages: Dict[str, Dict[str, Any]] = {"publisher": {"platform_rates": _parse_rates(args.rate)}}
+            for stage, value in _parse_rates(args.stage).items():
+                stages.setdefault(stage, {})["concurrency"] = int(value)
+            pipeline = StagedPipeline(flow, stages=stages)
+        runner = CampaignRunner(
+            store,
+            flow,
+            concurrency=args.concurrency,
+            rate_limits=_parse_rates(args.rate),
+            batch_size=args.batch_size,
+            pipeline=pipeline,
+        )
+        tasks = iter_tasks(args.path, args.campaign)
+        if not args.durable:
+            tasks = _reject_platforms(tasks)
+        summary = await runner.run(tasks, report_every=args.report_every)
+        await bus.close()
+        await audit.close()
+        print({"campaign": summary})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a bulk content marketing campaign")
+    parser.add_argument("path", help="tasks file (.jsonl or .csv)")
+    parser.add_argument("--campaign", default=None, help="campaign name used for deterministic task ids")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("CAMPAIGN_CONCURRENCY", "50")))
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--pool-size", type=int, default=20)
+    parser.add_argument("--rate", action="append", default=[], help="per-platform limit, e.g. twitter=5 (tasks/s)")
+    parser.add_argument("--report-every", type=float, default=5.0)
+    parser.add_argument("--pipeline", action="store_true", help="run stages as separate worker pools")
+    parser.add_argument("--stage", action="append", default=[], help="pipeline stage workers, e.g. writer=16")
+    parser.add_argument("--durable", action="store_true", help="checkpoint stage results in Postgres via LangGraph")
+    parser.add_argument(
+        "--platform-concurrency",
+        action="append",
+        default=[],
+        help="with --durable: max concurrent publish branches per platform, e.g. twitter=2",
+    )
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,25 @@
 import asyncio
-from typing import Any, Dict, Callable, Optional, Tuple
+from typing import Any, Awaitable, Dict, Callable, Optional, Tuple
 
 from agents.content_agent import ContentAgent
 from agents.critic_agent import CriticAgent
 from agents.strategy_agent import StrategyAgent
 from agents.execution_agent import ExecutionAgent
 from agents.interaction_agent import InteractionAgent
+from monitoring.tracing import IOSpan, StageSpan, TaskSpan
 from storage.state import TaskStore
 from mq.queue import InMemoryEventBus
 
+# 阶段顺序，每个阶段对应 ContentMarketingFlow._stage_<name>；orchestrator.pipeline 按此拆分工作池
+STAGES = ("strategy", "writer", "critic", "review", "publisher", "monitor")
+
 
 class ContentMarketingFlow:
-    def __init__(self, store: TaskStore, bus: InMemoryEventBus):
+    def __init__(self, store: TaskStore, bus: InMemoryEventBus, stream_deltas: bool = True):
         self.store = store
         self.bus = bus
+        # 写作/润色阶段流式生成，并把分片以 content.draft.delta / content.refined.delta 事件实时广播
+        self.stream_deltas = stream_deltas
         self.strategy = StrategyAgent()
         self.writer = ContentAgent()
         self.critic = CriticAgent()
@@ -21,95 +27,224 @@ class ContentMarketingFlow:
         self.monitor = InteractionAgent()
 
     async def run(self, task: Dict[str, Any], human_auto_approve: bool = True) -> Dict[str, Any]:
+        # 任务内的阶段/尝试/IO 埋点都挂在以 task_id 为上下文的根 span 下
+        with TaskSpan(task["task_id"]):
+            state = await self.begin(task, human_auto_approve)
+            for name in STAGES:
+                failure = await self.run_stage(name, state)
+                if failure is not None:
+                    return failure
+            return await self.finish(state)
+
+    async def begin(
+        self, task: Dict[str, Any], human_auto_approve: bool = True, fan_out: bool = False
+    ) -> Dict[str, Any]:
+        """
+        标记任务开始，返回在各阶段之间传递的任务状态。
+        只有按平台分发的执行器（DurableContentMarketingFlow，fan_out=True）支持 payload.platforms，
+        其它入口收到这类任务时直接抛 ValueError，而不是只发布到 payload.platform 一个平台。
+        """
         task_id = task["task_id"]
-        await self.store.set_status(task_id, "running")
-
-        async def with_retry(
-            name: str,
-            fn: Callable[[], Any],
-            retries: int = 2,
-            rollback: Optional[Callable[[], Any]] = None,
-        ) -> Tuple[bool, Any]:
-            last_err: Optional[Exception] = None
+        if task.get("payload", {}).get("platforms") and not fan_out:
+            raise ValueError(f"task {task_id} sets payload.platforms, which requires DurableContentMarketingFlow")
+        await self._set_status(task_id, "running")
+        await self._emit(
+            {"type": "task.started", "task_id": task_id, "platform": task.get("payload", {}).get("platform")}
+        )
+        return {"task": task, "task_id": task_id, "human_auto_approve": human_auto_approve}
+
+    async def run_stage(self, name: str, state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """执行一个阶段并把产出写入 state；失败时标记任务失败并返回错误结果，成功返回 None。"""
+        failure = await getattr(self, f"_stage_{name}")(state)
+        if failure is None:
+            return None
+        return await self.fail(state["task_id"], failure)
+
+    async def fail(self, task_id: str, failure: Dict[str, Any]) -> Dict[str, Any]:
+        await self._set_status(task_id, "error")
+        await self._emit({"type": "task.failed", "task_id": task_id, "status": "error", "error": failure.get("error")})
+        return failure
+
+    async def mark_running(self, task_id: str, event: Dict[str, Any]) -> None:
+        """任务从审核/失败中恢复：状态回到 running 并广播 event。"""
+        await self._set_status(task_id, "running")
+        await self._emit(event)
+
+    async def finish(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        await self._set_status(state["task_id"], "success")
+        return {
+            "task_id": state["task_id"],
+            "final": {
+                "plan": state["plan"],
+                "content": state["content"],
+                "publish": state["publish"],
+                "monitor": state["monitor"],
+            },
+        }
+
+    async def _emit(self, event: Dict[str, Any]) -> None:
+        with IOSpan("bus", "emit"):
+            await self.bus.emit(event)
+
+    def _delta_emitter(self, task_id: str, event_type: str) -> Optional[Callable[[Dict[str, Any]], Awaitable[None]]]:
+        """分片回调：seq 为分片序号，重试时从 0 重新开始，消费方据此丢弃上一次尝试的部分内容。"""
+        if not self.stream_deltas:
+            return None
+
+        async def on_delta(chunk: Dict[str, Any]) -> None:
+            await self._emit({"type": event_type, "task_id": task_id, "seq": chunk["index"], "delta": chunk["delta"]})
+
+        return on_delta
+
+    async def _set_status(self, task_id: str, status: str) -> None:
+        with IOSpan("store", "set_status"):
+            await self.store.set_status(task_id, status)
+
+    async def _with_retry(
+        self,
+        task_id: str,
+        name: str,
+        fn: Callable[[], Any],
+        retries: int = 2,
+        rollback: Optional[Callable[[], Any]] = None,
+    ) -> Tuple[bool, Any]:
+        last_err: Optional[Exception] = None
+        with StageSpan(name) as stage:
             for attempt in range(retries + 1):
                 try:
-                    result = await fn()
+                    with stage.attempt():
+                        result = await fn()
                     return True, result
                 except Exception as e:  # noqa: BLE001 - controlled retry wrapper
                     last_err = e
                     if attempt < retries:
-                        await asyncio.sleep(0.2 * (attempt + 1))
+                        await self._emit(
+                            {"type": "stage.retry", "task_id": task_id, "stage": name, "attempt": attempt + 1, "error": str(e)}
+                        )
+                        await stage.backoff(0.2 * (attempt + 1))
                         continue
             if rollback is not None:
                 try:
                     await rollback()
                 except Exception:
                     pass
-            return False, {"error": f"{name} failed: {last_err}"}
+        return False, {"error": f"{name} failed: {last_err}"}
 
-        # Plan
-        ok, plan = await with_retry("strategy", lambda: self.strategy.plan(task))
+    async def _stage_strategy(self, state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        task, task_id = state["task"], state["task_id"]
+        ok, plan = await self._with_retry(task_id, "strategy", lambda: self.strategy.plan(task))
         if not ok:
-            await self.store.set_status(task_id, "error")
             return plan
-        await self.bus.emit({"type": "plan.created", "task_id": task_id, "plan": plan})
-
-        # Write
-        ok, draft = await with_retry("writer", lambda: self.writer.generate(task, plan))
+        state["plan"] = plan
+        await self._emit({"type": "plan.created", "task_id": task_id, "plan": plan})
+        return None
+
+    async def _stage_writer(self, state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        task, task_id = state["task"], state["task_id"]
+        on_delta = self._delta_emitter(task_id, "content.draft.delta")
+        ok, draft = await self._with_retry(
+            task_id, "writer", lambda: self.writer.generate(task, state["plan"], on_delta=on_delta)
+        )
         if not ok:
-            await self.store.set_status(task_id, "error")
             return draft
-        await self.bus.emit({"type": "content.draft", "task_id": task_id, "draft": draft})
-
-        # Critic
-        ok, improved = await with_retry("critic", lambda: self.critic.refine(task, draft))
+        state["draft"] = draft
+        await self._emit({"type": "content.draft", "task_id": task_id, "draft": draft})
+        return None
+
+    async def _stage_critic(self, state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        task, task_id = state["task"], state["task_id"]
+        on_delta = self._delta_emitter(task_id, "content.refined.delta")
+        ok, improved = await self._with_retry(
+            task_id, "critic", lambda: self.critic.refine(task, state["draft"], on_delta=on_delta)
+        )
         if not ok:
-            await self.store.set_status(task_id, "error")
             return improved
-        await self.bus.emit({"type": "content.refined", "task_id": task_id, "content": improved})
+        state["content"] = improved
+        await self._emit({"type": "content.refined", "task_id": task_id, "content": improved})
+        return None
 
+    async def _stage_review(self, state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         # Human review conditional branch
-        if not human_auto_approve:
-            await self.store.set_status(task_id, "human_required")
-            # In real system, wait for external approval event
-            # Here we simulate approval
-            await self.bus.emit({"type": "human.review.required", "task_id": task_id})
-            await asyncio.sleep(0.1)
-            await self.store.set_status(task_id, "running")
+        if state["human_auto_approve"]:
+            return None
+        task_id = state["task_id"]
+        await self.request_review(state)
+        # 这里模拟审批通过；真实的挂起/恢复见 orchestrator.durable_flow（LangGraph interrupt）
+        await asyncio.sleep(0.1)
+        await self._set_status(task_id, "running")
+        return None
+
+    async def request_review(self, state: Dict[str, Any]) -> None:
+        await self._set_status(state["task_id"], "human_required")
+        await self._emit({"type": "human.review.required", "task_id": state["task_id"], "content": state.get("content")})
+
+    async def _stage_publisher(self, state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        task, task_id = state["task"], state["task_id"]
 
         # Publish with rollback
         async def publish_action():
-            return await self.publisher.publish(task, improved)
+            return await self.publisher.publish(task, state["content"])
 
         async def publish_rollback():
             await self.publisher.rollback(task)
 
-        ok, publish_res = await with_retry(
-            "publisher", publish_action, retries=2, rollback=publish_rollback
+        ok, publish_res = await self._with_retry(
+            task_id, "publisher", publish_action, retries=2, rollback=publish_rollback
         )
         if not ok:
-            await self.store.set_status(task_id, "error")
             return publish_res
-        await self.bus.emit({"type": "content.published", "task_id": task_id, "result": publish_res})
-
-        # Monitor
-        ok, monitor_res = await with_retry(
-            "monitor", lambda: self.monitor.analyze(task, publish_res)
+        state["publish"] = publish_res
+        await self._emit({"type": "content.published", "task_id": task_id, "result": publish_res})
+        return None
+
+    async def _stage_monitor(self, state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        task, task_id = state["task"], state["task_id"]
+        ok, monitor_res = await self._with_retry(
+            task_id, "monitor", lambda: self.monitor.analyze(task, state["publish"])
         )
         if not ok:
-            await self.store.set_status(task_id, "error")
             return monitor_res
-        await self.bus.emit({"type": "content.analytics", "task_id": task_id, "data": monitor_res})
-
-        await self.store.set_status(task_id, "success")
-        return {
-            "task_id": task_id,
-            "final": {
-                "plan": plan,
-                "content": improved,
-                "publish": publish_res,
-                "monitor": monitor_res,
-            },
+        state["monitor"] = monitor_res
+        # 多平台分支只上报单平台数据，任务级的 content.analytics 由 aggregate() 汇总后发出
+        event_type = "content.platform.analytics" if state.get("fan_out") else "content.analytics"
+        await self._emit({"type": event_type, "task_id": task_id, "data": monitor_res})
+        return None
+
+    async def run_platform(self, state: Dict[str, Any], platform: str) -> Dict[str, Any]:
+        """
+        多平台分发的单个分支：按平台改写 → 发布（带回滚）→ 采集数据，复用 publisher / monitor 阶段实现。
+        返回 {"platform", "content", "publish", "monitor"}；失败时返回 {"platform", "error"}，任务状态由 aggregate() 决定。
+        """
+        task = state["task"]
+        branch = {
+            **state,
+            "task": {**task, "payload": {**task.get("payload", {}), "platform": platform}},
+            "content": self.publisher.adapt(state["content"], platform),
+            "fan_out": True,
         }
-
-
+        failure = await self._stage_publisher(branch)
+        if failure is None:
+            failure = await self._stage_monitor(branch)
+        if failure is not None:
+            return {"platform": platform, "error": failure["error"]}
+        return {"platform": platform, **{key: branch[key] for key in ("content", "publish", "monitor")}}
+
+    async def aggregate(self, state: Dict[str, Any], branches: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """汇总各平台分支：任一平台失败则任务失败；否则把 publish / monitor 写入 state 并发出汇总的 content.analytics。"""
+        task_id = state["task_id"]
+        failed = sorted(p for p, branch in branches.items() if "error" in branch)
+        if failed:
+            errors = "; ".join(f"{p}: {branches[p]['error']}" for p in failed)
+            return await self.fail(task_id, {"error": f"publishing failed on {len(failed)} platform(s): {errors}"})
+        totals: Dict[str, int] = {}
+        for branch in branches.values():
+            for key, value in branch["monitor"].get("metrics", {}).items():
+                totals[key] = totals.get(key, 0) + value
+        state["publish"] = {p: branches[p]["publish"] for p in sorted(branches)}
+        state["monitor"] = {
+            "platforms": {p: branches[p]["monitor"] for p in sorted(branches)},
+            "metrics": totals,
+            "schema": "monitor.analytics.aggregate.v1",
+        }
+        await self._emit({"type": "content.analytics", "task_id": task_id, "data": state["monitor"]})
+        return None
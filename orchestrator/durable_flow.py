@@ -0,0 +1,294 @@
+"""
+可恢复的内容营销工作流：把 ContentMarketingFlow 的各阶段编译为 LangGraph StateGraph，
+每个阶段的产出（plan / draft / content / publish / monitor）在节点完成后写入 checkpoint（thread_id = task_id）。
+
+- worker 崩溃或阶段重试耗尽后，再次 run(task) 或 resume(task_id) 会从失败的节点继续，不会重做已完成的 LLM 调用
+- 人工审核是真正的 interrupt()：run() 在审核点返回 {"status": "human_required"}，不占用协程或数据库连接；
+  数小时后任意进程调用 resume(task_id, approval={"approved": True}) 即从审核点继续
+- payload 带 platforms 列表时，策划/写作/润色只做一次，之后以 Send 为每个平台并行分出「改写 → 发布 → 采集」分支，
+  由 aggregate 节点汇总；部分平台失败时 resume 只重跑失败的平台，已发布的平台不会重复发布
+
+    async with postgres_checkpointer() as saver:
+        durable = DurableContentMarketingFlow(flow, saver)
+        await durable.run(task, human_auto_approve=False)
+        await durable.resume(task["task_id"], approval={"approved": True, "content": edited})
+"""
+import asyncio
+import contextlib
+import os
+import weakref
+from typing import Annotated, Any, AsyncIterator, Dict, List, Optional, TypedDict
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from langgraph.graph import END, START, StateGraph
+from langgraph.types import Command, Send, interrupt
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+from monitoring.tracing import TaskSpan
+from orchestrator.content_marketing_flow import ContentMarketingFlow
+from storage.postgres import DEFAULT_DSN
+
+# 阶段 -> 写入 state 的产出字段；review 没有产出
+STAGE_OUTPUTS = {
+    "strategy": "plan",
+    "writer": "draft",
+    "critic": "content",
+    "publisher": "publish",
+    "monitor": "monitor",
+}
+
+
+def _merge_branches(current: Optional[Dict[str, Any]], update: Dict[str, Any]) -> Dict[str, Any]:
+    return {**(current or {}), **update}
+
+
+class FlowState(TypedDict, total=False):
+    task: Dict[str, Any]
+    task_id: str
+    human_auto_approve: bool
+    review_requested: bool
+    plan: Dict[str, Any]
+    draft: Dict[str, Any]
+    content: Dict[str, Any]
+    publish: Dict[str, Any]
+    monitor: Dict[str, Any]
+    # 多平台分支结果 {platform: {...}}，并行分支的写入按平台合并，重跑的分支覆盖旧结果
+    branches: Annotated[Dict[str, Dict[str, Any]], _merge_branches]
+    error: Optional[str]
+
+
+class StageFailedError(RuntimeError):
+    """阶段重试耗尽：图在该节点中止，checkpoint 保留之前各阶段的产出，恢复时重新执行该节点。"""
+
+    def __init__(self, failure: Dict[str, Any]) -> None:
+        self.failure = failure
+        super().__init__(failure.get("error"))
+
+
+@contextlib.asynccontextmanager
+async def postgres_checkpointer(dsn: Optional[str] = None, max_size: int = 10) -> AsyncIterator[AsyncPostgresSaver]:
+    """
+    基于独立连接池的 AsyncPostgresSaver（checkpoint 需要 autocommit + dict_row，与业务连接池配置不同）。
+    每次读写 checkpoint 时才借出连接，等待人工审核的任务不占用连接。首次使用时自动建表。
+    """
+    pool = AsyncConnectionPool(
+        dsn or os.getenv("POSTGRES_DSN", DEFAULT_DSN),
+        min_size=1,
+        max_size=max_size,
+        kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+        open=False,
+    )
+    await pool.open()
+    try:
+        saver = AsyncPostgresSaver(pool)
+        await saver.setup()
+        yield saver
+    finally:
+        await pool.close()
+
+
+def build_graph(flow: ContentMarketingFlow, platform_concurrency: Optional[Dict[str, int]] = None) -> StateGraph:
+    """
+    strategy → writer → critic → review →(approval)→ publisher → monitor，节点直接复用 flow 的阶段实现；
+    多平台任务在审核后走 fanout →(Send × N)→ platform → aggregate。platform_concurrency 限制每个平台同时执行的分支数。
+    """
+    graph = StateGraph(FlowState)
+    for name in STAGE_OUTPUTS:
+        graph.add_node(name, _stage_node(flow, name))
+    graph.add_node("review", _review_node(flow))
+    graph.add_node("approval", _approval_node(flow))
+    graph.add_node("fanout", _fanout_node)
+    graph.add_node("platform", _platform_node(flow, platform_concurrency or {}))
+    graph.add_node("aggregate", _aggregate_node(flow))
+    graph.add_edge(START, "strategy")
+    graph.add_edge("strategy", "writer")
+    graph.add_edge("writer", "critic")
+    graph.add_edge("critic", "review")
+    graph.add_conditional_edges(
+        "review",
+        lambda s: "approval" if s.get("review_requested") else _publish_target(s),
+        ["approval", "publisher", "fanout"],
+    )
+    graph.add_conditional_edges(
+        "approval", lambda s: END if s.get("error") else _publish_target(s), ["publisher", "fanout", END]
+    )
+    graph.add_edge("publisher", "monitor")
+    graph.add_edge("monitor", END)
+    graph.add_conditional_edges("fanout", _send_platforms, ["platform"])
+    graph.add_edge("platform", "aggregate")
+    graph.add_edge("aggregate", END)
+    return graph
+
+
+def _platforms(state: FlowState) -> List[str]:
+    platforms = state["task"].get("payload", {}).get("platforms") or []
+    return list(dict.fromkeys(platforms))
+
+
+def _publish_target(state: FlowState) -> str:
+    return "fanout" if _platforms(state) else "publisher"
+
+
+async def _fanout_node(state: FlowState) -> Dict[str, Any]:
+    # 分发的汇合点：resume 时以该节点为起点重新计算需要（重新）发布的平台
+    return {}
+
+
+def _send_platforms(state: FlowState) -> List[Send]:
+    branches = state.get("branches") or {}
+    done = {p for p, branch in branches.items() if "error" not in branch}
+    branch_state = {"task": state["task"], "task_id": state["task_id"], "content": state["content"]}
+    return [Send("platform", {**branch_state, "platform": p}) for p in _platforms(state) if p not in done]
+
+
+def _platform_node(flow: ContentMarketingFlow, platform_concurrency: Dict[str, int]) -> Any:
+    # 信号量按事件循环分别创建：编译好的图可能在多次 asyncio.run 之间复用
+    limits: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+        weakref.WeakKeyDictionary()
+    )
+
+    # 分支失败不抛异常：同一步的并行分支会被一起取消并在恢复时整体重跑，已发布的平台会被重复发布
+    async def platform(state: Dict[str, Any]) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        loop_limits = limits.get(loop)
+        if loop_limits is None:
+            loop_limits = limits[loop] = {p: asyncio.Semaphore(n) for p, n in platform_concurrency.items()}
+        limit = loop_limits.get(state["platform"])
+        async with limit if limit is not None else contextlib.nullcontext():
+            branch = await flow.run_platform(state, state["platform"])
+        return {"branches": {state["platform"]: branch}}
+
+    return platform
+
+
+def _aggregate_node(flow: ContentMarketingFlow) -> Any:
+    async def aggregate(state: FlowState) -> Dict[str, Any]:
+        scratch: Dict[str, Any] = dict(state)
+        failure = await flow.aggregate(scratch, state["branches"])
+        if failure is not None:
+            return {"error": failure["error"]}
+        return {"publish": scratch["publish"], "monitor": scratch["monitor"], "error": None}
+
+    return aggregate
+
+
+def _stage_node(flow: ContentMarketingFlow, name: str) -> Any:
+    output = STAGE_OUTPUTS[name]
+
+    async def node(state: FlowState) -> Dict[str, Any]:
+        # 阶段实现会写入传入的 dict，这里给它一份副本，只把产出字段作为增量交给 LangGraph
+        scratch: Dict[str, Any] = dict(state)
+        failure = await flow.run_stage(name, scratch)
+        if failure is not None:
+            raise StageFailedError(failure)
+        return {output: scratch[output]}
+
+    return node
+
+
+def _review_node(flow: ContentMarketingFlow) -> Any:
+    async def review(state: FlowState) -> Dict[str, Any]:
+        if state["human_auto_approve"]:
+            return {}
+        await flow.request_review(dict(state))
+        return {"review_requested": True}
+
+    return review
+
+
+def _approval_node(flow: ContentMarketingFlow) -> Any:
+    # 恢复时节点会从头重新执行，interrupt() 之前不能有副作用（状态/事件已在 review 节点发出）
+    async def approval(state: FlowState) -> Dict[str, Any]:
+        decision = interrupt({"task_id": state["task_id"], "content": state["content"]})
+        if not isinstance(decision, dict):
+            decision = {"approved": bool(decision)}
+        task_id = state["task_id"]
+        if not decision.get("approved"):
+            failure = await flow.fail(task_id, {"error": f"review rejected: {decision.get('reason', 'no reason given')}"})
+            return {"error": failure["error"]}
+        event = {"type": "human.review.approved", "task_id": task_id, "edited": "content" in decision}
+        await flow.mark_running(task_id, event)
+        return {"content": decision.get("content") or state["content"]}
+
+    return approval
+
+
+class DurableContentMarketingFlow:
+    """与 ContentMarketingFlow.run 接口一致，可直接交给 CampaignRunner；checkpointer 决定状态保存在哪里。"""
+
+    def __init__(
+        self,
+        flow: ContentMarketingFlow,
+        checkpointer: BaseCheckpointSaver,
+        platform_concurrency: Optional[Dict[str, int]] = None,
+    ) -> None:
+        self.flow = flow
+        self.graph = build_graph(flow, platform_concurrency).compile(checkpointer=checkpointer)
+
+    async def run(self, task: Dict[str, Any], human_auto_approve: bool = True) -> Dict[str, Any]:
+        """
+        新任务从头执行；已有 checkpoint 的任务（重复投递/崩溃后重跑）从中断的节点继续，
+        已完成的任务直接返回保存的结果，仍在等待审核的任务返回 human_required 而不重复执行。
+        """
+        task_id = task["task_id"]
+        snapshot = await self.graph.aget_state(_config(task_id))
+        if snapshot.interrupts:
+            return _pending(task_id, snapshot.interrupts[0].value)
+        if snapshot.next or _failed_platforms(snapshot.values):
+            return await self.resume(task_id)
+        if snapshot.values:
+            return _result(snapshot.values)
+        state = await self.flow.begin(task, human_auto_approve, fan_out=True)
+        return await self._invoke(task_id, state)
+
+    async def resume(self, task_id: str, approval: Optional[Any] = None) -> Dict[str, Any]:
+        """继续执行：approval 为审核结论（{"approved", "content"?, "reason"?}），其余情况从失败的节点重试。"""
+        config = _config(task_id)
+        snapshot = await self.graph.aget_state(config)
+        if not snapshot.next and _failed_platforms(snapshot.values):
+            # 分发失败的任务已结束：从 fanout 重新分发，只为失败的平台发送分支
+            snapshot = await self.graph.aget_state(
+                await self.graph.aupdate_state(config, {"error": None}, as_node="fanout")
+            )
+        if not snapshot.next:
+            raise RuntimeError(f"task {task_id} has nothing to resume")
+        if snapshot.interrupts:
+            if approval is None:
+                return _pending(task_id, snapshot.interrupts[0].value)
+            return await self._invoke(task_id, Command(resume=approval))
+        await self.flow.mark_running(task_id, {"type": "task.resumed", "task_id": task_id, "stage": snapshot.next[0]})
+        return await self._invoke(task_id, None)
+
+    async def _invoke(self, task_id: str, graph_input: Any) -> Dict[str, Any]:
+        with TaskSpan(task_id):
+            try:
+                values = await self.graph.ainvoke(graph_input, _config(task_id))
+            except StageFailedError as exc:
+                return exc.failure
+        if values.get("__interrupt__"):
+            return _pending(task_id, values["__interrupt__"][0].value)
+        if values.get("error"):
+            return {"task_id": task_id, "error": values["error"]}
+        return await self.flow.finish(values)
+
+
+def _failed_platforms(values: Dict[str, Any]) -> List[str]:
+    if not values.get("error"):
+        return []
+    return [p for p, branch in (values.get("branches") or {}).items() if "error" in branch]
+
+
+def _config(task_id: str) -> Dict[str, Any]:
+    return {"configurable": {"thread_id": task_id}}
+
+
+def _pending(task_id: str, review: Any) -> Dict[str, Any]:
+    return {"task_id": task_id, "status": "human_required", "review": review}
+
+
+def _result(values: Dict[str, Any]) -> Dict[str, Any]:
+    if values.get("error"):
+        return {"task_id": values["task_id"], "error": values["error"]}
+    return {"task_id": values["task_id"], "final": {key: values[key] for key in ("plan", "content", "publish", "monitor")}}
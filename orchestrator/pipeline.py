@@ -0,0 +1,269 @@
+"""
+分阶段流水线执行器：ContentMarketingFlow 的每个阶段（strategy → writer → critic → review → publisher → monitor）
+是一个独立的工作池，拥有自己的有界输入队列、并发上限与可选限流。任务像 CPU 流水线一样依次流过各阶段，
+慢阶段（如受平台限流的 publisher）只会让自己的队列积压，直到上游队列写满才形成背压，不会占用快阶段的 worker。
+
+    pipeline = StagedPipeline(flow, stages={"writer": {"concurrency": 16}, "publisher": {"concurrency": 2, "rate": 5}})
+    stats = await pipeline.run(tasks, on_result=handle)
+    pipeline.stats()   # 各阶段队列深度、忙碌 worker 数与利用率
+
+阶段配置：concurrency（worker 数，默认 4）、queue_size（输入队列容量，默认 64）、
+rate（该阶段每秒处理上限）、platform_rates（按任务 payload.platform 分别限流）、
+max_parked（等待令牌的任务暂存上限，默认 1024）。
+受限流的任务先进入按平台划分的等待队列，取到令牌后才交给 worker：等待令牌不占用 worker；
+暂存总数达到 max_parked 之前，排在后面的其它平台任务也不会被堵住，超过后上游才形成背压。
+"""
+import asyncio
+import sys
+import time
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, Iterable, List, Optional, Union
+
+from prometheus_client import Counter, Gauge
+
+from llm.governor import TokenBucket
+from monitoring.tracing import TaskSpan
+from orchestrator.content_marketing_flow import STAGES, ContentMarketingFlow
+
+DEFAULT_STAGE_CONFIG: Dict[str, Any] = {
+    "concurrency": 4,
+    "queue_size": 64,
+    "rate": None,
+    "platform_rates": None,
+    "max_parked": 1024,
+}
+
+ResultCallback = Callable[[Dict[str, Any], float], Awaitable[None]]
+
+# 利用率 = rate(busy_seconds) / worker 数
+PIPELINE_QUEUE_DEPTH = Gauge("agent_pipeline_queue_depth", "Tasks waiting in a pipeline stage input queue", ["stage"])
+PIPELINE_BUSY_WORKERS = Gauge(
+    "agent_pipeline_busy_workers", "Pipeline stage workers currently processing a task", ["stage"]
+)
+PIPELINE_BUSY_SECONDS = Counter(
+    "agent_pipeline_busy_seconds_total", "Worker time spent processing tasks per stage", ["stage"]
+)
+
+
+class _Stage:
+    def __init__(self, name: str, config: Dict[str, Any]) -> None:
+        unknown = set(config) - set(DEFAULT_STAGE_CONFIG)
+        if unknown:
+            raise ValueError(f"unknown options for stage {name!r}: {sorted(unknown)}")
+        config = {**DEFAULT_STAGE_CONFIG, **config}
+        self.name = name
+        self.concurrency = int(config["concurrency"])
+        self.queue_size = int(config["queue_size"])
+        self.queue: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue(maxsize=self.queue_size)
+        self.limiter = TokenBucket(config["rate"]) if config["rate"] else None
+        self.platform_limiters = {p: TokenBucket(r) for p, r in (config["platform_rates"] or {}).items()}
+        # 等待令牌的任务按平台排队（"" 为只受阶段限流的其它任务），每个队列一个放行协程；
+        # 等待队列本身不设上限，由 _parked 限制所有平台合计暂存的任务数
+        self._lanes: Dict[str, "asyncio.Queue[Optional[Dict[str, Any]]]"] = {}
+        self._parked = asyncio.Semaphore(int(config["max_parked"]))
+        self._feeders: List["asyncio.Task[None]"] = []
+        self.busy = 0
+        self.busy_seconds = 0.0
+        self.processed = 0
+        self.failed = 0
+        self._depth = PIPELINE_QUEUE_DEPTH.labels(name)
+        self._busy_gauge = PIPELINE_BUSY_WORKERS.labels(name)
+        self._busy_counter = PIPELINE_BUSY_SECONDS.labels(name)
+
+    async def put(self, item: Dict[str, Any]) -> None:
+        key = self._lane_key(item)
+        if key is None:
+            await self.queue.put(item)
+        else:
+            lane = self._lanes.get(key)
+            if lane is None:
+                lane = self._lanes[key] = asyncio.Queue()
+                self._feeders.append(asyncio.create_task(self._feed(lane, self.platform_limiters.get(key))))
+            await self._parked.acquire()
+            lane.put_nowait(item)
+        self._depth.set(self.depth())
+
+    async def get(self) -> Optional[Dict[str, Any]]:
+        item = await self.queue.get()
+        self._depth.set(self.depth())
+        return item
+
+    async def close(self) -> None:
+        """上游已全部交付：等待队列中的任务放行完毕后，给每个 worker 发送结束标记。"""
+        for lane in self._lanes.values():
+            lane.put_nowait(None)
+        await asyncio.gather(*self._feeders)
+        for _ in range(self.concurrency):
+            await self.queue.put(None)
+
+    def cancel(self) -> None:
+        for feeder in self._feeders:
+            feeder.cancel()
+
+    def depth(self) -> int:
+        return self.queue.qsize() + sum(lane.qsize() for lane in self._lanes.values())
+
+    def _lane_key(self, item: Dict[str, Any]) -> Optional[str]:
+        if self.limiter is None and not self.platform_limiters:
+            return None
+        platform = item.get("state", item)["task"].get("payload", {}).get("platform", "")
+        if platform in self.platform_limiters:
+            return platform
+        return "" if self.limiter is not None else None
+
+    async def _feed(
+        self, lane: "asyncio.Queue[Optional[Dict[str, Any]]]", platform_limiter: Optional[TokenBucket]
+    ) -> None:
+        while True:
+            item = await lane.get()
+            if item is None:
+                return
+            self._parked.release()
+            if self.limiter is not None:
+                await self.limiter.acquire()
+            if platform_limiter is not None:
+                await platform_limiter.acquire()
+            await self.queue.put(item)
+            self._depth.set(self.depth())
+
+    def enter(self) -> float:
+        self.busy += 1
+        self._busy_gauge.inc()
+        return time.monotonic()
+
+    def leave(self, started: float, ok: bool) -> None:
+        elapsed = time.monotonic() - started
+        self.busy -= 1
+        self.busy_seconds += elapsed
+        self.processed += 1
+        if not ok:
+            self.failed += 1
+        self._busy_gauge.dec()
+        self._busy_counter.inc(elapsed)
+
+    def snapshot(self, elapsed: float) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "queue_depth": self.depth(),
+            "busy": self.busy,
+            # 利用率 = 忙碌时间 / (worker 数 × 运行时间)，接近 1 的阶段即为瓶颈
+            "utilisation": round(self.busy_seconds / (self.concurrency * elapsed), 3) if elapsed > 0 else 0.0,
+            "processed": self.processed,
+            "failed": self.failed,
+            "avg_service_s": round(self.busy_seconds / self.processed, 4) if self.processed else 0.0,
+        }
+
+
+class StagedPipeline:
+    def __init__(
+        self,
+        flow: ContentMarketingFlow,
+        stages: Optional[Dict[str, Dict[str, Any]]] = None,
+        human_auto_approve: bool = True,
+    ) -> None:
+        stages = stages or {}
+        unknown = set(stages) - set(STAGES)
+        if unknown:
+            raise ValueError(f"unknown stages: {sorted(unknown)}")
+        self.flow = flow
+        self.human_auto_approve = human_auto_approve
+        self.stages: List[_Stage] = [_Stage(name, stages.get(name, {})) for name in STAGES]
+        self.succeeded = 0
+        self.failed = 0
+        self._started = time.monotonic()
+        self._on_result: Optional[ResultCallback] = None
+
+    async def run(
+        self,
+        tasks: Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]],
+        on_result: Optional[ResultCallback] = None,
+        report_every: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """跑完全部任务后返回 stats()；on_result(result, latency) 在每个任务结束（成功或失败）时调用。"""
+        self._on_result = on_result
+        self._started = time.monotonic()
+        pools = [asyncio.create_task(self._run_stage(i)) for i in range(len(self.stages))]
+        reporter = asyncio.create_task(self._report_loop(report_every)) if report_every else None
+        try:
+            if isinstance(tasks, AsyncIterable):
+                async for task in tasks:
+                    await self.stages[0].put({"task": task})
+            else:
+                for task in tasks:
+                    await self.stages[0].put({"task": task})
+            await self.stages[0].close()
+            await asyncio.gather(*pools)
+        finally:
+            for pool in pools:
+                pool.cancel()
+            for stage in self.stages:
+                stage.cancel()
+            if reporter is not None:
+                reporter.cancel()
+        return self.stats()
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self._started
+        done = self.succeeded + self.failed
+        return {
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "throughput_per_s": round(done / elapsed, 2) if elapsed > 0 else 0.0,
+            "stages": {stage.name: stage.snapshot(elapsed) for stage in self.stages},
+        }
+
+    async def _run_stage(self, index: int) -> None:
+        stage = self.stages[index]
+        await asyncio.gather(*(self._worker(index) for _ in range(stage.concurrency)))
+        # 本阶段全部 worker 退出后再通知下游结束，保证在途任务都已交给下游
+        if index + 1 < len(self.stages):
+            await self.stages[index + 1].close()
+
+    async def _worker(self, index: int) -> None:
+        stage = self.stages[index]
+        is_last = index + 1 == len(self.stages)
+        while True:
+            item = await stage.get()
+            if item is None:
+                return
+            task = item.get("state", item)["task"]
+            # 令牌已在进入 worker 队列前取得；受限流的阶段表现为 queue_depth 积压而不是 worker 忙碌
+            started = stage.enter()
+            result: Optional[Dict[str, Any]] = None
+            with TaskSpan(task["task_id"]):
+                try:
+                    if index == 0:
+                        item = {
+                            "state": await self.flow.begin(task, self.human_auto_approve),
+                            "started": started,
+                        }
+                    failure = await self.flow.run_stage(stage.name, item["state"])
+                    if failure is not None:
+                        result = failure
+                    elif is_last:
+                        result = await self.flow.finish(item["state"])
+                except Exception as e:  # noqa: BLE001 - 单个任务失败不影响流水线
+                    result = await self._crashed(task["task_id"], stage.name, e)
+                finally:
+                    stage.leave(started, ok=result is None or "error" not in result)
+            if result is None:
+                await self.stages[index + 1].put(item)
+                continue
+            if "error" in result:
+                self.failed += 1
+            else:
+                self.succeeded += 1
+            if self._on_result is not None:
+                await self._on_result(result, time.monotonic() - item.get("started", started))
+
+    async def _crashed(self, task_id: str, stage: str, exc: Exception) -> Dict[str, Any]:
+        """阶段之外抛出的异常（如开始/完成时写状态失败）同样把任务标记为 error，task_state 不会停在 running。"""
+        failure = {"task_id": task_id, "error": f"{stage} crashed: {exc}"}
+        try:
+            return await self.flow.fail(task_id, failure)
+        except Exception:  # noqa: BLE001 - 状态存储本身不可用时只能返回错误结果
+            return failure
+
+    async def _report_loop(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            print({"pipeline": self.stats()}, file=sys.stderr, flush=True)
@@ -4,10 +4,10 @@ import sys
 import uuid
 
 from orchestrator.content_marketing_flow import ContentMarketingFlow
-from storage.audit import AuditLog
-from storage.postgres import run_migrations
+from storage.audit import BufferedAuditLog
+from storage.postgres import postgres_lifespan, run_migrations
 from storage.state import TaskStore
-from mq.queue import InMemoryEventBus, RedisEventBus
+from mq.queue import InMemoryEventBus, RedisEventBus, RedisStreamEventBus
 from monitoring.metrics import Metrics
 
 # Windows 事件循环兼容性修复
@@ -19,29 +19,40 @@ def _make_event_bus():
     bus_type = os.getenv("EVENT_BUS", "memory").lower()
     if bus_type == "redis":
         return RedisEventBus(url=os.getenv("REDIS_URL", "redis://localhost:6379/0"))
-    return InMemoryEventBus()
+    if bus_type == "redis-stream":
+        return RedisStreamEventBus(url=os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    # queued：每个订阅者独立有界队列，Postgres 审计等慢订阅者不再拖慢工作流
+    return InMemoryEventBus(
+        dispatch=os.getenv("EVENT_BUS_DISPATCH", "queued"),
+        overflow=os.getenv("EVENT_BUS_OVERFLOW", "block"),
+    )
 
 
 async def main() -> None:
     await run_migrations()
-    store = TaskStore()
-    bus = _make_event_bus()
-    metrics = Metrics()
-    audit = AuditLog()
-    bus.subscribe(metrics.handle_event)
-    bus.subscribe(audit.record_event)
-
-    flow = ContentMarketingFlow(store, bus)
-    task = {
-        "task_id": str(uuid.uuid4()),
-        "type": "content.generate",
-        "payload": {"topic": "AI在营销中的应用", "style": "科普风格", "platform": "twitter"},
-        "meta": {"retries": 0, "status": "pending"},
-    }
-    await store.upsert(task)
-
-    result = await flow.run(task, human_auto_approve=True)
-    print({"result": result})
+    # 共享连接池：TaskStore / AuditLog / Flow 复用同一组连接，退出时统一关闭
+    async with postgres_lifespan():
+        store = TaskStore()
+        bus = _make_event_bus()
+        metrics = Metrics()
+        audit = BufferedAuditLog()
+        bus.subscribe(metrics.handle_event)
+        bus.subscribe(audit.record_event)
+
+        flow = ContentMarketingFlow(store, bus)
+        task = {
+            "task_id": str(uuid.uuid4()),
+            "type": "content.generate",
+            "payload": {"topic": "AI在营销中的应用", "style": "科普风格", "platform": "twitter"},
+            "meta": {"retries": 0, "status": "pending"},
+        }
+        await store.upsert(task)
+
+        result = await flow.run(task, human_auto_approve=True)
+        # 先等总线把事件投递完，再确保缓冲的审计事件在关闭连接池前全部落库
+        await bus.close()
+        await audit.close()
+        print({"result": result})
 
 
 if __name__ == "__main__":
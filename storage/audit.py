@@ -1,14 +1,40 @@
+import asyncio
+import contextlib
 import json
-from typing import Any, Dict, List, Optional
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
+from prometheus_client import Counter, Histogram
+
+from mq.events import TRANSIENT_EVENTS
 from storage.postgres import PostgresClient
 
+logger = logging.getLogger(__name__)
+
+_COPY_EVENTS = "COPY task_events (task_id, event_type, payload) FROM STDIN (FORMAT BINARY)"
+
+AUDIT_FLUSH_SECONDS = Histogram(
+    "agent_audit_flush_seconds",
+    "Latency of one buffered audit flush",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+AUDIT_BATCH_SIZE = Histogram(
+    "agent_audit_batch_size",
+    "Number of events written per audit flush",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000),
+)
+AUDIT_EVENTS_DROPPED = Counter("agent_audit_events_dropped_total", "Audit events that could not be written", ["reason"])
+
 
 class AuditLog:
     def __init__(self, dsn: str | None = None) -> None:
         self.client = PostgresClient(dsn=dsn)
 
     async def record_event(self, event: Dict[str, Any]) -> None:
+        if event.get("type") in TRANSIENT_EVENTS:
+            return
         query = """
             INSERT INTO task_events (task_id, event_type, payload)
             VALUES (%s, %s, %s::jsonb)
@@ -22,14 +48,186 @@ class AuditLog:
             ),
         )
 
-    async def list_events(self, task_id: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
-        base = "SELECT task_id, event_type, payload, created_at FROM task_events"
+    async def record_events(self, events: Sequence[Dict[str, Any]]) -> int:
+        """以单次二进制 COPY 批量写入事件，返回写入条数。缺少 task_id 的事件被丢弃并计数。"""
+        rows = [(e["task_id"], e.get("type", "unknown"), e) for e in events if e.get("task_id")]
+        skipped = len(events) - len(rows)
+        if skipped:
+            AUDIT_EVENTS_DROPPED.labels("missing_task_id").inc(skipped)
+        if not rows:
+            return 0
+        async with self.client.connection() as conn:
+            async with conn.cursor() as cur:
+                async with cur.copy(_COPY_EVENTS) as copy:
+                    copy.set_types(["text", "text", "jsonb"])
+                    for row in rows:
+                        await copy.write_row(row)
+        return len(rows)
+
+    async def list_events(
+        self,
+        task_id: Optional[str] = None,
+        limit: int = 50,
+        before: Optional[Tuple[datetime, int]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        按 (created_at, id) 倒序返回事件。翻页时把上一页最后一条的 (created_at, id) 作为 before 传入，
+        走 keyset 条件而非 OFFSET，深翻页代价与首页相同；游标直接参与比较，按 created_at 裁剪月分区。
+        """
+        base = "SELECT id, task_id, event_type, payload, created_at FROM task_events"
+        clauses: List[str] = []
         params: List[Any] = []
         if task_id:
-            base += " WHERE task_id = %s"
+            clauses.append("task_id = %s")
             params.append(task_id)
-        base += " ORDER BY created_at DESC LIMIT %s"
+        if before is not None:
+            clauses.append("(created_at, id) < (%s, %s)")
+            params.extend(before)
+        if clauses:
+            base += " WHERE " + " AND ".join(clauses)
+        base += " ORDER BY created_at DESC, id DESC LIMIT %s"
         params.append(limit)
         rows = await self.client.fetch(base, params)
         return rows
 
+    async def maintain_partitions(self, months_ahead: int = 3, retain_months: Optional[int] = None) -> Dict[str, int]:
+        """
+        预建未来月分区；指定 retain_months 时删除更早的月分区。
+        BufferedAuditLog 的刷盘任务每 partition_interval 秒自动调用一次；只用 AuditLog 直接写入时，
+        需要定期（如每天的 cron）执行 python -m storage.migrate，否则预建的月份用完后新事件会落入默认分区。
+        """
+        rows = await self.client.fetch("SELECT task_events_ensure_partitions(%s) AS created", (months_ahead,))
+        result = {"created": rows[0]["created"], "dropped": 0}
+        if retain_months is not None:
+            rows = await self.client.fetch("SELECT task_events_drop_partitions(%s) AS dropped", (retain_months,))
+            result["dropped"] = rows[0]["dropped"]
+        return result
+
+
+class BufferedAuditLog(AuditLog):
+    """
+    缓冲式审计写入：record_event 只入内存队列，后台任务按条数(max_batch)或时间(flush_interval)
+    阈值以 COPY 批量落库。队列满(max_buffer)时 record_event 阻塞形成背压；close() 保证落盘。
+    COPY 失败的批次按指数退避重试 max_retries 次（重试期间缓冲区积压，生产者被背压），
+    仍失败则改为逐条 INSERT（close() 时同样如此），只丢弃逐条写入也失败的事件。
+    刷盘任务在写入前每 partition_interval 秒（默认一天，None 关闭）预建一次未来月分区。
+    """
+
+    def __init__(
+        self,
+        dsn: str | None = None,
+        max_batch: int = 500,
+        flush_interval: float = 0.5,
+        max_buffer: int = 10_000,
+        max_retries: int = 3,
+        retry_backoff: float = 0.2,
+        partition_interval: Optional[float] = 24 * 3600,
+    ) -> None:
+        super().__init__(dsn=dsn)
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.partition_interval = partition_interval
+        self._partitions_due = 0.0
+        self._queue: asyncio.Queue[Dict[str, Any]] = asyncio.Queue(maxsize=max_buffer)
+        self._batch_ready = asyncio.Event()
+        self._flusher: Optional[asyncio.Task[None]] = None
+        self._closed = False
+        self._stats = {"events": 0, "flushes": 0, "dropped": 0, "last_flush_seconds": 0.0, "last_batch_size": 0}
+
+    async def record_event(self, event: Dict[str, Any]) -> None:
+        if event.get("type") in TRANSIENT_EVENTS:
+            return
+        if self._closed:
+            await super().record_event(event)
+            return
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_loop())
+        await self._queue.put(event)
+        if self._queue.qsize() >= self.max_batch:
+            self._batch_ready.set()
+
+    async def flush(self) -> None:
+        """立即写出当前缓冲的全部事件并等待完成。"""
+        if self._flusher is None:
+            return
+        self._batch_ready.set()
+        await self._queue.join()
+
+    async def close(self) -> None:
+        self._closed = True
+        await self.flush()
+        if self._flusher is not None:
+            self._flusher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._flusher
+            self._flusher = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "buffered": self._queue.qsize()}
+
+    async def _flush_loop(self) -> None:
+        while True:
+            first = await self._queue.get()
+            if self._queue.qsize() + 1 < self.max_batch:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            await self._maintain_partitions_if_due()
+            # 在取出本批之前清除信号：写入期间到达的 flush()/满批信号保留到下一轮，不会被吞掉
+            self._batch_ready.clear()
+            batch = [first]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._write_batch(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                written = await self.record_events(batch)
+                break
+            except Exception:  # noqa: BLE001 - 审计失败不能拖垮后台 flush 任务
+                if attempt >= self.max_retries:
+                    logger.exception("audit COPY failed, writing %d events row by row", len(batch))
+                    written = await self._write_rows(batch)
+                    break
+                await asyncio.sleep(self.retry_backoff * 2**attempt)
+                attempt += 1
+        elapsed = time.perf_counter() - start
+        AUDIT_FLUSH_SECONDS.observe(elapsed)
+        AUDIT_BATCH_SIZE.observe(len(batch))
+        self._stats["events"] += written
+        self._stats["dropped"] += len(batch) - written
+        self._stats["flushes"] += 1
+        self._stats["last_flush_seconds"] = elapsed
+        self._stats["last_batch_size"] = len(batch)
+
+    async def _maintain_partitions_if_due(self) -> None:
+        if self.partition_interval is None or time.monotonic() < self._partitions_due:
+            return
+        self._partitions_due = time.monotonic() + self.partition_interval
+        try:
+            await self.maintain_partitions()
+        except Exception:  # noqa: BLE001 - 分区维护失败时事件仍可写入默认分区，下个周期再试
+            logger.exception("audit partition maintenance failed")
+
+    async def _write_rows(self, batch: List[Dict[str, Any]]) -> int:
+        written = 0
+        for event in batch:
+            if not event.get("task_id"):
+                AUDIT_EVENTS_DROPPED.labels("missing_task_id").inc()
+                continue
+            try:
+                await super().record_event(event)
+            except Exception:  # noqa: BLE001 - 单条写入失败只丢弃该事件
+                logger.exception("audit insert failed, dropping event %s", event.get("type"))
+                AUDIT_EVENTS_DROPPED.labels("flush_error").inc()
+                continue
+            written += 1
+        return written
@@ -0,0 +1,308 @@
+"""
+内容寻址媒体库：对象按内容的 SHA-256 存储（S3MediaStore.content_key），同一素材被多少个任务复用都只上传、只存一份；
+任务里的文件名只是 Postgres 中指向该内容的轻量引用（media_refs → media_objects）。
+每个唯一内容的衍生版本（原始 + 压缩版 + 缩略图）由有界 worker 池异步生成，且只生成一次。
+
+    library = MediaLibrary(store, registry=MediaRegistry(), renditions=RenditionPipeline(store, registry))
+    ref = await library.add("task-1", "cover.png", data, content_type="image/png")
+    await library.resolve("task-1", "cover.png")   # {"sha256", "object_key", "renditions", ...}
+    await library.renditions.close()                # 等待排队中的衍生任务完成
+"""
+import asyncio
+import gzip
+import io
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from prometheus_client import Counter, Gauge
+
+from storage.postgres import PostgresClient
+from storage.s3 import MediaSource, ProgressCallback, S3MediaStore
+
+try:
+    from PIL import Image
+except Exception:  # pragma: no cover - 可选依赖
+    Image = None
+
+THUMBNAIL_SIZE = (320, 320)
+# 超过该大小的素材（通常是视频）不在进程内生成衍生版本，留给专门的转码服务
+DEFAULT_MAX_SOURCE_BYTES = 32 * 1024 * 1024
+_COMPRESSIBLE_TYPES = ("application/json", "application/xml", "application/javascript", "image/svg+xml")
+
+Renderer = Callable[[bytes, Optional[str]], Optional[Tuple[bytes, str]]]
+
+MEDIA_UPLOADS = Counter("media_uploads_total", "Content-addressed media writes by outcome", ["result"])
+MEDIA_RENDITIONS = Counter("media_renditions_total", "Rendition jobs by rendition and outcome", ["rendition", "result"])
+MEDIA_RENDITION_QUEUE = Gauge("media_rendition_queue_depth", "Unique media objects waiting for renditions")
+
+
+def _is_image(content_type: Optional[str]) -> bool:
+    return bool(content_type) and content_type.startswith("image/") and content_type != "image/svg+xml"
+
+
+def _encode_jpeg(image: Any, quality: int) -> bytes:
+    out = io.BytesIO()
+    image.convert("RGB").save(out, format="JPEG", quality=quality, optimize=True)
+    return out.getvalue()
+
+
+def render_compressed(data: bytes, content_type: Optional[str]) -> Optional[Tuple[bytes, str]]:
+    """图片（需要 Pillow）重新编码为 JPEG；文本类内容 gzip。体积没有明显变小时返回 None。"""
+    if _is_image(content_type):
+        if Image is None:
+            return None
+        with Image.open(io.BytesIO(data)) as image:
+            body, out_type = _encode_jpeg(image, quality=80), "image/jpeg"
+    elif content_type is None or content_type.startswith("text/") or content_type in _COMPRESSIBLE_TYPES:
+        body, out_type = gzip.compress(data, compresslevel=6, mtime=0), "application/gzip"
+    else:
+        return None
+    return (body, out_type) if len(body) < len(data) * 0.9 else None
+
+
+def render_thumbnail(data: bytes, content_type: Optional[str]) -> Optional[Tuple[bytes, str]]:
+    if not _is_image(content_type) or Image is None:
+        return None
+    with Image.open(io.BytesIO(data)) as image:
+        image.thumbnail(THUMBNAIL_SIZE)
+        return _encode_jpeg(image, quality=75), "image/jpeg"
+
+
+RENDITIONS: Dict[str, Renderer] = {"compressed": render_compressed, "thumbnail": render_thumbnail}
+
+
+class MediaRegistry:
+    """media_objects / media_refs 两张表的读写（见 migrations/0004_media_objects.sql）。"""
+
+    def __init__(self, dsn: str | None = None) -> None:
+        self.client = PostgresClient(dsn=dsn)
+
+    async def upsert_object(self, sha256: str, object_key: str, size: int, content_type: Optional[str]) -> None:
+        query = """
+            INSERT INTO media_objects (sha256, object_key, size, content_type)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (sha256) DO NOTHING
+        """
+        await self.client.execute(query, (sha256, object_key, size, content_type))
+
+    async def add_ref(
+        self,
+        task_id: str,
+        name: str,
+        sha256: str,
+        media_type: str = "generic",
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        query = """
+            INSERT INTO media_refs (task_id, name, sha256, media_type, metadata)
+            VALUES (%s, %s, %s, %s, %s::jsonb)
+            ON CONFLICT (task_id, name) DO UPDATE
+            SET sha256 = EXCLUDED.sha256,
+                media_type = EXCLUDED.media_type,
+                metadata = EXCLUDED.metadata
+        """
+        await self.client.execute(
+            query, (task_id, name, sha256, media_type, json.dumps(metadata or {}, ensure_ascii=False))
+        )
+
+    async def get_ref(self, task_id: str, name: str) -> Optional[Dict[str, Any]]:
+        rows = await self.client.fetch(self._REF_QUERY + " WHERE r.task_id = %s AND r.name = %s", (task_id, name))
+        return rows[0] if rows else None
+
+    async def list_refs(self, task_id: str) -> List[Dict[str, Any]]:
+        return await self.client.fetch(self._REF_QUERY + " WHERE r.task_id = %s ORDER BY r.name", (task_id,))
+
+    async def get_renditions(self, sha256: str) -> Dict[str, Any]:
+        rows = await self.client.fetch("SELECT renditions FROM media_objects WHERE sha256 = %s", (sha256,))
+        return rows[0]["renditions"] if rows else {}
+
+    async def set_renditions(self, sha256: str, renditions: Dict[str, Any]) -> None:
+        await self.client.execute(
+            "UPDATE media_objects SET renditions = renditions || %s::jsonb WHERE sha256 = %s",
+            (json.dumps(renditions), sha256),
+        )
+
+    _REF_QUERY = """
+        SELECT r.task_id, r.name, r.sha256, r.media_type, r.metadata,
+               o.object_key, o.size, o.content_type, o.renditions
+        FROM media_refs r JOIN media_objects o USING (sha256)
+    """
+
+
+class RenditionPipeline:
+    """
+    衍生版本生成池：concurrency 个 worker 消费容量为 queue_size 的队列（队列满时 submit 阻塞形成背压），
+    图像编码在线程中执行。同一 sha256 在排队或生成中时 submit 返回同一个 future；
+    已生成的版本通过 registry 或对象存在性检查跳过，因此每个唯一内容只生成一次。
+    """
+
+    def __init__(
+        self,
+        store: S3MediaStore,
+        registry: Optional[MediaRegistry] = None,
+        renderers: Optional[Dict[str, Renderer]] = None,
+        concurrency: int = 2,
+        queue_size: int = 32,
+        max_source_bytes: int = DEFAULT_MAX_SOURCE_BYTES,
+    ) -> None:
+        self.store = store
+        self.registry = registry
+        self.renderers = dict(RENDITIONS) if renderers is None else renderers
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.max_source_bytes = max_source_bytes
+        self._queue: Optional["asyncio.Queue[Optional[Tuple[str, Optional[str], Optional[int]]]]"] = None
+        self._workers: List["asyncio.Task[None]"] = []
+        self._jobs: Dict[str, "asyncio.Future[Dict[str, Any]]"] = {}
+
+    async def submit(
+        self, sha256: str, content_type: Optional[str] = None, size: Optional[int] = None
+    ) -> "asyncio.Future[Dict[str, Any]]":
+        """排队生成 sha256 的衍生版本，返回 future，结果为 {版本名: {"key", "size", "content_type"} 或 None}。"""
+        job = self._jobs.get(sha256)
+        if job is not None:
+            return job
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        job = asyncio.get_running_loop().create_future()
+        self._jobs[sha256] = job
+        try:
+            await self._queue.put((sha256, content_type, size))
+        except BaseException:
+            # 队列满时入队被取消：撤销登记，已拿到同一 future 的并发提交者收到取消而不是永远等待
+            self._jobs.pop(sha256, None)
+            job.cancel()
+            raise
+        MEDIA_RENDITION_QUEUE.inc()
+        return job
+
+    async def close(self) -> None:
+        """等待已提交的任务全部完成后停止 worker。"""
+        if self._queue is None:
+            return
+        for _ in self._workers:
+            await self._queue.put(None)
+        await asyncio.gather(*self._workers)
+        self._queue = None
+        self._workers = []
+
+    async def __aenter__(self) -> "RenditionPipeline":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            MEDIA_RENDITION_QUEUE.dec()
+            sha256, content_type, size = item
+            job = self._jobs[sha256]
+            try:
+                job.set_result(await self._render(sha256, content_type, size))
+            except Exception as exc:  # noqa: BLE001 - 单个素材失败不影响其它任务
+                job.set_exception(exc)
+                job.exception()
+            finally:
+                # 完成后不再占用内存；再次提交时由 registry / 存在性检查跳过已生成的版本
+                self._jobs.pop(sha256, None)
+
+    async def _render(self, sha256: str, content_type: Optional[str], size: Optional[int]) -> Dict[str, Any]:
+        known = await self.registry.get_renditions(sha256) if self.registry is not None else {}
+        original_key = self.store.content_key(sha256)
+        result: Dict[str, Any] = {"original": {"key": original_key, "size": size, "content_type": content_type}}
+        changed = "original" not in known
+        data: Optional[bytes] = None
+        for name, render in self.renderers.items():
+            if name in known:
+                result[name] = known[name]
+                MEDIA_RENDITIONS.labels(name, "cached").inc()
+                continue
+            changed = True
+            key = self.store.content_key(sha256, name)
+            if await asyncio.to_thread(self.store.exists, key):
+                # 其它进程已生成但尚未登记
+                result[name] = {"key": key}
+                MEDIA_RENDITIONS.labels(name, "cached").inc()
+                continue
+            if size is not None and size > self.max_source_bytes:
+                result[name] = None
+                MEDIA_RENDITIONS.labels(name, "skipped").inc()
+                continue
+            if data is None:
+                data = await asyncio.to_thread(self.store.download_media, original_key)
+            try:
+                rendered = await asyncio.to_thread(render, data, content_type)
+            except Exception:
+                MEDIA_RENDITIONS.labels(name, "failed").inc()
+                raise
+            if rendered is None:
+                result[name] = None
+                MEDIA_RENDITIONS.labels(name, "skipped").inc()
+                continue
+            body, out_type = rendered
+            await self.store.aput_object(
+                key, body, metadata={"source_sha256": sha256, "rendition": name}, content_type=out_type
+            )
+            result[name] = {"key": key, "size": len(body), "content_type": out_type}
+            MEDIA_RENDITIONS.labels(name, "created").inc()
+        if changed and self.registry is not None:
+            await self.registry.set_renditions(sha256, result)
+        return result
+
+
+class MediaLibrary:
+    """任务视角的媒体入口：内容寻址去重上传 + 登记引用 + 排队生成衍生版本。registry 为空时不落库。"""
+
+    def __init__(
+        self,
+        store: S3MediaStore,
+        registry: Optional[MediaRegistry] = None,
+        renditions: Optional[RenditionPipeline] = None,
+    ) -> None:
+        self.store = store
+        self.registry = registry
+        self.renditions = renditions
+
+    async def add(
+        self,
+        task_id: str,
+        name: str,
+        source: MediaSource,
+        media_type: str = "generic",
+        content_type: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        progress: Optional[ProgressCallback] = None,
+        wait_renditions: bool = False,
+    ) -> Dict[str, Any]:
+        stored = await self.store.aput_content(source, content_type=content_type, progress=progress)
+        MEDIA_UPLOADS.labels("deduplicated" if stored["deduplicated"] else "uploaded").inc()
+        sha256 = stored["sha256"]
+        ref = {
+            "task_id": task_id,
+            "name": name,
+            "sha256": sha256,
+            "object_key": stored["key"],
+            "size": stored["size"],
+            "media_type": media_type,
+            "content_type": content_type,
+            "metadata": metadata or {},
+            "deduplicated": stored["deduplicated"],
+        }
+        if self.registry is not None:
+            await self.registry.upsert_object(sha256, stored["key"], stored["size"], content_type)
+            await self.registry.add_ref(task_id, name, sha256, media_type, metadata)
+        if self.renditions is not None:
+            job = await self.renditions.submit(sha256, content_type, stored["size"])
+            if wait_renditions:
+                ref["renditions"] = await job
+        return ref
+
+    async def resolve(self, task_id: str, name: str) -> Optional[Dict[str, Any]]:
+        if self.registry is None:
+            raise RuntimeError("MediaLibrary.resolve requires a MediaRegistry")
+        return await self.registry.get_ref(task_id, name)
@@ -1,13 +1,23 @@
 import asyncio
+import os
 
-from storage.postgres import run_migrations
+from storage.audit import AuditLog
+from storage.postgres import close_pools, run_migrations
+
+
+async def _migrate() -> None:
+    await run_migrations()
+    # 设置 AUDIT_RETENTION_MONTHS 后顺带清理过期的 task_events 月分区
+    retention = os.getenv("AUDIT_RETENTION_MONTHS")
+    if retention:
+        result = await AuditLog().maintain_partitions(retain_months=int(retention))
+        print({"task_events_partitions": result})
+        await close_pools()
 
 
 def main() -> None:
-    asyncio.run(run_migrations())
+    asyncio.run(_migrate())
 
 
 if __name__ == "__main__":
     main()
-
-
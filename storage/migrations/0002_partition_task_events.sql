@@ -0,0 +1,105 @@
+-- task_events 按月范围分区 + 复合索引 + 分区自动创建/保留。
+-- 迁移在每次启动时都会重放，因此所有步骤保持幂等：表已分区时只补齐未来分区。
+
+-- 创建 [from_month, 当前月 + months_ahead] 区间内缺失的月分区；
+-- 若默认分区中已有落入该月的数据，先搬迁再 ATTACH，避免分区约束冲突。
+CREATE OR REPLACE FUNCTION task_events_ensure_partitions(months_ahead INT DEFAULT 3, from_month DATE DEFAULT NULL)
+RETURNS INT
+LANGUAGE plpgsql
+AS $fn$
+DECLARE
+    month_start DATE := date_trunc('month', COALESCE(from_month, NOW()))::date;
+    last_month DATE := (date_trunc('month', NOW()) + make_interval(months => months_ahead))::date;
+    month_end DATE;
+    part_name TEXT;
+    created INT := 0;
+BEGIN
+    WHILE month_start <= last_month LOOP
+        month_end := (month_start + INTERVAL '1 month')::date;
+        part_name := format('task_events_%s', to_char(month_start, 'YYYYMM'));
+        IF to_regclass(part_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I (LIKE task_events INCLUDING DEFAULTS)', part_name);
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM task_events_default WHERE created_at >= %L AND created_at < %L RETURNING *) '
+                'INSERT INTO %I SELECT * FROM moved',
+                month_start, month_end, part_name
+            );
+            EXECUTE format(
+                'ALTER TABLE task_events ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                part_name, month_start, month_end
+            );
+            created := created + 1;
+        END IF;
+        month_start := month_end;
+    END LOOP;
+    RETURN created;
+END
+$fn$;
+
+-- 删除早于 (当前月 - retain_months) 的月分区，返回删除的分区数。
+CREATE OR REPLACE FUNCTION task_events_drop_partitions(retain_months INT)
+RETURNS INT
+LANGUAGE plpgsql
+AS $fn$
+DECLARE
+    cutoff TEXT := to_char(date_trunc('month', NOW()) - make_interval(months => retain_months), 'YYYYMM');
+    part RECORD;
+    dropped INT := 0;
+BEGIN
+    FOR part IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'task_events'::regclass
+          AND c.relname ~ '^task_events_[0-9]{6}$'
+          AND substring(c.relname FROM '[0-9]{6}$') < cutoff
+    LOOP
+        EXECUTE format('ALTER TABLE task_events DETACH PARTITION %I', part.relname);
+        EXECUTE format('DROP TABLE %I', part.relname);
+        dropped := dropped + 1;
+    END LOOP;
+    RETURN dropped;
+END
+$fn$;
+
+-- 一次性把 0001 建立的普通堆表转换为分区表并搬迁历史数据（沿用原 id 序列）。
+DO $$
+DECLARE
+    oldest DATE;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'task_events'::regclass) THEN
+        RETURN;
+    END IF;
+
+    ALTER TABLE task_events RENAME TO task_events_legacy;
+    ALTER TABLE task_events_legacy RENAME CONSTRAINT task_events_pkey TO task_events_legacy_pkey;
+    ALTER INDEX IF EXISTS idx_task_events_task_id RENAME TO idx_task_events_legacy_task_id;
+
+    CREATE TABLE task_events (
+        id BIGINT NOT NULL DEFAULT nextval('task_events_id_seq'),
+        task_id TEXT NOT NULL,
+        event_type TEXT NOT NULL,
+        payload JSONB NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at);
+    ALTER SEQUENCE task_events_id_seq OWNED BY task_events.id;
+    -- 兜底分区：分区维护长期未执行时写入也不会失败
+    CREATE TABLE task_events_default PARTITION OF task_events DEFAULT;
+
+    SELECT date_trunc('month', MIN(created_at))::date INTO oldest FROM task_events_legacy;
+    PERFORM task_events_ensure_partitions(3, oldest);
+
+    INSERT INTO task_events (id, task_id, event_type, payload, created_at)
+    SELECT id, task_id, event_type, payload, COALESCE(created_at, NOW()) FROM task_events_legacy;
+    DROP TABLE task_events_legacy;
+END
+$$;
+
+-- 复合索引覆盖“按任务倒序翻页”；沿用 0001 的索引名，使 0001 重放时的
+-- CREATE INDEX IF NOT EXISTS idx_task_events_task_id 成为空操作，不再重复建单列索引。
+CREATE INDEX IF NOT EXISTS idx_task_events_task_id ON task_events (task_id, created_at DESC, id DESC);
+-- 覆盖不带 task_id 的全局倒序翻页
+CREATE INDEX IF NOT EXISTS idx_task_events_created_at ON task_events (created_at DESC, id DESC);
+
+SELECT task_events_ensure_partitions(3);
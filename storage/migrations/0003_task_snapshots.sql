@@ -0,0 +1,7 @@
+-- 事件回放快照：每个任务保留最近一次折叠结果，重建时只回放 last_event_id 之后的事件。
+CREATE TABLE IF NOT EXISTS task_snapshots (
+    task_id TEXT PRIMARY KEY,
+    last_event_id BIGINT NOT NULL,
+    state JSONB NOT NULL,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
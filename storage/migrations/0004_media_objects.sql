@@ -0,0 +1,22 @@
+-- 内容寻址媒体：每个唯一内容（sha256）只存一份对象，任务中的文件名只是指向它的引用。
+CREATE TABLE IF NOT EXISTS media_objects (
+    sha256 TEXT PRIMARY KEY,
+    object_key TEXT NOT NULL,
+    size BIGINT NOT NULL,
+    content_type TEXT,
+    -- 衍生版本：{"compressed": {"key", "size", "content_type"}, "thumbnail": null, ...}，null 表示不适用
+    renditions JSONB NOT NULL DEFAULT '{}'::jsonb,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS media_refs (
+    task_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    sha256 TEXT NOT NULL REFERENCES media_objects (sha256),
+    media_type TEXT NOT NULL DEFAULT 'generic',
+    metadata JSONB NOT NULL DEFAULT '{}'::jsonb,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (task_id, name)
+);
+
+CREATE INDEX IF NOT EXISTS idx_media_refs_sha256 ON media_refs (sha256);
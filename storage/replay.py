@@ -0,0 +1,207 @@
+import json
+from typing import Any, Dict, Iterable, List, Optional
+
+from psycopg.rows import dict_row
+
+from mq.events import STAGE_BY_EVENT, STATUS_BY_EVENT
+from storage.postgres import PostgresClient
+from storage.state import ALLOWED_TRANSITIONS
+
+
+def initial_state(task_id: str) -> Dict[str, Any]:
+    return {
+        "task_id": task_id,
+        "status": "pending",
+        "progress": {},
+        "events": 0,
+        "last_event_id": 0,
+        "last_event_type": None,
+    }
+
+
+def reduce_event(state: Dict[str, Any], event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    纯函数 reducer：返回新的状态，不修改入参。
+    event 为 task_events 的一行（id/event_type/payload），也兼容总线上的原始事件（type）。
+    """
+    event_type = event.get("event_type") or event.get("type") or "unknown"
+    event_id = event.get("id") or state["last_event_id"]
+    new_state = {
+        **state,
+        "events": state["events"] + 1,
+        "last_event_id": event_id,
+        "last_event_type": event_type,
+    }
+    stage = STAGE_BY_EVENT.get(event_type)
+    if stage is not None:
+        new_state["progress"] = {**state["progress"], stage: event_id}
+    status = STATUS_BY_EVENT.get(event_type)
+    if status is not None:
+        new_state["status"] = status
+    return new_state
+
+
+def fold_events(state: Dict[str, Any], events: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    for event in events:
+        state = reduce_event(state, event)
+    return state
+
+
+class EventReplayer:
+    """
+    从 task_events 重建 task_state 与任务进度。
+    事件通过服务端游标按 (task_id, id) 流式读取，内存中只保留当前任务的折叠状态与待写缓冲；
+    每个任务回放结束（或单任务每 snapshot_every 条事件）写入 task_snapshots，
+    之后的重建只回放快照之后的事件。
+    """
+
+    def __init__(
+        self,
+        dsn: str | None = None,
+        fetch_size: int = 5000,
+        snapshot_every: int = 1000,
+        write_batch: int = 2000,
+    ) -> None:
+        self.client = PostgresClient(dsn=dsn)
+        self.fetch_size = fetch_size
+        self.snapshot_every = snapshot_every
+        self.write_batch = write_batch
+
+    async def rebuild_task(self, task_id: str, use_snapshot: bool = True) -> Dict[str, Any]:
+        """use_snapshot=False 为权威回放：从头折叠全部事件，并以结果覆盖快照与 task_state.status。"""
+        state = initial_state(task_id)
+        if use_snapshot:
+            rows = await self.client.fetch("SELECT state FROM task_snapshots WHERE task_id = %s", (task_id,))
+            if rows:
+                state = rows[0]["state"]
+        query = """
+            SELECT id, task_id, event_type FROM task_events
+            WHERE task_id = %s AND id > %s
+            ORDER BY id
+        """
+        states = await self._replay(
+            query, (task_id, state["last_event_id"]), {task_id: state}, overwrite=not use_snapshot
+        )
+        return states[task_id]
+
+    async def rebuild_all(self, use_snapshots: bool = True) -> Dict[str, int]:
+        """
+        回放全部任务。use_snapshots=False 为权威的全量回放：忽略并覆盖已有快照，task_state.status 也直接以事件流为准
+        （用于崩溃后修复停留在 pending/error 的行、回填，或 reducer 变更后重建）；否则每个任务从其最新快照继续，
+        status 只按 ALLOWED_TRANSITIONS 前进。返回 {"tasks", "events"} 统计。
+        """
+        if use_snapshots:
+            query = """
+                SELECT e.id, e.task_id, e.event_type, s.state AS snapshot
+                FROM task_events e
+                LEFT JOIN task_snapshots s ON s.task_id = e.task_id
+                WHERE e.id > COALESCE(s.last_event_id, 0)
+                ORDER BY e.task_id, e.id
+            """
+        else:
+            query = "SELECT id, task_id, event_type FROM task_events ORDER BY task_id, id"
+        stats = {"tasks": 0, "events": 0}
+        await self._replay(query, (), None, stats, overwrite=not use_snapshots)
+        return stats
+
+    async def _replay(
+        self,
+        query: str,
+        params: Iterable[Any],
+        states: Optional[Dict[str, Dict[str, Any]]],
+        stats: Optional[Dict[str, int]] = None,
+        overwrite: bool = False,
+    ) -> Dict[str, Dict[str, Any]]:
+        current: Optional[Dict[str, Any]] = None
+        since_snapshot = 0
+        # 待写缓冲是每次回放的局部变量，同一个 EventReplayer 上的并发回放互不影响
+        pending: List[Dict[str, Any]] = []
+        async with self.client.connection() as conn:
+            async with conn.cursor(name="task_events_replay", row_factory=dict_row) as cur:
+                cur.itersize = self.fetch_size
+                await cur.execute(query, params)
+                async for row in cur:
+                    if current is None or current["task_id"] != row["task_id"]:
+                        if current is not None:
+                            await self._stage_write(pending, current, overwrite)
+                        task_id = row["task_id"]
+                        if states is not None and task_id in states:
+                            current = states[task_id]
+                        else:
+                            current = row.get("snapshot") or initial_state(task_id)
+                        since_snapshot = 0
+                        if stats is not None:
+                            stats["tasks"] += 1
+                    current = reduce_event(current, row)
+                    since_snapshot += 1
+                    if stats is not None:
+                        stats["events"] += 1
+                    if since_snapshot >= self.snapshot_every:
+                        await self._stage_write(pending, current, overwrite)
+                        since_snapshot = 0
+        if current is not None and since_snapshot:
+            await self._stage_write(pending, current, overwrite)
+        await self._flush(pending, overwrite)
+        if states is not None and current is not None:
+            states[current["task_id"]] = current
+        return states if states is not None else {}
+
+    async def _stage_write(self, pending: List[Dict[str, Any]], state: Dict[str, Any], overwrite: bool = False) -> None:
+        pending.append(state)
+        if len(pending) >= self.write_batch:
+            await self._flush(pending, overwrite)
+
+    async def _flush(self, pending: List[Dict[str, Any]], overwrite: bool = False) -> None:
+        if not pending:
+            return
+        batch = pending[:]
+        pending.clear()
+        # 同一批内同一任务可能出现多次（单任务周期快照），只保留最新状态
+        latest = {s["task_id"]: s for s in batch}
+        task_ids = list(latest)
+        last_ids = [s["last_event_id"] for s in latest.values()]
+        states = [json.dumps(s, ensure_ascii=False) for s in latest.values()]
+        statuses = [s["status"] for s in latest.values()]
+        # 权威回放不校验迁移（allowed 为 NULL），直接以事件流折叠出的状态为准
+        allowed = [None if overwrite else ",".join(ALLOWED_TRANSITIONS.get(status, ())) for status in statuses]
+        # 增量回放只接受更新的快照；全量回放（overwrite）也覆盖同一 last_event_id 的旧快照
+        newer = "<=" if overwrite else "<"
+        # 每批三条 unnest 数组语句，写入走独立连接：读取游标所在事务保持打开直到流结束。
+        # task_state 只补齐缺失的行；增量回放时已有行的 status 按 ALLOWED_TRANSITIONS 做 compare-and-set，
+        # 回放与正在执行的工作流并发时不会把状态回退（如 success -> running）
+        async with self.client.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    f"""
+                    INSERT INTO task_snapshots (task_id, last_event_id, state)
+                    SELECT * FROM unnest(%s::text[], %s::bigint[], %s::jsonb[])
+                    ON CONFLICT (task_id) DO UPDATE
+                    SET last_event_id = EXCLUDED.last_event_id,
+                        state = EXCLUDED.state,
+                        updated_at = NOW()
+                    WHERE task_snapshots.last_event_id {newer} EXCLUDED.last_event_id
+                    """,
+                    (task_ids, last_ids, states),
+                )
+                await cur.execute(
+                    """
+                    INSERT INTO task_state (task_id, task_type, meta, status)
+                    SELECT t.task_id, 'unknown', jsonb_build_object('status', t.status), t.status
+                    FROM unnest(%s::text[], %s::text[]) AS t(task_id, status)
+                    ON CONFLICT (task_id) DO NOTHING
+                    """,
+                    (task_ids, statuses),
+                )
+                await cur.execute(
+                    """
+                    UPDATE task_state
+                    SET status = t.status,
+                        meta = jsonb_set(COALESCE(task_state.meta, '{}'::jsonb), '{status}', to_jsonb(t.status)),
+                        updated_at = NOW()
+                    FROM unnest(%s::text[], %s::text[], %s::text[]) AS t(task_id, status, allowed)
+                    WHERE task_state.task_id = t.task_id
+                      AND task_state.status <> t.status
+                      AND (t.allowed IS NULL OR task_state.status = ANY(string_to_array(t.allowed, ',')))
+                    """,
+                    (task_ids, statuses, allowed),
+                )
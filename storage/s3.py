@@ -1,11 +1,187 @@
+import asyncio
+import hashlib
+import inspect
+import mmap
 import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, AsyncIterable, AsyncIterator, BinaryIO, Callable, Dict, List, Optional, Tuple, Union
 
 import boto3
 from botocore.exceptions import BotoCoreError, ClientError
 
+# S3 要求除最后一片外每片至少 5 MiB
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+MediaSource = Union[bytes, bytearray, memoryview, BinaryIO, AsyncIterable[bytes]]
+ProgressCallback = Callable[[int, Optional[int]], Any]
+
+
+def _source_size(source: MediaSource) -> Optional[int]:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return len(source)
+    try:
+        if not source.seekable():  # type: ignore[union-attr]
+            return None
+        pos = source.tell()  # type: ignore[union-attr]
+        end = source.seek(0, os.SEEK_END)  # type: ignore[union-attr]
+        source.seek(pos)  # type: ignore[union-attr]
+        return end - pos
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+async def _iter_parts(source: MediaSource, part_size: int) -> AsyncIterator[bytes]:
+    """把各种来源切成 part_size 大小的分片（最后一片可以更小）；文件读取放到线程中执行。"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        view = memoryview(source)
+        for start in range(0, len(view), part_size):
+            yield bytes(view[start : start + part_size])
+        return
+    if hasattr(source, "read"):
+        while True:
+            chunk = await asyncio.to_thread(source.read, part_size)  # type: ignore[union-attr]
+            if not chunk:
+                return
+            # 非阻塞/网络流可能返回不足一片的数据，补齐后再产出
+            while len(chunk) < part_size:
+                more = await asyncio.to_thread(source.read, part_size - len(chunk))  # type: ignore[union-attr]
+                if not more:
+                    break
+                chunk += more
+            yield chunk
+        return
+    buffer = bytearray()
+    async for chunk in source:  # type: ignore[union-attr]
+        buffer += chunk
+        while len(buffer) >= part_size:
+            yield bytes(buffer[:part_size])
+            del buffer[:part_size]
+    if buffer:
+        yield bytes(buffer)
+
+
+async def _report(progress: Optional[ProgressCallback], done: int, total: Optional[int]) -> None:
+    if progress is None:
+        return
+    result = progress(done, total)
+    if inspect.isawaitable(result):
+        await result
+
+
+def _hash_file(f: BinaryIO, chunk_size: int) -> Tuple[str, int]:
+    """从当前位置读到末尾计算 SHA-256，之后把位置还原，便于随后再次读取上传。"""
+    start = f.tell()
+    hasher = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        hasher.update(chunk)
+        size += len(chunk)
+    f.seek(start)
+    return hasher.hexdigest(), size
+
+
+async def _hash_source(source: MediaSource, chunk_size: int) -> Tuple[str, int, MediaSource, Optional[BinaryIO]]:
+    """
+    流式计算 source 的 SHA-256，返回 (digest, size, 可重新读取的 source, 需关闭的临时文件)。
+    bytes 与可 seek 的文件原地计算；管道、异步迭代器等只能读一遍的来源边算边写入临时文件，上传时从临时文件读取。
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(source).hexdigest(), len(source), source, None
+    if _source_size(source) is not None:
+        digest, size = await asyncio.to_thread(_hash_file, source, chunk_size)  # type: ignore[arg-type]
+        return digest, size, source, None
+    spool = tempfile.TemporaryFile()
+    try:
+        hasher = hashlib.sha256()
+        size = 0
+        async for chunk in _iter_parts(source, chunk_size):
+            hasher.update(chunk)
+            size += len(chunk)
+            await asyncio.to_thread(spool.write, chunk)
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
+    return hasher.hexdigest(), size, spool, spool
+
+
+class MediaReader:
+    """
+    open_media() 返回的只读流，按需读取而非一次性加载整个对象。
+    S3 模式包装 get_object 的 StreamingBody（HTTP Range 只拉取所需字节）；
+    本地回退模式对 artifacts/ 中的文件做 mmap，view 为对应区间的零拷贝 memoryview，由 page cache 按需换入。
+    size 为本次读取区间的字节数，total_size 为对象总大小。
+    """
+
+    def __init__(
+        self,
+        size: int,
+        total_size: int,
+        body: Any = None,
+        view: Optional[memoryview] = None,
+        mapping: Optional[mmap.mmap] = None,
+    ) -> None:
+        self.size = size
+        self.total_size = total_size
+        self.view = view
+        self._body = body
+        self._mapping = mapping
+        self._pos = 0
+
+    def read(self, n: int = -1) -> bytes:
+        if self.view is None:
+            return self._body.read(None if n is None or n < 0 else n)
+        end = self.size if n is None or n < 0 else min(self.size, self._pos + n)
+        data = bytes(self.view[self._pos : end])
+        self._pos = end
+        return data
+
+    def read_view(self, n: int) -> memoryview:
+        """本地模式下零拷贝读取下一段；S3 模式下包装一次 read()。"""
+        if self.view is None:
+            return memoryview(self.read(n))
+        end = min(self.size, self._pos + n)
+        chunk = self.view[self._pos : end]
+        self._pos = end
+        return chunk
+
+    def close(self) -> None:
+        if self._body is not None:
+            self._body.close()
+            self._body = None
+        if self.view is not None:
+            self.view.release()
+            self.view = None
+        if self._mapping is not None:
+            try:
+                self._mapping.close()
+            except BufferError:
+                # 调用方仍持有切片：映射在最后一个切片释放后由 GC 关闭
+                pass
+            self._mapping = None
+
+    def __enter__(self) -> "MediaReader":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def _range_header(offset: int, length: Optional[int]) -> Optional[str]:
+    if offset < 0 or (length is not None and length < 0):
+        raise ValueError("offset and length must be non-negative")
+    if length is None:
+        return f"bytes={offset}-" if offset else None
+    return f"bytes={offset}-{offset + length - 1}"
+
 
 class S3MediaStore:
     """
@@ -29,6 +205,8 @@ class S3MediaStore:
         self.public_url_base = public_url_base or os.getenv("S3_PUBLIC_URL_BASE")
         self.force_local = force_local or not self.bucket
         self._s3 = None
+        # 进程内同一内容的并发写入只上传一次：sha256 -> 正在进行的上传
+        self._inflight: Dict[str, "asyncio.Future[Dict[str, Any]]"] = {}
         if not self.force_local:
             session = boto3.session.Session(region_name=self.region)
             self._s3 = session.client("s3")
@@ -77,6 +255,292 @@ class S3MediaStore:
         except (BotoCoreError, ClientError) as exc:  # pragma: no cover - 网络异常难测
             raise RuntimeError(f"S3 upload failed: {exc}") from exc
 
+    async def aupload_media(
+        self,
+        task_id: str,
+        filename: str,
+        source: MediaSource,
+        media_type: str = "generic",
+        metadata: Optional[Dict[str, Any]] = None,
+        content_type: Optional[str] = None,
+        part_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        progress: Optional[ProgressCallback] = None,
+    ) -> Dict[str, Any]:
+        """
+        异步流式上传：source 可为 bytes、二进制文件对象或产出 bytes 的异步迭代器。
+        按 part_size（默认 S3_PART_SIZE 或 8 MiB）切片，最多 concurrency（默认 S3_UPLOAD_CONCURRENCY 或 4）
+        片并行上传，boto3 调用在线程池中执行，不阻塞事件循环；内存占用约为 (concurrency + 1) × part_size。
+        只有一片时退化为单次 put_object。每完成一片调用 progress(已上传字节, 总字节或 None)，可为协程函数。
+        """
+        key = f"{self.prefix}/{self.build_key(task_id, filename, media_type)}"
+        return await self.aput_object(key, source, metadata, content_type, part_size, concurrency, progress)
+
+    async def aput_object(
+        self,
+        key: str,
+        source: MediaSource,
+        metadata: Optional[Dict[str, Any]] = None,
+        content_type: Optional[str] = None,
+        part_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        progress: Optional[ProgressCallback] = None,
+    ) -> Dict[str, Any]:
+        """把 source 流式写入指定 key（不做 key 生成），参数与返回值同 aupload_media。"""
+        part_size = part_size or int(os.getenv("S3_PART_SIZE", str(DEFAULT_PART_SIZE)))
+        concurrency = concurrency or int(os.getenv("S3_UPLOAD_CONCURRENCY", "4"))
+        if not self.force_local and part_size < MIN_PART_SIZE:
+            raise ValueError(f"part_size must be at least {MIN_PART_SIZE} bytes for S3 multipart uploads")
+        normalized_meta = {str(k): str(v) for k, v in (metadata or {}).items()}
+        total = _source_size(source)
+        parts = _iter_parts(source, part_size)
+        if self.force_local:
+            path, size = await self._write_local_stream(key, parts, total, progress)
+            return {
+                "bucket": "local-fs",
+                "key": key,
+                "path": str(path),
+                "strategy": "local",
+                "size": size,
+                "metadata": normalized_meta,
+            }
+        extra: Dict[str, Any] = {"Metadata": normalized_meta}
+        if content_type:
+            extra["ContentType"] = content_type
+        pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="s3-upload")
+        try:
+            size, part_count = await self._multipart_upload(key, parts, extra, pool, concurrency, total, progress)
+        except (BotoCoreError, ClientError) as exc:
+            raise RuntimeError(f"S3 upload failed: {exc}") from exc
+        finally:
+            pool.shutdown(wait=False)
+        return {
+            "bucket": self.bucket,
+            "key": key,
+            "url": self._build_url(key),
+            "strategy": "s3-multipart" if part_count > 1 else "s3",
+            "size": size,
+            "parts": part_count,
+            "metadata": normalized_meta,
+        }
+
+    def content_key(self, sha256: str, rendition: str = "original") -> str:
+        """内容寻址 key：同一内容（及其衍生版本）无论被多少任务引用都只存一份。"""
+        return f"{self.prefix}/cas/{sha256[:2]}/{sha256}/{rendition}"
+
+    def exists(self, key: str) -> bool:
+        full_key = key.lstrip("/")
+        if self.force_local:
+            return (self.fallback_dir / full_key).is_file()
+        try:
+            self._s3.head_object(Bucket=self.bucket, Key=full_key)
+            return True
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise RuntimeError(f"S3 head failed: {exc}") from exc
+        except BotoCoreError as exc:  # pragma: no cover - 网络异常难测
+            raise RuntimeError(f"S3 head failed: {exc}") from exc
+
+    async def aput_content(
+        self,
+        source: MediaSource,
+        metadata: Optional[Dict[str, Any]] = None,
+        content_type: Optional[str] = None,
+        part_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        progress: Optional[ProgressCallback] = None,
+    ) -> Dict[str, Any]:
+        """
+        内容寻址上传：先流式计算 SHA-256，再以 content_key(sha256) 为 key 做存在性检查（S3 为 HEAD），
+        已存在则跳过上传（deduplicated=True），否则按 aput_object 流式上传。
+        本地回退模式下文件/流只读一遍：边计算 SHA-256 边写入暂存文件，完成后重命名为内容 key。
+        同一内容以首次上传时的 metadata / content_type 为准；任务与文件名的对应关系由 storage.media.MediaRegistry 记录。
+        """
+        if self.force_local and not isinstance(source, (bytes, bytearray, memoryview)):
+            return await self._put_local_content(source, metadata, part_size or DEFAULT_CHUNK_SIZE, progress)
+        digest, size, replay, spool = await _hash_source(source, part_size or DEFAULT_CHUNK_SIZE)
+        try:
+            pending = self._inflight.get(digest)
+            if pending is not None:
+                res = dict(await asyncio.shield(pending))
+                res["deduplicated"] = True
+                return res
+            future: "asyncio.Future[Dict[str, Any]]" = asyncio.get_running_loop().create_future()
+            self._inflight[digest] = future
+            try:
+                key = self.content_key(digest)
+                if await asyncio.to_thread(self.exists, key):
+                    res = {"bucket": self.bucket or "local-fs", "key": key, "strategy": "dedup", "size": size}
+                    if not self.force_local:
+                        res["url"] = self._build_url(key)
+                    res.update(sha256=digest, deduplicated=True)
+                else:
+                    res = await self.aput_object(key, replay, metadata, content_type, part_size, concurrency, progress)
+                    res.update(sha256=digest, deduplicated=False)
+                future.set_result(res)
+                return res
+            except BaseException as exc:
+                if isinstance(exc, Exception):
+                    future.set_exception(exc)
+                    # 等待者会收到同一异常；无人等待时避免 "exception was never retrieved" 警告
+                    future.exception()
+                else:
+                    future.cancel()
+                raise
+            finally:
+                self._inflight.pop(digest, None)
+        finally:
+            if spool is not None:
+                spool.close()
+
+    async def _put_local_content(
+        self,
+        source: MediaSource,
+        metadata: Optional[Dict[str, Any]],
+        chunk_size: int,
+        progress: Optional[ProgressCallback],
+    ) -> Dict[str, Any]:
+        staging = self.fallback_dir / self.prefix / "cas" / ".staging"
+        staging.mkdir(parents=True, exist_ok=True)
+        fd, name = tempfile.mkstemp(dir=staging, suffix=".part")
+        tmp = Path(name)
+        total = _source_size(source)
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+
+                def write(chunk: bytes) -> None:
+                    hasher.update(chunk)
+                    f.write(chunk)
+
+                async for chunk in _iter_parts(source, chunk_size):
+                    await asyncio.to_thread(write, chunk)
+                    size += len(chunk)
+                    await _report(progress, size, total)
+            digest = hasher.hexdigest()
+            key = self.content_key(digest)
+            path = self.fallback_dir / key
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # 硬链接在目标已存在时失败，并发写入同一内容只有一个落盘，其余按去重返回
+            os.link(tmp, path)
+        except FileExistsError:
+            res = {"bucket": "local-fs", "key": key, "strategy": "dedup", "size": size}
+            res.update(sha256=digest, deduplicated=True)
+            return res
+        finally:
+            tmp.unlink(missing_ok=True)
+        return {
+            "bucket": "local-fs",
+            "key": key,
+            "path": str(path),
+            "strategy": "local",
+            "size": size,
+            "metadata": {str(k): str(v) for k, v in (metadata or {}).items()},
+            "sha256": digest,
+            "deduplicated": False,
+        }
+
+    async def _multipart_upload(
+        self,
+        key: str,
+        parts: AsyncIterator[bytes],
+        extra: Dict[str, Any],
+        pool: ThreadPoolExecutor,
+        concurrency: int,
+        total: Optional[int],
+        progress: Optional[ProgressCallback],
+    ) -> Tuple[int, int]:
+        loop = asyncio.get_running_loop()
+
+        def call(fn: Callable[..., Any], **kwargs: Any) -> "asyncio.Future[Any]":
+            return loop.run_in_executor(pool, lambda: fn(**kwargs))
+
+        # 预读两片：只有一片（含空文件）时不必走 multipart
+        first = await anext(parts, b"")
+        second = await anext(parts, None)
+        if second is None:
+            await call(self._s3.put_object, Bucket=self.bucket, Key=key, Body=first, **extra)
+            await _report(progress, len(first), total)
+            return len(first), 1
+
+        upload_id = (await call(self._s3.create_multipart_upload, Bucket=self.bucket, Key=key, **extra))["UploadId"]
+        slots = asyncio.Semaphore(concurrency)
+        done = 0
+        completed: List[Dict[str, Any]] = []
+
+        async def upload_part(number: int, body: bytes) -> None:
+            nonlocal done
+            try:
+                res = await call(
+                    self._s3.upload_part, Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=body
+                )
+                completed.append({"PartNumber": number, "ETag": res["ETag"]})
+                done += len(body)
+                await _report(progress, done, total)
+            finally:
+                slots.release()
+
+        pending: List["asyncio.Task[None]"] = []
+        try:
+
+            async def chained() -> AsyncIterator[bytes]:
+                yield first
+                yield second  # type: ignore[misc]
+                async for part in parts:
+                    yield part
+
+            number = 0
+            async for body in chained():
+                # 先拿到名额再读下一片，保证同时驻留内存的分片数有界
+                await slots.acquire()
+                number += 1
+                pending.append(asyncio.create_task(upload_part(number, body)))
+                failed = [t for t in pending if t.done() and t.exception() is not None]
+                if failed:
+                    raise failed[0].exception()  # type: ignore[misc]
+            await asyncio.gather(*pending)
+            completed.sort(key=lambda p: p["PartNumber"])
+            await call(
+                self._s3.complete_multipart_upload,
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": completed},
+            )
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            # 放弃未完成的分片上传，避免残留分片持续计费
+            await call(self._s3.abort_multipart_upload, Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+        return done, number
+
+    async def _write_local_stream(
+        self,
+        key: str,
+        parts: AsyncIterator[bytes],
+        total: Optional[int],
+        progress: Optional[ProgressCallback],
+    ) -> Tuple[Path, int]:
+        path = self.fallback_dir / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".part")
+        size = 0
+        try:
+            with open(tmp, "wb") as f:
+                async for body in parts:
+                    await asyncio.to_thread(f.write, body)
+                    size += len(body)
+                    await _report(progress, size, total)
+            os.replace(tmp, path)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        return path, size
+
     def download_media(self, key: str) -> bytes:
         full_key = key if not key.startswith("/") else key.lstrip("/")
         if self.force_local:
@@ -89,6 +553,67 @@ class S3MediaStore:
         except (BotoCoreError, ClientError) as exc:  # pragma: no cover
             raise RuntimeError(f"S3 download failed: {exc}") from exc
 
+    def open_media(self, key: str, offset: int = 0, length: Optional[int] = None) -> MediaReader:
+        """
+        以流的方式打开媒体，只读取 [offset, offset + length) 区间（length 为 None 表示读到末尾）。
+        S3 模式发送 Range 请求；本地模式返回 mmap 视图。用完需 close()，或作为上下文管理器使用。
+        """
+        full_key = key.lstrip("/")
+        header = _range_header(offset, length)
+        if self.force_local:
+            return self._open_local(self.fallback_dir / full_key, offset, length)
+        try:
+            if length == 0:
+                # 空区间不是合法的 Range，只取对象大小
+                total = self._s3.head_object(Bucket=self.bucket, Key=full_key)["ContentLength"]
+                return MediaReader(0, total, view=memoryview(b""))
+            extra = {"Range": header} if header else {}
+            res = self._s3.get_object(Bucket=self.bucket, Key=full_key, **extra)
+        except (BotoCoreError, ClientError) as exc:
+            raise RuntimeError(f"S3 download failed: {exc}") from exc
+        size = res["ContentLength"]
+        # Content-Range: bytes 0-99/12345
+        total = int(res["ContentRange"].rsplit("/", 1)[1]) if res.get("ContentRange") else size
+        return MediaReader(size, total, body=res["Body"])
+
+    async def iter_media(
+        self,
+        key: str,
+        offset: int = 0,
+        length: Optional[int] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> AsyncIterator[memoryview]:
+        """
+        按 chunk_size 分块异步读取，内存占用与对象大小无关。S3 的网络读取在线程中执行；
+        本地模式直接产出 mmap 切片（零拷贝），切片仅在迭代期间有效，需要保留请自行 bytes() 复制。
+        """
+        reader = await asyncio.to_thread(self.open_media, key, offset, length)
+        try:
+            while True:
+                if reader.view is not None:
+                    chunk = reader.read_view(chunk_size)
+                else:
+                    chunk = memoryview(await asyncio.to_thread(reader.read, chunk_size))
+                if not len(chunk):
+                    return
+                yield chunk
+        finally:
+            reader.close()
+
+    @staticmethod
+    def _open_local(path: Path, offset: int, length: Optional[int]) -> MediaReader:
+        with open(path, "rb") as f:
+            total = os.fstat(f.fileno()).st_size
+            if offset > total:
+                raise ValueError(f"offset {offset} is beyond end of media ({total} bytes)")
+            end = total if length is None else min(total, offset + length)
+            if end == offset:
+                # 空文件无法 mmap
+                return MediaReader(0, total, view=memoryview(b""))
+            # 映射建立后即可关闭文件描述符
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return MediaReader(end - offset, total, view=memoryview(mapping)[offset:end], mapping=mapping)
+
     def _write_local(self, key: str, data: bytes) -> Path:
         path = self.fallback_dir / key
         path.parent.mkdir(parents=True, exist_ok=True)
@@ -1,8 +1,27 @@
 import json
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from storage.postgres import PostgresClient
 
+# 目标状态 -> 允许的来源状态；非法迁移（如 success -> running）在 UPDATE 的 WHERE 条件中直接被拒绝
+ALLOWED_TRANSITIONS: Dict[str, Tuple[str, ...]] = {
+    "pending": ("pending", "error"),
+    "running": ("pending", "running", "human_required", "error"),
+    "human_required": ("running",),
+    "success": ("running",),
+    "error": ("pending", "running", "human_required"),
+}
+
+
+class TaskTransitionError(RuntimeError):
+    def __init__(self, task_id: str, status: str, allowed_from: Iterable[str]) -> None:
+        self.task_id = task_id
+        self.status = status
+        self.allowed_from = tuple(allowed_from)
+        super().__init__(
+            f"task {task_id} cannot transition to {status!r}: current status not in {self.allowed_from}"
+        )
+
 
 class TaskStore:
     def __init__(self, dsn: str | None = None) -> None:
@@ -28,17 +47,81 @@ class TaskStore:
             (task_id, task.get("type"), json.dumps(payload), json.dumps(meta), status),
         )
 
+    async def upsert_many(self, tasks: List[Dict[str, Any]]) -> Dict[str, str]:
+        """
+        单条语句批量写入任务，返回 {task_id: 当前 status}。
+        已存在的任务只刷新 task_type/payload，保留其 status/meta，便于断点续跑时跳过已完成任务。
+        """
+        # 同一批内重复的 task_id 只保留最后一次，避免 ON CONFLICT 重复命中同一行
+        tasks = list({task["task_id"]: task for task in tasks}.values())
+        if not tasks:
+            return {}
+        query = """
+            INSERT INTO task_state (task_id, task_type, payload, meta, status)
+            SELECT * FROM unnest(%s::text[], %s::text[], %s::jsonb[], %s::jsonb[], %s::text[])
+            ON CONFLICT (task_id) DO UPDATE
+            SET task_type = EXCLUDED.task_type,
+                payload = EXCLUDED.payload,
+                updated_at = NOW()
+            RETURNING task_id, status
+        """
+        metas = [task.get("meta", {}) for task in tasks]
+        rows = await self.client.fetch(
+            query,
+            (
+                [task["task_id"] for task in tasks],
+                [task.get("type") for task in tasks],
+                [json.dumps(task.get("payload", {})) for task in tasks],
+                [json.dumps(meta) for meta in metas],
+                [meta.get("status", "pending") for meta in metas],
+            ),
+        )
+        return {row["task_id"]: row["status"] for row in rows}
+
+    async def transition(
+        self,
+        task_id: str,
+        status: str,
+        from_statuses: Optional[Iterable[str]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        单次往返的 compare-and-set 状态迁移：仅当当前状态属于 from_statuses 时更新，
+        只改 status 与 meta.status，不重写 payload。
+        成功返回 {"task_id", "status"}；条件不满足（或任务不存在）返回 None。
+        """
+        allowed = list(from_statuses if from_statuses is not None else ALLOWED_TRANSITIONS.get(status, ()))
+        query = """
+            UPDATE task_state
+            SET status = %s,
+                meta = jsonb_set(COALESCE(meta, '{}'::jsonb), '{status}', to_jsonb(%s::text)),
+                updated_at = NOW()
+            WHERE task_id = %s AND status = ANY(%s)
+            RETURNING task_id, status
+        """
+        rows = await self.client.fetch(query, (status, status, task_id, allowed))
+        return rows[0] if rows else None
+
     async def set_status(self, task_id: str, status: str) -> None:
-        existing = await self.get(task_id) or {"task_id": task_id, "type": None, "payload": {}, "meta": {}}
-        meta = dict(existing.get("meta") or {})
-        meta["status"] = status
-        updated_task = {
-            "task_id": task_id,
-            "type": existing.get("type") or "unknown",
-            "payload": existing.get("payload") or {},
-            "meta": meta,
-        }
-        await self.upsert(updated_task)
+        """
+        单条语句写入状态：任务不存在时按 status 插入一行（与先前的 upsert 语义一致，调用方可以先写状态后建任务）；
+        已存在时按 ALLOWED_TRANSITIONS 做 compare-and-set，非法迁移抛 TaskTransitionError。
+        """
+        allowed = ALLOWED_TRANSITIONS.get(status)
+        if allowed is None:
+            raise ValueError(f"unknown task status: {status!r}")
+        query = """
+            INSERT INTO task_state (task_id, task_type, payload, meta, status)
+            VALUES (%s, 'unknown', '{}'::jsonb, jsonb_build_object('status', %s::text), %s)
+            ON CONFLICT (task_id) DO UPDATE
+            SET status = EXCLUDED.status,
+                meta = jsonb_set(COALESCE(task_state.meta, '{}'::jsonb), '{status}', to_jsonb(EXCLUDED.status)),
+                updated_at = NOW()
+            WHERE task_state.status = ANY(%s)
+            RETURNING task_id
+        """
+        rows = await self.client.fetch(query, (task_id, status, status, list(allowed)))
+        if not rows:
+            raise TaskTransitionError(task_id, status, allowed)
 
     async def get(self, task_id: str) -> Optional[Dict[str, Any]]:
         query = """
@@ -0,0 +1,112 @@
+import asyncio
+
+from storage.audit import AuditLog, BufferedAuditLog
+
+
+class _RecordingAuditLog(BufferedAuditLog):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.batches = []
+        self.release = asyncio.Event()
+        self.maintenance = 0
+
+    async def maintain_partitions(self, months_ahead=3, retain_months=None):
+        self.maintenance += 1
+        return {"created": 0, "dropped": 0}
+
+    async def record_events(self, events):
+        await self.release.wait()
+        self.batches.append([e["seq"] for e in events])
+        return len(events)
+
+
+def test_buffered_audit_log_batches_and_flushes_on_close():
+    async def run():
+        audit = _RecordingAuditLog(max_batch=4, flush_interval=10, max_buffer=100)
+        audit.release.set()
+        for i in range(10):
+            await audit.record_event({"type": "t", "task_id": "x", "seq": i})
+        await asyncio.sleep(0)
+        await audit.close()
+        assert [seq for batch in audit.batches for seq in batch] == list(range(10))
+        assert all(len(batch) <= 4 for batch in audit.batches)
+        assert audit.stats()["events"] == 10
+        # 分区维护按周期执行，不是每批一次
+        assert audit.maintenance == 1
+
+    asyncio.run(run())
+
+
+def test_buffered_audit_log_applies_backpressure_when_full():
+    async def run():
+        audit = _RecordingAuditLog(max_batch=2, flush_interval=0.01, max_buffer=2)
+        producer = asyncio.gather(*(audit.record_event({"type": "t", "task_id": "x", "seq": i}) for i in range(8)))
+        await asyncio.sleep(0.05)
+        # 写入被阻塞时缓冲区不会超过上限，生产者处于等待状态
+        assert not producer.done()
+        assert audit.stats()["buffered"] <= 2
+        audit.release.set()
+        await producer
+        await audit.close()
+        assert sorted(seq for batch in audit.batches for seq in batch) == list(range(8))
+
+    asyncio.run(run())
+
+
+def test_flush_requested_during_write_is_not_lost():
+    async def run():
+        audit = _RecordingAuditLog(max_batch=100, flush_interval=10, max_buffer=100)
+        await audit.record_event({"type": "t", "task_id": "x", "seq": 0})
+        first = asyncio.create_task(audit.flush())
+        await asyncio.sleep(0.01)
+        # 第一批写入尚未完成时再次请求 flush，信号不能被下一轮吞掉而等满 flush_interval
+        await audit.record_event({"type": "t", "task_id": "x", "seq": 1})
+        second = asyncio.create_task(audit.flush())
+        await asyncio.sleep(0)
+        audit.release.set()
+        await asyncio.wait_for(asyncio.gather(first, second), timeout=1)
+        assert audit.batches == [[0], [1]]
+        await asyncio.wait_for(audit.close(), timeout=1)
+
+    asyncio.run(run())
+
+
+def test_failed_copy_is_retried_then_written_row_by_row(monkeypatch):
+    inserted = []
+
+    async def insert(self, event):
+        if event["seq"] == 3:
+            raise RuntimeError("bad row")
+        inserted.append(event["seq"])
+
+    monkeypatch.setattr(AuditLog, "record_event", insert)
+
+    class _FlakyAuditLog(_RecordingAuditLog):
+        def __init__(self, failures, **kwargs):
+            super().__init__(**kwargs)
+            self.failures = failures
+            self.release.set()
+
+        async def record_events(self, events):
+            if self.failures:
+                self.failures -= 1
+                raise RuntimeError("copy failed")
+            return await super().record_events(events)
+
+    async def run():
+        # 短暂故障：重试后整批 COPY 成功，不丢事件
+        audit = _FlakyAuditLog(failures=2, max_batch=10, flush_interval=0.01, retry_backoff=0.001)
+        for i in range(5):
+            await audit.record_event({"type": "t", "task_id": "x", "seq": i})
+        await audit.close()
+        assert audit.batches == [[0, 1, 2, 3, 4]] and audit.stats()["dropped"] == 0
+
+        # COPY 持续失败：重试耗尽后逐条写入，只丢弃逐条写入仍失败的事件
+        audit = _FlakyAuditLog(failures=100, max_batch=10, flush_interval=10, retry_backoff=0.001)
+        for i in range(5):
+            await audit.record_event({"type": "t", "task_id": "x", "seq": i})
+        await audit.close()
+        assert inserted == [0, 1, 2, 4]
+        assert audit.stats()["dropped"] == 1 and audit.stats()["events"] == 4
+
+    asyncio.run(run())
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from orchestrator.campaign import CampaignRunner, TokenBucket, _reject_platforms, iter_tasks
+
+
+class _FakeStore:
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.batches = []
+
+    async def upsert_many(self, tasks):
+        self.batches.append(len(tasks))
+        return {t["task_id"]: self.statuses.setdefault(t["task_id"], "pending") for t in tasks}
+
+
+class _FakeFlow:
+    def __init__(self, store):
+        self.store = store
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def run(self, task, human_auto_approve=True):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.001)
+        self.in_flight -= 1
+        self.store.statuses[task["task_id"]] = "success"
+        return {"task_id": task["task_id"], "final": {}}
+
+
+def test_iter_tasks_reads_jsonl_and_csv_with_stable_ids(tmp_path):
+    jsonl = tmp_path / "spring.jsonl"
+    jsonl.write_text(
+        "\n".join(json.dumps({"topic": f"t{i}", "style": "short", "platform": "twitter"}) for i in range(3)),
+        encoding="utf-8",
+    )
+    csv_file = tmp_path / "spring.csv"
+    csv_file.write_text("topic,style,platform\nt0,short,weibo\n", encoding="utf-8")
+
+    first = list(iter_tasks(jsonl))
+    assert [t["payload"]["topic"] for t in first] == ["t0", "t1", "t2"]
+    assert [t["task_id"] for t in first] == [t["task_id"] for t in iter_tasks(jsonl)]
+    assert next(iter_tasks(csv_file))["payload"] == {"topic": "t0", "style": "short", "platform": "weibo"}
+
+    multi = tmp_path / "multi.csv"
+    multi.write_text("topic,platforms\nt0,twitter; weibo\n", encoding="utf-8")
+    assert next(iter_tasks(multi))["payload"] == {"topic": "t0", "platforms": ["twitter", "weibo"]}
+
+
+def test_campaign_runner_bounds_concurrency_and_resumes(tmp_path):
+    async def run():
+        tasks = [
+            {"task_id": f"task-{i}", "type": "content.generate", "payload": {"platform": "twitter"}, "meta": {}}
+            for i in range(40)
+        ]
+        store = _FakeStore({"task-0": "success", "task-1": "success"})
+        flow = _FakeFlow(store)
+        runner = CampaignRunner(store, flow, concurrency=4, batch_size=16)
+        summary = await runner.run(tasks)
+        assert summary["succeeded"] == 38 and summary["skipped"] == 2
+        assert flow.max_in_flight <= 4
+        assert store.batches == [16, 16, 8]
+
+        # 再跑一遍：全部已完成，直接跳过
+        summary = await CampaignRunner(store, flow, concurrency=4).run(tasks)
+        assert summary["succeeded"] == 0 and summary["skipped"] == 40
+
+    asyncio.run(run())
+
+
+def test_token_bucket_limits_rate():
+    async def run():
+        bucket = TokenBucket(rate=100, burst=1)
+        start = time.monotonic()
+        for _ in range(6):
+            await bucket.acquire()
+        assert time.monotonic() - start >= 0.04
+
+    asyncio.run(run())
+
+
+def test_rate_limited_platform_does_not_block_other_platforms():
+    class _OrderedFlow(_FakeFlow):
+        def __init__(self, store):
+            super().__init__(store)
+            self.finished = []
+
+        async def run(self, task, human_auto_approve=True):
+            result = await super().run(task, human_auto_approve)
+            self.finished.append(task["payload"]["platform"])
+            return result
+
+    async def run():
+        tasks = [
+            {"task_id": f"{platform}-{i}", "type": "content.generate", "payload": {"platform": platform}, "meta": {}}
+            for platform, count in (("twitter", 12), ("weibo", 4))
+            for i in range(count)
+        ]
+        store = _FakeStore({})
+        flow = _OrderedFlow(store)
+        runner = CampaignRunner(store, flow, concurrency=2)
+        runner.limiters["twitter"] = TokenBucket(rate=20, burst=1)
+        summary = await runner.run(tasks)
+        assert summary["succeeded"] == 16
+        # 排在后面的 weibo 任务不必等 twitter 的令牌，即使 twitter 积压的任务远多于共享队列容量
+        last_weibo = max(i for i, platform in enumerate(flow.finished) if platform == "weibo")
+        assert flow.finished[last_weibo + 1 :].count("twitter") >= 8
+        assert flow.max_in_flight <= 2
+
+    asyncio.run(run())
+
+
+def test_platforms_require_durable_mode(tmp_path):
+    path = tmp_path / "multi.jsonl"
+    records = [{"topic": "AI", "platform": "twitter"}, {"topic": "AI", "platforms": ["twitter", "weibo"]}]
+    path.write_text("".join(json.dumps(r) + "\n" for r in records), encoding="utf-8")
+    tasks = _reject_platforms(iter_tasks(path))
+    assert next(tasks)["payload"]["platform"] == "twitter"
+    with pytest.raises(SystemExit, match="requires --durable"):
+        next(tasks)
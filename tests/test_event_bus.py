@@ -0,0 +1,79 @@
+import asyncio
+
+from mq.queue import InMemoryEventBus
+
+
+def test_queued_bus_isolates_slow_and_failing_subscribers():
+    async def run():
+        bus = InMemoryEventBus(dispatch="queued", queue_size=10)
+        received = []
+        release = asyncio.Event()
+
+        async def slow(event):
+            await release.wait()
+            received.append(event["seq"])
+
+        async def broken(event):
+            raise RuntimeError("sink down")
+
+        bus.subscribe(slow)
+        bus.subscribe(broken)
+        # 订阅者阻塞/失败都不影响 emit 返回
+        for i in range(5):
+            await asyncio.wait_for(bus.emit({"type": "t", "seq": i}), timeout=1)
+        release.set()
+        await bus.close()
+        assert received == list(range(5))
+        stats = bus.stats()
+        assert sum(s["errors"] for s in stats.values()) == 5
+
+    asyncio.run(run())
+
+
+def test_queued_bus_overflow_policies():
+    async def run():
+        for overflow in ("drop_oldest", "spill"):
+            bus = InMemoryEventBus(dispatch="queued", queue_size=2, overflow=overflow)
+            received = []
+            release = asyncio.Event()
+
+            async def sink(event):
+                await release.wait()
+                received.append(event["seq"])
+
+            bus.subscribe(sink)
+            for i in range(6):
+                await asyncio.wait_for(bus.emit({"type": "t", "seq": i}), timeout=1)
+            release.set()
+            await bus.drain()
+            if overflow == "spill":
+                assert received == list(range(6))
+            else:
+                assert received[-2:] == [4, 5] and len(received) < 6
+            await bus.close()
+
+    asyncio.run(run())
+
+
+def test_queued_bus_stats_per_subscriber_and_concurrent_spill(tmp_path):
+    class Sink:
+        def __init__(self):
+            self.received = []
+
+        async def handle(self, event):
+            await asyncio.sleep(0)
+            self.received.append(event["seq"])
+
+    async def run():
+        bus = InMemoryEventBus(dispatch="queued", queue_size=2, overflow="spill", spill_dir=str(tmp_path))
+        first, second = Sink(), Sink()
+        bus.subscribe(first.handle)
+        bus.subscribe(second.handle)
+        await asyncio.gather(*(bus.emit({"type": "t", "seq": i}) for i in range(50)))
+        await bus.close()
+        assert first.received == second.received == list(range(50))
+        stats = bus.stats()
+        assert len(stats) == 2 and all(s["delivered"] == 50 for s in stats.values())
+        assert sum(s["spilled"] for s in stats.values()) > 0
+
+    asyncio.run(run())
@@ -0,0 +1,230 @@
+import asyncio
+import sqlite3
+import threading
+import types
+
+import pytest
+from prometheus_client import REGISTRY
+
+from llm.cache import (
+    LLMCache,
+    MemoryCacheBackend,
+    RedisCacheBackend,
+    SemanticCache,
+    SQLiteCacheBackend,
+    cache_from_env,
+    cache_key,
+)
+from llm.client import LLMClient
+
+
+def _value(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class CountingClient(LLMClient):
+    def __init__(self, cache):
+        super().__init__(cache=cache, model="test-model")
+        self.calls = 0
+
+    async def _complete(self, messages, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return await super()._complete(messages, **kwargs)
+
+
+def test_cache_key_is_canonical():
+    a = cache_key([{"role": "user", "content": "hi"}], "m", {"temperature": 0.2, "top_p": 1})
+    b = cache_key([{"content": "hi", "role": "user"}], "m", {"top_p": 1, "temperature": 0.2})
+    assert a == b
+    assert a != cache_key([{"role": "user", "content": "hi"}], "m", {"temperature": 0.3, "top_p": 1})
+    assert a != cache_key([{"role": "user", "content": "hi"}], "other", {"temperature": 0.2, "top_p": 1})
+
+
+def test_exact_tier_hit_skips_provider_and_records_metrics():
+    async def run():
+        client = CountingClient(LLMCache(backend=MemoryCacheBackend()))
+        messages = [{"role": "system", "content": "strategist"}, {"role": "user", "content": "topic: AI"}]
+        hits = _value("llm_cache_requests_total", tier="exact", result="hit")
+        saved = _value("llm_cache_saved_seconds_total", tier="exact")
+
+        first = await client.chat(messages, temperature=0.2)
+        second = await client.chat(messages, temperature=0.2)
+        assert client.calls == 1
+        assert "cache" not in first
+        assert second["cache"] == "exact"
+        assert second["content"] == first["content"]
+        await client.chat(messages, temperature=0.9)
+        assert client.calls == 2
+
+        assert _value("llm_cache_requests_total", tier="exact", result="hit") == hits + 1
+        assert _value("llm_cache_saved_seconds_total", tier="exact") >= saved + 0.01
+
+    asyncio.run(run())
+
+
+def test_memory_backend_lru_and_ttl(monkeypatch):
+    async def run():
+        backend = MemoryCacheBackend(max_entries=2)
+        await backend.set("a", {"v": 1}, ttl=60)
+        await backend.set("b", {"v": 2}, ttl=60)
+        assert await backend.get("a") == {"v": 1}
+        await backend.set("c", {"v": 3}, ttl=60)
+        # b 最久未使用被淘汰
+        assert await backend.get("b") is None
+        assert await backend.get("a") == {"v": 1}
+
+        await backend.set("d", {"v": 4}, ttl=-1)
+        assert await backend.get("d") is None
+
+    asyncio.run(run())
+
+
+def test_sqlite_backend_shared_across_instances(tmp_path):
+    async def run():
+        path = str(tmp_path / "cache.db")
+        messages = [{"role": "user", "content": "same prompt"}]
+        first = CountingClient(LLMCache(backend=SQLiteCacheBackend(path)))
+        await first.chat(messages)
+        # 模拟另一个进程：新的后端实例打开同一个文件
+        second = CountingClient(LLMCache(backend=SQLiteCacheBackend(path)))
+        res = await second.chat(messages)
+        assert second.calls == 0
+        assert res["cache"] == "exact"
+
+        expired = SQLiteCacheBackend(path)
+        await expired.set("k", {"response": {}, "latency": 0}, ttl=-1)
+        assert await expired.get("k") is None
+
+    asyncio.run(run())
+
+
+def test_sqlite_backend_closes_its_connections(tmp_path):
+    opened = []
+
+    class _TrackingBackend(SQLiteCacheBackend):
+        def _connect(self):
+            conn = super()._connect()
+            opened.append(conn)
+            return conn
+
+    async def run():
+        backend = _TrackingBackend(str(tmp_path / "cache.db"))
+        await backend.set("k", {"response": {}, "latency": 0}, ttl=60)
+        assert await backend.get("k") == {"response": {}, "latency": 0}
+
+    asyncio.run(run())
+    assert len(opened) == 3
+    for conn in opened:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+
+
+def test_semantic_tier_runs_off_the_event_loop():
+    threads = []
+
+    def embed(text):
+        threads.append(threading.current_thread())
+        return [1.0, 0.0]
+
+    async def run():
+        cache = LLMCache(backend=MemoryCacheBackend(), semantic=SemanticCache(embed=embed))
+        messages = [{"role": "user", "content": "prompt"}]
+        await cache.put(messages, "m", None, {"content": "x"}, latency=0.1)
+        assert (await cache.get([{"role": "user", "content": "other"}], "m"))["cache"] == "semantic"
+
+    asyncio.run(run())
+    assert threads and threading.main_thread() not in threads
+
+
+def test_redis_backend_with_fakeredis():
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def run():
+        backend = RedisCacheBackend(client=fakeredis.aioredis.FakeRedis())
+        client = CountingClient(LLMCache(backend=backend))
+        messages = [{"role": "user", "content": "redis prompt"}]
+        await client.chat(messages)
+        res = await client.chat(messages)
+        assert client.calls == 1
+        assert res["cache"] == "exact"
+
+    asyncio.run(run())
+
+
+def test_redis_backend_creates_one_client_per_event_loop(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    server, created = fakeredis.FakeServer(), []
+
+    def from_url(url):
+        created.append(fakeredis.aioredis.FakeRedis(server=server))
+        return created[-1]
+
+    monkeypatch.setattr("llm.cache.redis_async", types.SimpleNamespace(from_url=from_url))
+    backend = RedisCacheBackend()
+
+    async def write():
+        await backend.set("k", {"response": {"content": "v"}, "latency": 0}, ttl=60)
+        await backend.set("k2", {"response": {}, "latency": 0}, ttl=60)
+
+    async def read():
+        return await backend.get("k")
+
+    asyncio.run(write())
+    # 第二个事件循环不能复用绑定在第一个循环上的客户端
+    assert asyncio.run(read()) == {"response": {"content": "v"}, "latency": 0}
+    assert len(created) == 2
+
+
+def test_cache_from_env_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("LLM_CACHE", raising=False)
+    assert cache_from_env() is None
+    monkeypatch.setenv("LLM_CACHE", "memory")
+    assert isinstance(cache_from_env().backend, MemoryCacheBackend)
+    monkeypatch.setenv("LLM_CACHE", "memcached")
+    with pytest.raises(ValueError):
+        cache_from_env()
+
+
+def test_semantic_tier_reuses_similar_prompts_within_scope():
+    async def run():
+        cache = LLMCache(backend=MemoryCacheBackend(), semantic=SemanticCache(threshold=0.9))
+        client = CountingClient(cache)
+        system = {"role": "system", "content": "You are a marketing strategist."}
+        await client.chat([system, {"role": "user", "content": "topic: AI marketing, style: professional, platform: twitter"}])
+
+        near = await client.chat([system, {"role": "user", "content": "topic: AI marketing, style: professional, platform: Twitter!"}])
+        assert client.calls == 1
+        assert near["cache"] == "semantic"
+        assert near["cache_score"] >= 0.9
+
+        # 不相关的请求、不同 system 提示或不同参数都不能命中
+        await client.chat([system, {"role": "user", "content": "quarterly revenue forecast for retail"}])
+        await client.chat(
+            [{"role": "system", "content": "You are a critic."}, {"role": "user", "content": "topic: AI marketing, style: professional, platform: twitter"}]
+        )
+        await client.chat([system, {"role": "user", "content": "topic: AI marketing, style: professional, platform: twitter"}], temperature=1.0)
+        assert client.calls == 4
+
+    asyncio.run(run())
+
+
+def test_semantic_cache_rebuilds_when_full():
+    cache = SemanticCache(threshold=0.99, max_entries=4)
+    for i in range(10):
+        cache.add("scope", f"prompt number {i}", {"response": {"content": str(i)}, "latency": 0})
+    assert len(cache._store) <= 4
+    score, entry = cache.lookup("scope", "prompt number 9", ttl=60)
+    assert entry["response"]["content"] == "9"
+    assert cache.lookup("scope", "prompt number 0", ttl=60) is None
+
+
+def test_client_without_cache():
+    async def run():
+        client = CountingClient(None)
+        messages = [{"role": "user", "content": "no cache"}]
+        await client.chat(messages)
+        await client.chat(messages)
+        assert client.calls == 2
+
+    asyncio.run(run())
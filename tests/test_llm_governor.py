@@ -0,0 +1,153 @@
+import asyncio
+import time
+
+import pytest
+
+from llm.client import LLMClient
+from llm.governor import LLMGovernor, RateLimitError, TokenBucket, governor_for
+
+
+class ScriptedClient(LLMClient):
+    """_complete 前 fail_times 次抛 429，并记录调用次数与最大并发。"""
+
+    def __init__(self, governor, fail_times=0, latency=0.01, retry_after=0.01):
+        super().__init__(cache=None, model="test-model", governor=governor)
+        self.fail_times = fail_times
+        self.latency = latency
+        self.retry_after = retry_after
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+
+    async def _complete(self, messages, **kwargs):
+        self.calls += 1
+        if self.calls <= self.fail_times:
+            raise RateLimitError("429", retry_after=self.retry_after)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.active -= 1
+        return await super()._complete(messages, **kwargs)
+
+
+def test_identical_inflight_requests_are_coalesced():
+    async def run():
+        client = ScriptedClient(LLMGovernor("test"), latency=0.05)
+        messages = [{"role": "user", "content": "same prompt"}]
+        results = await asyncio.gather(*(client.chat(messages) for _ in range(10)))
+        assert client.calls == 1
+        assert len({r["content"] for r in results}) == 1
+        # 各调用方拿到的是独立副本
+        results[0]["content"] = "mutated"
+        assert results[1]["content"] != "mutated"
+
+        await asyncio.gather(*(client.chat([{"role": "user", "content": f"p{i}"}]) for i in range(5)))
+        assert client.calls == 6
+
+    asyncio.run(run())
+
+
+def test_cancelled_leader_does_not_cancel_coalesced_waiters():
+    async def run():
+        client = ScriptedClient(LLMGovernor("test"), latency=0.05)
+        messages = [{"role": "user", "content": "same prompt"}]
+        leader = asyncio.create_task(client.chat(messages))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(client.chat(messages))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        result = await follower
+        assert leader.cancelled() and result["content"]
+        assert client.calls == 1
+
+    asyncio.run(run())
+
+
+def test_stream_releases_permit_while_consumer_handles_chunks():
+    async def run():
+        governor = LLMGovernor("test", max_concurrency=1)
+
+        async def chunks():
+            for i in range(3):
+                yield {"index": i, "delta": "x"}
+
+        async def quick():
+            return {"content": "ok"}
+
+        async for _ in governor.stream(chunks):
+            # 消费者处理分片期间，其它调用不必等整个流结束
+            assert (await asyncio.wait_for(governor.execute(quick), timeout=1))["content"] == "ok"
+
+    asyncio.run(run())
+
+
+def test_semaphore_bounds_concurrency():
+    async def run():
+        client = ScriptedClient(LLMGovernor("test", max_concurrency=3), latency=0.02)
+        await asyncio.gather(*(client.chat([{"role": "user", "content": f"p{i}"}]) for i in range(20)))
+        assert client.calls == 20
+        assert client.peak <= 3
+
+    asyncio.run(run())
+
+
+def test_rate_limit_backoff_retries_then_succeeds():
+    async def run():
+        governor = LLMGovernor("test", rpm=6000, max_retries=3)
+        client = ScriptedClient(governor, fail_times=2)
+        start = time.monotonic()
+        res = await client.chat([{"role": "user", "content": "hello"}])
+        assert res["role"] == "assistant"
+        assert client.calls == 3
+        assert time.monotonic() - start >= 0.02
+        # 429 后速率减半，成功后逐步恢复
+        assert governor._requests.rate < 100
+
+        failing = ScriptedClient(LLMGovernor("test", max_retries=1), fail_times=10)
+        with pytest.raises(RateLimitError):
+            await failing.chat([{"role": "user", "content": "hello"}])
+        assert failing.calls == 2
+
+    asyncio.run(run())
+
+
+def test_rpm_limit_spaces_requests():
+    async def run():
+        # 6000 rpm = 100 req/s，桶容量 100：150 个请求至少需要约 0.5s
+        client = ScriptedClient(LLMGovernor("test", rpm=6000, max_concurrency=200), latency=0)
+        start = time.monotonic()
+        await asyncio.gather(*(client.chat([{"role": "user", "content": f"p{i}"}]) for i in range(150)))
+        assert time.monotonic() - start >= 0.45
+
+    asyncio.run(run())
+
+
+def test_token_bucket_debit_reconciles_usage():
+    async def run():
+        bucket = TokenBucket(rate=10, burst=10)
+        await bucket.acquire(5)
+        # 实际用量比预估多 10：余额为负，下次获取要等待补足
+        bucket.debit(10)
+        start = time.monotonic()
+        await bucket.acquire(1)
+        assert time.monotonic() - start >= 0.5
+
+    asyncio.run(run())
+
+
+def test_shared_governor_survives_multiple_event_loops(monkeypatch):
+    monkeypatch.setenv("LLM_MAX_CONCURRENCY", "4")
+    monkeypatch.setenv("LLM_RPM", "600000")
+    monkeypatch.setattr("llm.governor._governors", {})
+
+    async def run(loop_no):
+        # 默认 governor 为进程内共享实例：争用下的信号量 / 令牌桶锁不能绑定在上一个事件循环上
+        client = ScriptedClient(None, latency=0.001)
+        assert client.governor is governor_for(client.provider)
+        await asyncio.gather(*(client.chat([{"role": "user", "content": f"{loop_no}-{i}"}]) for i in range(100)))
+        assert client.calls == 100 and client.peak <= 4
+
+    asyncio.run(run(1))
+    asyncio.run(run(2))
@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+from llm.cache import LLMCache, MemoryCacheBackend
+from llm.client import LLMClient
+from llm.governor import LLMGovernor
+from mq.queue import InMemoryEventBus
+from orchestrator.content_marketing_flow import ContentMarketingFlow
+
+
+class _FakeStore:
+    async def set_status(self, task_id, status):
+        pass
+
+
+class SlowStreamClient(LLMClient):
+    """每个分片间隔 delay 秒到达，模拟真实 provider 的逐 token 输出。"""
+
+    def __init__(self, chunks=5, delay=0.05):
+        super().__init__(cache=None, model="test-model", governor=LLMGovernor("test"))
+        self.chunks = chunks
+        self.delay = delay
+
+    async def _stream(self, messages, **kwargs):
+        for index in range(self.chunks):
+            await asyncio.sleep(self.delay)
+            chunk = {"index": index, "delta": f"w{index} "}
+            if index == self.chunks - 1:
+                chunk.update(finish_reason="stop", usage={"prompt_tokens": 3, "completion_tokens": self.chunks})
+            yield chunk
+
+
+def test_astream_matches_chat_and_populates_cache():
+    async def run():
+        client = LLMClient(cache=LLMCache(backend=MemoryCacheBackend()), model="test-model", governor=LLMGovernor("test"))
+        messages = [{"role": "system", "content": "sys"}, {"role": "user", "content": "write a long marketing post about AI"}]
+        chunks = [c async for c in client.astream(messages)]
+        assert len(chunks) > 1
+        assert [c["index"] for c in chunks] == list(range(len(chunks)))
+        assert chunks[-1]["finish_reason"] == "stop" and chunks[-1]["usage"]["completion_tokens"] == 12
+        text = "".join(c["delta"] for c in chunks)
+
+        # 流结束后写入缓存：chat() 与再次 astream() 都直接命中
+        cached = await client.chat(messages)
+        assert cached["cache"] == "exact" and cached["content"] == text
+        replay = [c async for c in client.astream(messages)]
+        assert len(replay) == 1 and replay[0]["delta"] == text
+
+        assert text == (await LLMClient(cache=None, governor=LLMGovernor("test")).chat(messages))["content"]
+
+    asyncio.run(run())
+
+
+def test_first_chunk_arrives_before_full_generation():
+    async def run():
+        client = SlowStreamClient(chunks=5, delay=0.05)
+        seen = []
+        start = time.monotonic()
+
+        async def on_delta(chunk):
+            seen.append((time.monotonic() - start, chunk["delta"]))
+
+        text = await client.complete_text([{"role": "user", "content": "hi"}], on_delta=on_delta)
+        total = time.monotonic() - start
+        assert text == "w0 w1 w2 w3 w4 "
+        assert len(seen) == 5
+        assert seen[0][0] < total / 2
+
+    asyncio.run(run())
+
+
+def test_flow_emits_draft_deltas_before_complete_draft():
+    async def run():
+        bus = InMemoryEventBus()
+        events = []
+
+        async def collect(event):
+            events.append(event)
+
+        bus.subscribe(collect)
+        flow = ContentMarketingFlow(_FakeStore(), bus)
+        result = await flow.run({"task_id": "stream-1", "payload": {"topic": "AI", "platform": "twitter"}})
+        types = [e["type"] for e in events]
+        deltas = [e for e in events if e["type"] == "content.draft.delta"]
+        assert deltas and types.index("content.draft.delta") < types.index("content.draft")
+        draft = next(e for e in events if e["type"] == "content.draft")["draft"]
+        assert "".join(d["delta"] for d in deltas) == draft["body"]
+        assert [d["seq"] for d in deltas] == list(range(len(deltas)))
+        assert "content.refined.delta" in types
+        assert result["final"]["content"]["schema"] == "content.refined.v1"
+
+        events.clear()
+        quiet = ContentMarketingFlow(_FakeStore(), bus, stream_deltas=False)
+        await quiet.run({"task_id": "stream-2", "payload": {"topic": "AI", "platform": "twitter"}})
+        assert not any(e["type"].endswith(".delta") for e in events)
+
+    asyncio.run(run())
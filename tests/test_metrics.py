@@ -0,0 +1,71 @@
+import asyncio
+import subprocess
+import sys
+
+from prometheus_client import REGISTRY
+
+from monitoring.metrics import Metrics
+
+
+def _value(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_metrics_aggregate_without_task_labels(monkeypatch):
+    monkeypatch.setenv("PROMETHEUS_PORT", "0")
+
+    async def run():
+        metrics = Metrics(recent_events=5)
+        before_tasks = _value("agent_task_duration_seconds_count", platform="twitter", status="success")
+        before_retries = _value("agent_stage_retries_total", stage="writer")
+        events = [
+            {"type": "task.started", "task_id": "t1", "platform": "twitter"},
+            {"type": "plan.created", "task_id": "t1"},
+            {"type": "stage.retry", "task_id": "t1", "stage": "writer", "attempt": 1},
+            {"type": "content.draft", "task_id": "t1"},
+            {"type": "content.published", "task_id": "t1"},
+            {"type": "content.analytics", "task_id": "t1"},
+        ]
+        for event in events:
+            await metrics.handle_event(event)
+
+        assert metrics.tracked_tasks() == 0
+        assert _value("agent_task_duration_seconds_count", platform="twitter", status="success") == before_tasks + 1
+        assert _value("agent_stage_retries_total", stage="writer") == before_retries + 1
+        assert _value("agent_stage_latency_seconds_count", stage="writer", platform="twitter") >= 1
+        assert [e["type"] for e in metrics.recent()] == [e["type"] for e in events[1:]]
+        assert metrics.recent(2) == events[-2:]
+        # 导出页面上不再出现 task_id 标签
+        assert not any("task_id" in s.labels for m in REGISTRY.collect() for s in m.samples)
+
+    asyncio.run(run())
+
+
+def test_metrics_task_window_is_bounded(monkeypatch):
+    monkeypatch.setenv("PROMETHEUS_PORT", "0")
+
+    async def run():
+        metrics = Metrics(max_tasks=2, max_platforms=1)
+        evicted = _value("agent_tasks_evicted_total", reason="capacity")
+        running = _value("agent_tasks_tracked", status="running")
+        for i in range(5):
+            await metrics.handle_event({"type": "task.started", "task_id": f"w{i}", "platform": f"p{i}"})
+        assert metrics.tracked_tasks() == 2
+        assert _value("agent_tasks_evicted_total", reason="capacity") == evicted + 3
+        assert _value("agent_tasks_tracked", status="running") == running + 2
+
+        await metrics.handle_event({"type": "task.failed", "task_id": "w4", "status": "error"})
+        assert metrics.tracked_tasks() == 1
+        assert _value("agent_task_duration_seconds_count", platform="other", status="error") >= 1
+
+    asyncio.run(run())
+
+
+def test_metrics_import_does_not_load_postgres_driver():
+    code = "import sys, monitoring.metrics; sys.exit('psycopg' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code]).returncode == 0
+
+
+def test_storage_layer_does_not_import_monitoring():
+    code = "import sys, storage.audit, storage.media; sys.exit(any(m.startswith('monitoring') for m in sys.modules))"
+    assert subprocess.run([sys.executable, "-c", code]).returncode == 0
@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+
+from llm.governor import TokenBucket
+from mq.queue import InMemoryEventBus
+from orchestrator.content_marketing_flow import STAGES, ContentMarketingFlow
+from orchestrator.pipeline import StagedPipeline
+
+
+class _FakeStore:
+    def __init__(self, broken=()):
+        self.broken = set(broken)
+
+    async def set_status(self, task_id, status):
+        if task_id in self.broken:
+            raise RuntimeError("store unavailable")
+
+
+class _SlowPublisher:
+    def __init__(self, delay):
+        self.delay = delay
+
+    async def publish(self, task, content):
+        await asyncio.sleep(self.delay)
+        return {"platform": "twitter", "post_id": f"mock-{task['task_id']}", "status": "posted"}
+
+    async def rollback(self, task):
+        pass
+
+
+def _tasks(n):
+    return [{"task_id": f"t{i}", "payload": {"topic": f"topic {i}", "platform": "twitter"}} for i in range(n)]
+
+
+def test_pipeline_runs_all_tasks_and_reports_stage_stats():
+    async def run():
+        flow = ContentMarketingFlow(_FakeStore(broken={"t3"}), InMemoryEventBus(), stream_deltas=False)
+        pipeline = StagedPipeline(flow, stages={"writer": {"concurrency": 2, "queue_size": 2}})
+        results = {}
+
+        async def on_result(result, latency):
+            assert latency >= 0
+            results[result.get("task_id")] = result
+
+        stats = await pipeline.run(_tasks(10), on_result=on_result)
+        assert stats["succeeded"] == 9 and stats["failed"] == 1
+        assert "crashed" in results["t3"]["error"]
+        assert set(results["t0"]["final"]) == {"plan", "content", "publish", "monitor"}
+        assert stats["stages"]["strategy"]["processed"] == 10
+        assert stats["stages"]["monitor"]["processed"] == 9
+        assert all(s["queue_depth"] == 0 and s["busy"] == 0 for s in stats["stages"].values())
+
+    asyncio.run(run())
+
+
+def test_slow_publisher_does_not_block_upstream_stages():
+    async def run():
+        bus = InMemoryEventBus()
+        order = []
+
+        async def collect(event):
+            if event["type"] in ("content.refined", "content.published"):
+                order.append(event["type"])
+
+        bus.subscribe(collect)
+        flow = ContentMarketingFlow(_FakeStore(), bus, stream_deltas=False)
+        flow.publisher = _SlowPublisher(0.03)
+        pipeline = StagedPipeline(flow, stages={"publisher": {"concurrency": 1, "queue_size": 20}})
+        stats = await pipeline.run(_tasks(8))
+        assert stats["succeeded"] == 8
+        # 上游不等发布：前 8 个事件中绝大多数是润色完成，发布在后面陆续完成
+        assert order[:8].count("content.refined") >= 6
+        stages = stats["stages"]
+        assert stages["publisher"]["utilisation"] > stages["writer"]["utilisation"]
+        assert stages["publisher"]["avg_service_s"] >= 0.03
+
+    asyncio.run(run())
+
+
+def test_rate_limited_platform_does_not_block_publisher_workers():
+    async def run():
+        published = []
+
+        class _RecordingPublisher(_SlowPublisher):
+            async def publish(self, task, content):
+                published.append(task["payload"]["platform"])
+                return await super().publish(task, content)
+
+        flow = ContentMarketingFlow(_FakeStore(), InMemoryEventBus(), stream_deltas=False)
+        flow.publisher = _RecordingPublisher(0)
+        pipeline = StagedPipeline(
+            flow, stages={"publisher": {"concurrency": 1, "queue_size": 2, "platform_rates": {"twitter": 20}}}
+        )
+        pipeline.stages[STAGES.index("publisher")].platform_limiters["twitter"] = TokenBucket(20, burst=1)
+        tasks = _tasks(12) + [
+            {"task_id": f"w{i}", "payload": {"topic": f"topic {i}", "platform": "weibo"}} for i in range(3)
+        ]
+        stats = await pipeline.run(tasks)
+        assert stats["succeeded"] == 15
+        # 微博任务不排在 twitter 令牌之后：twitter 每 50ms 放行一个，积压远超队列容量时微博也能先发布
+        last_weibo = max(i for i, platform in enumerate(published) if platform == "weibo")
+        assert published[last_weibo + 1 :].count("twitter") >= 8
+        # 等待令牌不计入 publisher 的忙碌时间
+        assert stats["stages"]["publisher"]["avg_service_s"] < 0.05
+
+    asyncio.run(run())
+
+
+def test_crash_outside_stage_marks_task_failed():
+    class _RecordingStore(_FakeStore):
+        def __init__(self):
+            super().__init__()
+            self.statuses = {}
+
+        async def set_status(self, task_id, status):
+            if status == "success":
+                raise RuntimeError("store unavailable")
+            self.statuses[task_id] = status
+
+    async def run():
+        store = _RecordingStore()
+        flow = ContentMarketingFlow(store, InMemoryEventBus(), stream_deltas=False)
+        stats = await StagedPipeline(flow).run(_tasks(2))
+        assert stats["failed"] == 2
+        assert store.statuses == {"t0": "error", "t1": "error"}
+
+    asyncio.run(run())
+
+
+def test_multi_platform_tasks_are_rejected_outside_durable_flow():
+    async def run():
+        flow = ContentMarketingFlow(_FakeStore(), InMemoryEventBus(), stream_deltas=False)
+        task = {"task_id": "multi", "payload": {"topic": "AI", "platforms": ["twitter", "weibo"]}}
+        with pytest.raises(ValueError, match="platforms"):
+            await flow.run(task)
+        results = []
+
+        async def on_result(result, latency):
+            results.append(result)
+
+        stats = await StagedPipeline(flow).run([task], on_result=on_result)
+        assert stats["failed"] == 1 and "platforms" in results[0]["error"]
+
+    asyncio.run(run())
+
+
+def test_pipeline_rejects_unknown_stage_options():
+    flow = ContentMarketingFlow(_FakeStore(), InMemoryEventBus())
+    with pytest.raises(ValueError):
+        StagedPipeline(flow, stages={"translate": {}})
+    with pytest.raises(ValueError):
+        StagedPipeline(flow, stages={"writer": {"workers": 2}})
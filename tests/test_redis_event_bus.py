@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from mq.queue import RedisEventBus, decode_event, encode_event
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+def test_event_codecs_round_trip():
+    event = {"type": "content.draft", "task_id": "t1", "draft": {"body": "你好", "tags": ["twitter"]}}
+    assert decode_event(encode_event(event)) == event
+    assert decode_event(encode_event(event).decode("utf-8")) == event
+    # 非字符串键与标准库 json 一致转为字符串
+    assert decode_event(encode_event({"counts": {1: "a"}})) == {"counts": {"1": "a"}}
+    pytest.importorskip("msgpack")
+    assert decode_event(encode_event(event, codec="msgpack")) == event
+
+
+def test_coalesced_emit_pipelines_same_tick_events_in_order():
+    async def run():
+        client = fakeredis.aioredis.FakeRedis()
+        bus = RedisEventBus(client=client, codec="json")
+        pubsub = client.pubsub()
+        await pubsub.subscribe(bus.channel)
+        await pubsub.get_message(timeout=1)  # subscribe 确认
+
+        pipelines = []
+        original = client.pipeline
+
+        def counting_pipeline(*args, **kwargs):
+            pipelines.append(1)
+            return original(*args, **kwargs)
+
+        client.pipeline = counting_pipeline
+        await asyncio.gather(*(bus.emit({"type": "t", "seq": i}) for i in range(50)))
+        assert len(pipelines) == 1
+
+        received = []
+        while len(received) < 50:
+            message = await pubsub.get_message(timeout=1)
+            if message and message["type"] == "message":
+                received.append(decode_event(message["data"])["seq"])
+        assert received == list(range(50))
+        await pubsub.aclose()
+        await bus.close()
+
+    asyncio.run(run())
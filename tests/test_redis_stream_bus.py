@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from mq.queue import RedisStreamEventBus
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+def _bus(client, consumer, **kwargs):
+    return RedisStreamEventBus(client=client, consumer=consumer, auto_listen=False, block_ms=10, **kwargs)
+
+
+def test_consumer_group_divides_events_between_workers():
+    async def run():
+        client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        seen = {"a": [], "b": []}
+        workers = {name: _bus(client, name, batch_size=3) for name in seen}
+        for name, bus in workers.items():
+            async def record(event, name=name):
+                seen[name].append(event["seq"])
+
+            bus.subscribe(record)
+        for i in range(10):
+            await workers["a"].emit({"type": "t", "seq": i})
+        while sum(len(v) for v in seen.values()) < 10:
+            await workers["a"].poll()
+            await workers["b"].poll()
+        assert sorted(seen["a"] + seen["b"]) == list(range(10))
+        assert seen["a"] and seen["b"]
+        assert (await client.xpending("agent-events", "agent-workers"))["pending"] == 0
+
+    asyncio.run(run())
+
+
+def test_failed_entries_are_reclaimed_by_another_worker():
+    async def run():
+        client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        crashed = _bus(client, "crashed")
+        healthy = _bus(client, "healthy", claim_idle_ms=0)
+        received = []
+
+        async def broken(event):
+            raise RuntimeError("worker died")
+
+        async def ok(event):
+            received.append(event["seq"])
+
+        crashed.subscribe(broken)
+        healthy.subscribe(ok)
+        await crashed.emit({"type": "t", "seq": 1})
+        await crashed.poll()
+        assert (await client.xpending("agent-events", "agent-workers"))["pending"] == 1
+        await healthy.poll()
+        assert received == [1]
+        assert (await client.xpending("agent-events", "agent-workers"))["pending"] == 0
+
+    asyncio.run(run())
+
+
+def test_redelivery_skips_subscribers_that_already_succeeded():
+    async def run():
+        client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        bus = _bus(client, "w", claim_idle_ms=0)
+        audit, flaky_calls = [], []
+
+        async def record(event):
+            audit.append(event["seq"])
+
+        async def flaky(event):
+            flaky_calls.append(event["seq"])
+            if len(flaky_calls) == 1:
+                raise RuntimeError("sink down")
+
+        bus.subscribe(record)
+        bus.subscribe(flaky)
+        await bus.emit({"type": "t", "seq": 1})
+        await bus.poll()
+        assert (await client.xpending("agent-events", "agent-workers"))["pending"] == 1
+        await bus.reclaim()
+        assert audit == [1] and flaky_calls == [1, 1]
+        assert (await client.xpending("agent-events", "agent-workers"))["pending"] == 0
+        assert await client.hlen("agent-events:progress") == 0
+
+    asyncio.run(run())
+
+
+def test_poison_and_malformed_entries_go_to_dead_letter_stream():
+    async def run():
+        client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        bus = _bus(client, "w", claim_idle_ms=0, max_deliveries=3)
+        received = []
+
+        async def handler(event):
+            if event["seq"] == 0:
+                raise RuntimeError("always fails")
+            received.append(event["seq"])
+
+        bus.subscribe(handler)
+        await bus.emit({"type": "t", "seq": 0})
+        await client.xadd("agent-events", {"data": "{not json"})
+        await bus.emit({"type": "t", "seq": 2})
+        await bus.poll()
+        # 畸形载荷不影响同批其它条目的确认
+        assert received == [2]
+        dead = await client.xrange("agent-events:dlq")
+        assert [fields["reason"].split(":")[0] for _, fields in dead] == ["undecodable"]
+
+        for _ in range(5):
+            await bus.reclaim()
+        dead = await client.xrange("agent-events:dlq")
+        assert len(dead) == 2 and dead[1][1]["reason"] == "exceeded 3 deliveries"
+        assert '"seq":0' in dead[1][1]["data"].replace(" ", "")
+        assert (await client.xpending("agent-events", "agent-workers"))["pending"] == 0
+
+    asyncio.run(run())
@@ -0,0 +1,180 @@
+import asyncio
+import io
+import os
+import threading
+import time
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+
+from storage.s3 import MIN_PART_SIZE, S3MediaStore
+
+mock_aws = pytest.importorskip("moto").mock_aws
+
+BUCKET = "media-test"
+
+
+@pytest.fixture
+def s3_store(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET)
+        yield S3MediaStore(bucket=BUCKET, region="us-east-1", prefix="media")
+
+
+def _get(store, key):
+    return store._s3.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+
+
+def test_multipart_upload_from_file_reports_progress_and_bounds_concurrency(s3_store):
+    data = os.urandom(MIN_PART_SIZE * 2 + 1234)
+    active, peak = 0, 0
+    lock = threading.Lock()
+    original = s3_store._s3.upload_part
+
+    def tracking_upload_part(**kwargs):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.05)
+        try:
+            return original(**kwargs)
+        finally:
+            with lock:
+                active -= 1
+
+    s3_store._s3.upload_part = tracking_upload_part
+    progress = []
+
+    async def run():
+        return await s3_store.aupload_media(
+            "task-1",
+            "video.mp4",
+            io.BytesIO(data),
+            media_type="video",
+            metadata={"campaign": 7},
+            content_type="video/mp4",
+            part_size=MIN_PART_SIZE,
+            concurrency=2,
+            progress=lambda done, total: progress.append((done, total)),
+        )
+
+    res = asyncio.run(run())
+    assert res["strategy"] == "s3-multipart" and res["parts"] == 3 and res["size"] == len(data)
+    assert _get(s3_store, res["key"]) == data
+    head = s3_store._s3.head_object(Bucket=BUCKET, Key=res["key"])
+    assert head["Metadata"] == {"campaign": "7"} and head["ContentType"] == "video/mp4"
+    assert [p[1] for p in progress] == [len(data)] * 3
+    assert sorted(p[0] for p in progress) == [p[0] for p in progress] and progress[-1][0] == len(data)
+    assert peak == 2
+
+
+def test_async_iterator_source_and_single_part_upload(s3_store):
+    data = os.urandom(MIN_PART_SIZE + 100)
+
+    async def chunks():
+        for start in range(0, len(data), 777_777):
+            await asyncio.sleep(0)
+            yield data[start : start + 777_777]
+
+    async def run():
+        seen = []
+
+        async def on_progress(done, total):
+            seen.append((done, total))
+
+        multipart = await s3_store.aupload_media("task-2", "clip.bin", chunks(), part_size=MIN_PART_SIZE, progress=on_progress)
+        small = await s3_store.aupload_media("task-2", "note.txt", b"hello")
+        return multipart, small, seen
+
+    multipart, small, seen = asyncio.run(run())
+    assert multipart["parts"] == 2 and _get(s3_store, multipart["key"]) == data
+    assert seen[-1] == (len(data), None)
+    assert small["strategy"] == "s3" and _get(s3_store, small["key"]) == b"hello"
+
+
+def test_failed_part_aborts_multipart_upload(s3_store):
+    original = s3_store._s3.upload_part
+
+    def flaky_upload_part(**kwargs):
+        if kwargs["PartNumber"] == 2:
+            raise ClientError({"Error": {"Code": "InternalError", "Message": "boom"}}, "UploadPart")
+        return original(**kwargs)
+
+    s3_store._s3.upload_part = flaky_upload_part
+    with pytest.raises(RuntimeError, match="S3 upload failed"):
+        asyncio.run(s3_store.aupload_media("task-3", "big.bin", os.urandom(MIN_PART_SIZE * 3), part_size=MIN_PART_SIZE))
+    assert not s3_store._s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads")
+
+    with pytest.raises(ValueError):
+        asyncio.run(s3_store.aupload_media("task-3", "tiny-parts.bin", b"x", part_size=1024))
+
+
+def test_force_local_streams_to_fallback_dir(tmp_path):
+    store = S3MediaStore(fallback_dir=str(tmp_path), force_local=True)
+    data = os.urandom(300_000)
+    progress = []
+
+    async def run():
+        return await store.aupload_media(
+            "task-4", "local.bin", io.BytesIO(data), part_size=64 * 1024, progress=lambda d, t: progress.append(d)
+        )
+
+    res = asyncio.run(run())
+    assert res["strategy"] == "local" and res["size"] == len(data)
+    assert store.download_media(res["key"]) == data
+    assert len(progress) == 5 and progress[-1] == len(data)
+    assert not list(tmp_path.rglob("*.part"))
+
+
+def test_open_media_range_reads_from_s3(s3_store):
+    data = os.urandom(100_000)
+    s3_store._s3.put_object(Bucket=BUCKET, Key="media/clip.bin", Body=data)
+
+    with s3_store.open_media("media/clip.bin", offset=1000, length=500) as reader:
+        assert reader.size == 500 and reader.total_size == len(data)
+        assert reader.read(100) + reader.read() == data[1000:1500]
+    with s3_store.open_media("media/clip.bin", offset=99_000) as reader:
+        assert reader.read() == data[99_000:]
+
+    async def collect(**kwargs):
+        return [bytes(c) async for c in s3_store.iter_media("media/clip.bin", chunk_size=30_000, **kwargs)]
+
+    chunks = asyncio.run(collect())
+    assert [len(c) for c in chunks] == [30_000, 30_000, 30_000, 10_000]
+    assert b"".join(chunks) == data
+    assert b"".join(asyncio.run(collect(offset=5, length=70_000))) == data[5:70_005]
+    with pytest.raises(RuntimeError):
+        s3_store.open_media("media/missing.bin")
+
+
+def test_open_media_local_is_memory_mapped(tmp_path):
+    store = S3MediaStore(fallback_dir=str(tmp_path), force_local=True)
+    data = os.urandom(200_000)
+    key = store.upload_media("task-5", "big.bin", data)["key"]
+
+    with store.open_media(key, offset=10, length=1000) as reader:
+        # 本地模式直接暴露 mmap 区间，不复制
+        assert isinstance(reader.view, memoryview) and reader.view.readonly
+        assert reader.view.nbytes == 1000 and reader.view[:5] == data[10:15]
+        assert reader.read(10) == data[10:20]
+
+    async def collect():
+        total, first_type = 0, None
+        async for chunk in store.iter_media(key, chunk_size=64 * 1024):
+            first_type = first_type or type(chunk)
+            assert chunk == data[total : total + len(chunk)]
+            total += len(chunk)
+        return total, first_type
+
+    total, first_type = asyncio.run(collect())
+    assert total == len(data) and first_type is memoryview
+
+    empty_key = store.upload_media("task-5", "empty.bin", b"")["key"]
+    with store.open_media(empty_key) as reader:
+        assert reader.size == 0 and reader.read() == b""
+    with pytest.raises(ValueError):
+        store.open_media(key, offset=len(data) + 1)
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+from prometheus_client import REGISTRY
+
+from monitoring.tracing import StageSpan, TaskSpan, configure_tracing, current_task_id
+from mq.queue import InMemoryEventBus
+from orchestrator.content_marketing_flow import ContentMarketingFlow
+
+
+def _count(name, **labels):
+    return REGISTRY.get_sample_value(f"{name}_count", labels) or 0.0
+
+
+class _FakeStore:
+    def __init__(self):
+        self.statuses = []
+
+    async def set_status(self, task_id, status):
+        self.statuses.append(status)
+
+
+def test_stage_span_records_attempts_backoff_and_task_context():
+    async def run():
+        before_error = _count("agent_flow_attempt_seconds", stage="t_stage", outcome="error")
+        before_ok = _count("agent_flow_stage_seconds", stage="t_stage", outcome="ok")
+        seen = []
+
+        async def child():
+            seen.append(current_task_id.get())
+
+        with TaskSpan("task-1"):
+            with StageSpan("t_stage") as stage:
+                for attempt in range(2):
+                    try:
+                        with stage.attempt():
+                            await asyncio.gather(child(), child())
+                            if attempt == 0:
+                                raise RuntimeError("flaky")
+                        break
+                    except RuntimeError:
+                        await stage.backoff(0)
+        assert seen == ["task-1"] * 4
+        assert current_task_id.get() is None
+        assert stage.attempts == 2 and stage.succeeded
+        assert _count("agent_flow_attempt_seconds", stage="t_stage", outcome="error") == before_error + 1
+        assert _count("agent_flow_stage_seconds", stage="t_stage", outcome="ok") == before_ok + 1
+        assert _count("agent_flow_backoff_seconds", stage="t_stage") >= 1
+
+    asyncio.run(run())
+
+
+def test_flow_exports_stage_and_io_histograms():
+    async def run():
+        before_stage = _count("agent_flow_stage_seconds", stage="writer", outcome="ok")
+        before_io = _count("agent_flow_io_seconds", component="store", op="set_status")
+        store = _FakeStore()
+        flow = ContentMarketingFlow(store, InMemoryEventBus())
+        result = await flow.run({"task_id": "trace-1", "payload": {"platform": "twitter"}})
+        assert "final" in result and store.statuses == ["running", "success"]
+        assert _count("agent_flow_stage_seconds", stage="writer", outcome="ok") == before_stage + 1
+        assert _count("agent_flow_io_seconds", component="store", op="set_status") == before_io + 2
+
+    asyncio.run(run())
+
+
+def test_opentelemetry_spans_nest_under_task():
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry import trace
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    assert configure_tracing(True)
+    try:
+        with TaskSpan("task-otel"):
+            with StageSpan("critic") as stage:
+                with stage.attempt():
+                    pass
+    finally:
+        configure_tracing(False)
+    spans = {s.name: s for s in exporter.get_finished_spans()}
+    assert set(spans) == {"flow.run", "flow.stage.critic", "flow.attempt.critic"}
+    assert spans["flow.attempt.critic"].parent.span_id == spans["flow.stage.critic"].context.span_id
+    assert spans["flow.stage.critic"].parent.span_id == spans["flow.run"].context.span_id
+    assert spans["flow.stage.critic"].attributes["task_id"] == "task-otel"
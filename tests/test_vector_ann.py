@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from vectorstore.ann import HNSWVectorStore, IVFVectorStore
+from vectorstore.memory import SimpleVectorStore
+
+
+def _dataset(n=2000, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((40, dim))
+    data = centers[rng.integers(0, 40, n)] + 0.3 * rng.standard_normal((n, dim))
+    queries = centers[rng.integers(0, 40, 20)] + 0.3 * rng.standard_normal((20, dim))
+    return data, queries
+
+
+def _recall(store, data, queries, **kwargs):
+    exact = SimpleVectorStore()
+    exact.add_many(data, [{"id": i} for i in range(len(data))])
+    hits = 0
+    for got, want in zip(store.query_many(queries, top_k=10, **kwargs), exact.query_many(queries, top_k=10)):
+        hits += len({r["meta"]["id"] for r in got} & {r["meta"]["id"] for r in want})
+    return hits / (10 * len(queries))
+
+
+def test_ivf_store_trains_incrementally_and_tunes_recall():
+    data, queries = _dataset()
+    store = IVFVectorStore(nlist=32, nprobe=4, train_size=1000)
+    store.add_many(data[:500], [{"id": i} for i in range(500)])
+    assert not store.trained
+    # 训练前为精确检索
+    assert store.query(data[7], top_k=1)[0]["meta"]["id"] == 7
+
+    store.add_many(data[500:1500], [{"id": i} for i in range(500, 1500)])
+    assert store.trained
+    for i in range(1500, 2000):
+        store.add(data[i], {"id": i})
+    assert len(store) == 2000
+    assert sum(s.size for s in store._lists) == 2000
+
+    assert _recall(store, data, queries, nprobe=32) == 1.0
+    assert _recall(store, data, queries, nprobe=4) >= 0.9
+
+
+@pytest.mark.parametrize("backend", ["hnswlib", "faiss"])
+def test_hnsw_store_backends(backend):
+    pytest.importorskip(backend)
+    data, queries = _dataset(n=1000)
+    store = HNSWVectorStore(M=16, ef=64, initial_capacity=100, backend=backend)
+    store.add_many(data[:600], [{"id": i} for i in range(600)])
+    for i in range(600, 1000):
+        store.add(data[i], {"id": i})
+    assert len(store) == 1000
+    assert _recall(store, data, queries) >= 0.95
+    top = store.query(data[3], top_k=1)[0]
+    assert top["meta"]["id"] == 3 and top["score"] == pytest.approx(1.0, abs=1e-4)
@@ -1,3 +1,9 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from vectorstore.filters import MetadataIndex
 from vectorstore.memory import SimpleVectorStore
 
 
@@ -11,3 +17,101 @@ def test_simple_vector_store_query():
     assert res[0]["meta"]["id"] in {"a", "c"}
 
 
+def test_vector_store_matches_bruteforce_and_grows():
+    rng = np.random.default_rng(1)
+    data = rng.standard_normal((300, 16))
+    vs = SimpleVectorStore(initial_capacity=8)
+    vs.add_many(data[:100], [{"id": i} for i in range(100)])
+    for i in range(100, 300):
+        vs.add(data[i].tolist(), {"id": i})
+    assert len(vs) == 300
+
+    queries = rng.standard_normal((5, 16))
+    unit = data / np.linalg.norm(data, axis=1, keepdims=True)
+    for q, res in zip(queries, vs.query_many(queries, top_k=7)):
+        expected = np.argsort(-(unit @ (q / np.linalg.norm(q))))[:7]
+        assert [r["meta"]["id"] for r in res] == expected.tolist()
+        assert [r["meta"] for r in res] == [r["meta"] for r in vs.query(q, top_k=7)]
+
+
+def test_vector_store_edge_cases():
+    vs = SimpleVectorStore()
+    assert vs.query([1.0, 0.0, 0.0], top_k=3) == []
+    # 空库上的查询不确定维度
+    assert vs.dim is None
+    vs.add([0.0, 0.0], {"id": "zero"})
+    vs.add([0.0, 2.0], {"id": "y"})
+    res = vs.query([0.0, 1.0], top_k=5)
+    assert [r["meta"]["id"] for r in res] == ["y", "zero"]
+    assert res[0]["score"] == 1.0 and res[1]["score"] == 0.0
+    with pytest.raises(ValueError):
+        vs.add([1.0, 0.0, 0.0], {"id": "bad"})
+
+
+def test_vector_store_where_filters_before_scoring():
+    now = datetime(2026, 10, 1)
+    rng = np.random.default_rng(2)
+    vecs = rng.standard_normal((400, 8))
+    metas = [
+        {
+            "id": i,
+            "platform": ["twitter", "weibo", "xhs"][i % 3],
+            "campaign": f"c{i % 4}",
+            "tags": ["promo"] if i % 5 == 0 else [],
+            "created_at": now - timedelta(days=i % 60),
+        }
+        for i in range(400)
+    ]
+    vs = SimpleVectorStore(index_fields=["platform", "campaign", "tags", "created_at"])
+    vs.add_many(vecs, metas)
+
+    where = {"platform": "twitter", "campaign": {"$in": ["c1", "c2"]}, "created_at": {"$gte": now - timedelta(days=30)}}
+    allowed = [
+        m["id"]
+        for m in metas
+        if m["platform"] == "twitter" and m["campaign"] in ("c1", "c2") and m["created_at"] >= now - timedelta(days=30)
+    ]
+    res = vs.query(vecs[0], top_k=len(allowed) + 10, where=where)
+    assert sorted(r["meta"]["id"] for r in res) == sorted(allowed)
+    scores = [r["score"] for r in res]
+    assert scores == sorted(scores, reverse=True)
+
+    assert {r["meta"]["id"] % 5 for r in vs.query(vecs[0], top_k=5, where={"tags": "promo"})} == {0}
+    assert vs.query_many(vecs[:2], where={"platform": "unknown"}) == [[], []]
+    # 未索引字段退化为逐行扫描，可与索引条件组合
+    assert [r["meta"]["id"] for r in vs.query(vecs[0], where={"id": 3})] == [3]
+    assert sorted(r["meta"]["id"] for r in vs.query(vecs[0], where={"platform": "xhs", "id": {"$lt": 6}})) == [2, 5]
+    with pytest.raises(ValueError):
+        vs.query(vecs[0], where={"platform": {"$regex": "tw"}})
+
+
+def test_vector_store_index_is_opt_in_and_type_tagged():
+    vecs = np.eye(4)
+    metas = [{"id": i, "flag": flag} for i, flag in enumerate([True, 1, "1", [1.0, "x"]])]
+    indexed = SimpleVectorStore(index_fields=["flag"])
+    scanned = SimpleVectorStore()
+    for vs in (indexed, scanned):
+        vs.add_many(vecs, metas)
+
+        def rows(where):
+            return sorted(r["meta"]["id"] for r in vs.query(vecs[0], top_k=4, where=where))
+
+        # True 与 1、"1" 与 1 互不命中；1 与 1.0 按数值相等
+        assert rows({"flag": True}) == [0]
+        assert rows({"flag": 1}) == [1, 3]
+        assert rows({"flag": {"$in": ["1", "x"]}}) == [2, 3]
+        assert rows({"flag": {"$gte": 1}}) == [1, 3]
+    assert not scanned._index._postings
+
+
+def test_metadata_index_requires_metas_for_unindexed_fields():
+    metas = [{"platform": "twitter", "score": 1}, {"platform": "weibo", "score": 2}]
+    index = MetadataIndex(index_fields=["platform"])
+    for row, meta in enumerate(metas):
+        index.add(row, meta)
+    assert index.select({"platform": "weibo"}).tolist() == [1]
+    # 未索引字段需要逐行扫描，缺少 metas 时报错而不是静默返回空结果
+    with pytest.raises(ValueError, match="score"):
+        index.select({"platform": "weibo", "score": {"$gte": 2}})
+    assert index.select({"score": {"$gte": 2}}, metas).tolist() == [1]
+    assert index.select({"score": 1}, []).tolist() == []
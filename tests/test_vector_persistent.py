@@ -0,0 +1,47 @@
+import numpy as np
+
+from vectorstore.memory import SimpleVectorStore
+from vectorstore.persistent import PersistentVectorStore
+
+
+def _ids(results):
+    return [r["meta"]["id"] for r in results]
+
+
+def test_persistent_store_reopens_from_segments_and_wal(tmp_path):
+    rng = np.random.default_rng(0)
+    data = rng.standard_normal((260, 8))
+    store = PersistentVectorStore(tmp_path, seal_threshold=100)
+    store.add_many(data[:150], [{"id": i, "text": f"文案{i}"} for i in range(150)])
+    for i in range(150, 260):
+        store.add(data[i], {"id": i})
+    assert len(store) == 260
+    assert len(store._segments) == 2 and len(store._tail) == 10
+    store.close()
+
+    exact = SimpleVectorStore()
+    exact.add_many(data, [{"id": i} for i in range(260)])
+    reopened = PersistentVectorStore(tmp_path, readonly=True)
+    assert len(reopened) == 260
+    assert isinstance(reopened._segments[0].vectors, np.memmap)
+    for q in data[::37]:
+        assert _ids(reopened.query(q, top_k=5)) == _ids(exact.query(q, top_k=5))
+    assert reopened.query(data[3], top_k=1)[0]["meta"] == {"id": 3, "text": "文案3"}
+
+
+def test_persistent_store_recovers_torn_wal_and_refreshes_readers(tmp_path):
+    writer = PersistentVectorStore(tmp_path, dim=2, seal_threshold=10)
+    reader = PersistentVectorStore(tmp_path, readonly=True)
+    writer.add([1.0, 0.0], {"id": "a"})
+    assert reader.refresh() and _ids(reader.query([1.0, 0.0], top_k=1)) == ["a"]
+
+    # 模拟崩溃：WAL 末尾只写了半条记录
+    writer._wal.write(b"\x05\x00\x00\x00\x00\x00")
+    writer.close()
+    writer = PersistentVectorStore(tmp_path, seal_threshold=10)
+    writer.add([0.0, 1.0], {"id": "b"})
+    assert _ids(writer.query([0.0, 1.0], top_k=2)) == ["b", "a"]
+
+    writer.seal()
+    assert reader.refresh() and len(reader) == 2 and len(reader._tail) == 0
+    assert sorted(p.name for p in tmp_path.glob("wal-*")) == ["wal-000002.log"]
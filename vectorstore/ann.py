@@ -0,0 +1,294 @@
+"""
+近似最近邻（ANN）向量库，与 SimpleVectorStore 保持相同的 add/add_many/query/query_many 接口：
+- IVFVectorStore：纯 NumPy 倒排（IVF-Flat），nprobe 调节召回/延迟；
+- HNSWVectorStore：封装本地安装的 hnswlib 或 faiss-cpu，ef 调节召回/延迟。
+"""
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from vectorstore.memory import _normalize_rows, _to_matrix, _top_k
+
+try:
+    import hnswlib
+except Exception:  # pragma: no cover - 可选依赖
+    hnswlib = None
+
+try:
+    import faiss
+except Exception:  # pragma: no cover - 可选依赖
+    faiss = None
+
+
+class _Segment:
+    """倒排列表：连续 float32 向量块 + 对应的全局 id，容量倍增扩容。"""
+
+    def __init__(self, dim: int, capacity: int = 64) -> None:
+        self.vectors = np.empty((capacity, dim), dtype=np.float32)
+        self.ids = np.empty(capacity, dtype=np.int64)
+        self.size = 0
+
+    def append(self, rows: np.ndarray, ids: np.ndarray) -> None:
+        needed = self.size + len(rows)
+        if needed > len(self.ids):
+            capacity = max(needed, len(self.ids) * 2)
+            vectors = np.empty((capacity, self.vectors.shape[1]), dtype=np.float32)
+            vectors[: self.size] = self.vectors[: self.size]
+            new_ids = np.empty(capacity, dtype=np.int64)
+            new_ids[: self.size] = self.ids[: self.size]
+            self.vectors, self.ids = vectors, new_ids
+        self.vectors[self.size : needed] = rows
+        self.ids[self.size : needed] = ids
+        self.size = needed
+
+    def data(self) -> np.ndarray:
+        return self.vectors[: self.size]
+
+    def keys(self) -> np.ndarray:
+        return self.ids[: self.size]
+
+
+class IVFVectorStore:
+    """
+    倒排文件索引：球面 k-means 训练 nlist 个质心，向量写入最近质心的倒排列表；
+    查询只扫描与查询向量最相近的 nprobe 个列表。
+    累计写入 train_size 条之前不建索引、精确暴力检索；达到后自动训练，之后的写入增量分配到列表。
+    """
+
+    def __init__(
+        self,
+        dim: Optional[int] = None,
+        nlist: int = 1024,
+        nprobe: int = 16,
+        train_size: Optional[int] = None,
+        kmeans_iters: int = 10,
+        seed: int = 0,
+    ) -> None:
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_size = train_size or nlist * 32
+        self.kmeans_iters = kmeans_iters
+        self._rng = np.random.default_rng(seed)
+        self._metas: List[Dict[str, Any]] = []
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[_Segment] = []
+        self._buffer: Optional[_Segment] = None
+
+    def __len__(self) -> int:
+        return len(self._metas)
+
+    @property
+    def trained(self) -> bool:
+        return self._centroids is not None
+
+    def add(self, vec: Sequence[float], meta: Dict[str, Any]) -> None:
+        self.add_many([vec], [meta])
+
+    def add_many(self, vecs: Sequence[Sequence[float]] | np.ndarray, metas: Sequence[Dict[str, Any]]) -> None:
+        rows = _to_matrix(vecs, self.dim)
+        if len(rows) != len(metas):
+            raise ValueError(f"got {len(rows)} vectors but {len(metas)} metas")
+        if not len(rows):
+            return
+        if self.dim is None:
+            self.dim = rows.shape[1]
+        rows = _normalize_rows(rows)
+        ids = np.arange(len(self._metas), len(self._metas) + len(rows), dtype=np.int64)
+        self._metas.extend(dict(m) for m in metas)
+        if self.trained:
+            self._assign(rows, ids)
+            return
+        if self._buffer is None:
+            self._buffer = _Segment(rows.shape[1])
+        self._buffer.append(rows, ids)
+        if self._buffer.size >= self.train_size:
+            self.train()
+
+    def train(self, sample_size: Optional[int] = None) -> None:
+        """
+        （重新）训练质心并把全部向量重新分配到倒排列表。
+        k-means 只在最多 sample_size（默认 nlist * 64）条采样上迭代。
+        """
+        segments = [s for s in self._lists + [self._buffer] if s is not None and s.size]
+        if not segments:
+            return
+        data = np.concatenate([s.data() for s in segments])
+        ids = np.concatenate([s.keys() for s in segments])
+        nlist = min(self.nlist, len(data))
+        sample_size = sample_size or nlist * 64
+        sample = data[self._rng.choice(len(data), size=min(sample_size, len(data)), replace=False)]
+        self._centroids = self._kmeans(sample, nlist)
+        self._lists = [_Segment(data.shape[1]) for _ in range(nlist)]
+        self._buffer = None
+        self._assign(data, ids)
+
+    def query(self, vec: Sequence[float], top_k: int = 3, nprobe: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self.query_many([vec], top_k=top_k, nprobe=nprobe)[0]
+
+    def query_many(
+        self,
+        vecs: Sequence[Sequence[float]] | np.ndarray,
+        top_k: int = 3,
+        nprobe: Optional[int] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        queries = _normalize_rows(_to_matrix(vecs, self.dim))
+        if not self._metas or top_k <= 0:
+            return [[] for _ in range(len(queries))]
+        if not self.trained:
+            assert self._buffer is not None
+            scores = queries @ self._buffer.data().T
+            return [self._collect(s, self._buffer.keys(), top_k) for s in scores]
+
+        assert self._centroids is not None
+        probes = _top_k(queries @ self._centroids.T, min(nprobe or self.nprobe, len(self._centroids)))
+        # 按倒排列表分组：同一列表被多个查询命中时只做一次矩阵乘
+        parts: List[List[np.ndarray]] = [[] for _ in range(len(queries))]
+        part_ids: List[List[np.ndarray]] = [[] for _ in range(len(queries))]
+        for list_no in np.unique(probes):
+            segment = self._lists[list_no]
+            if not segment.size:
+                continue
+            hit = np.nonzero((probes == list_no).any(axis=1))[0]
+            block = segment.data() @ queries[hit].T
+            for col, q in enumerate(hit):
+                parts[q].append(block[:, col])
+                part_ids[q].append(segment.keys())
+        results = []
+        for q in range(len(queries)):
+            if not parts[q]:
+                results.append([])
+                continue
+            results.append(self._collect(np.concatenate(parts[q]), np.concatenate(part_ids[q]), top_k))
+        return results
+
+    def _collect(self, scores: np.ndarray, ids: np.ndarray, top_k: int) -> List[Dict[str, Any]]:
+        picked = _top_k(scores, min(top_k, len(scores)))
+        return [{"score": float(scores[i]), "meta": self._metas[ids[i]]} for i in picked]
+
+    def _kmeans(self, sample: np.ndarray, nlist: int) -> np.ndarray:
+        centroids = sample[self._rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(self.kmeans_iters):
+            labels = self._nearest(sample, centroids)
+            order = np.argsort(labels, kind="stable")
+            present, starts = np.unique(labels[order], return_index=True)
+            sums = np.zeros_like(centroids)
+            sums[present] = np.add.reduceat(sample[order], starts, axis=0)
+            # 空簇用随机样本重新播种
+            empty = np.setdiff1d(np.arange(nlist), present)
+            if len(empty):
+                sums[empty] = sample[self._rng.choice(len(sample), size=len(empty))]
+            centroids = _normalize_rows(sums)
+        return centroids
+
+    def _assign(self, rows: np.ndarray, ids: np.ndarray) -> None:
+        assert self._centroids is not None
+        labels = self._nearest(rows, self._centroids)
+        order = np.argsort(labels, kind="stable")
+        present, starts = np.unique(labels[order], return_index=True)
+        for list_no, chunk_rows, chunk_ids in zip(
+            present, np.split(rows[order], starts[1:]), np.split(ids[order], starts[1:])
+        ):
+            self._lists[list_no].append(chunk_rows, chunk_ids)
+
+    @staticmethod
+    def _nearest(rows: np.ndarray, centroids: np.ndarray, chunk_size: int = 65_536) -> np.ndarray:
+        labels = np.empty(len(rows), dtype=np.int64)
+        for start in range(0, len(rows), chunk_size):
+            labels[start : start + chunk_size] = np.argmax(rows[start : start + chunk_size] @ centroids.T, axis=1)
+        return labels
+
+
+class HNSWVectorStore:
+    """
+    HNSW 图索引：优先使用 hnswlib，其次 faiss-cpu（backend="auto"）。
+    向量归一化后按内积建图，score 即余弦相似度；容量不足时自动倍增 resize。
+    M / ef_construction 决定图质量与构建耗时，ef 决定查询召回与延迟（可随时修改）。
+    """
+
+    def __init__(
+        self,
+        dim: Optional[int] = None,
+        M: int = 16,
+        ef_construction: int = 200,
+        ef: int = 64,
+        initial_capacity: int = 10_000,
+        backend: str = "auto",
+    ) -> None:
+        if backend == "auto":
+            backend = "hnswlib" if hnswlib is not None else "faiss" if faiss is not None else ""
+        if backend not in ("hnswlib", "faiss", ""):
+            raise ValueError(f"unknown HNSW backend: {backend}")
+        if not backend or {"hnswlib": hnswlib, "faiss": faiss}[backend] is None:
+            raise RuntimeError("HNSWVectorStore requires hnswlib or faiss-cpu to be installed")
+        self.backend = backend
+        self.dim = dim
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef = ef
+        self._capacity = initial_capacity
+        self._index: Any = None
+        self._metas: List[Dict[str, Any]] = []
+
+    def __len__(self) -> int:
+        return len(self._metas)
+
+    def add(self, vec: Sequence[float], meta: Dict[str, Any]) -> None:
+        self.add_many([vec], [meta])
+
+    def add_many(self, vecs: Sequence[Sequence[float]] | np.ndarray, metas: Sequence[Dict[str, Any]]) -> None:
+        rows = _to_matrix(vecs, self.dim)
+        if len(rows) != len(metas):
+            raise ValueError(f"got {len(rows)} vectors but {len(metas)} metas")
+        if not len(rows):
+            return
+        rows = _normalize_rows(rows)
+        if self._index is None:
+            self.dim = rows.shape[1]
+            self._index = self._create_index()
+        ids = np.arange(len(self._metas), len(self._metas) + len(rows))
+        if self.backend == "hnswlib":
+            needed = len(self._metas) + len(rows)
+            if needed > self._capacity:
+                self._capacity = max(needed, self._capacity * 2)
+                self._index.resize_index(self._capacity)
+            self._index.add_items(rows, ids)
+        else:
+            self._index.add(rows)
+        self._metas.extend(dict(m) for m in metas)
+
+    def query(self, vec: Sequence[float], top_k: int = 3, ef: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self.query_many([vec], top_k=top_k, ef=ef)[0]
+
+    def query_many(
+        self,
+        vecs: Sequence[Sequence[float]] | np.ndarray,
+        top_k: int = 3,
+        ef: Optional[int] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        queries = _normalize_rows(_to_matrix(vecs, self.dim))
+        if not self._metas or top_k <= 0:
+            return [[] for _ in range(len(queries))]
+        k = min(top_k, len(self._metas))
+        # ef 小于 k 时两个库都会退化（hnswlib 直接报错），取二者较大值
+        search_ef = max(ef or self.ef, k)
+        if self.backend == "hnswlib":
+            self._index.set_ef(search_ef)
+            labels, distances = self._index.knn_query(queries, k=k)
+            scores = 1.0 - distances
+        else:
+            self._index.hnsw.efSearch = search_ef
+            scores, labels = self._index.search(queries, k)
+        return [
+            [{"score": float(s), "meta": self._metas[i]} for s, i in zip(row_scores, row_ids) if i >= 0]
+            for row_scores, row_ids in zip(scores, labels)
+        ]
+
+    def _create_index(self) -> Any:
+        if self.backend == "hnswlib":
+            index = hnswlib.Index(space="ip", dim=self.dim)
+            index.init_index(max_elements=self._capacity, ef_construction=self.ef_construction, M=self.M)
+            return index
+        index = faiss.IndexHNSWFlat(self.dim, self.M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = self.ef_construction
+        return index
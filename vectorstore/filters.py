@@ -0,0 +1,213 @@
+"""
+元数据过滤：按字段维护倒排索引，查询前先求出满足条件的行号集合，只对这部分向量打分。
+
+过滤表达式为字典，多个字段之间为 AND：
+    {"platform": "twitter"}                              等值
+    {"platform": {"$in": ["twitter", "weibo"]}}          多值
+    {"created_at": {"$gte": start, "$lt": end}}          范围（数值或 datetime）
+列表类型的字段值（如 tags）按每个元素分别建索引，等值条件命中任一元素即可。
+只有 index_fields 中的字段建倒排索引；其余字段的条件对（索引筛出的）候选行逐行判断，语义相同。
+"""
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_RANGE_OPS = ("$gt", "$gte", "$lt", "$lte")
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+def _numeric(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return None
+
+
+def _key(value: Any) -> Optional[Tuple[str, Any]]:
+    """带类型标记的索引键：True 与 1、"1" 与 1 互不相等；int 与 float 按数值相等。不可索引的取值返回 None。"""
+    if isinstance(value, bool):
+        return ("bool", value)
+    if isinstance(value, (int, float)):
+        return ("num", value)
+    if isinstance(value, datetime):
+        return ("datetime", value.timestamp())
+    if isinstance(value, str):
+        return ("str", value)
+    return None
+
+
+def _items(value: Any) -> Iterable[Any]:
+    return value if isinstance(value, (list, tuple, set)) else (value,)
+
+
+def _split_condition(field: str, condition: Any) -> Tuple[Optional[List[Any]], Dict[str, float]]:
+    """校验并拆分单个字段的条件：返回 (等值候选列表或 None, {范围操作符: 数值边界})。"""
+    if not isinstance(condition, dict):
+        return [condition], {}
+    unknown = set(condition) - set(_RANGE_OPS) - {"$in"}
+    if unknown:
+        raise ValueError(f"unsupported filter operators for {field!r}: {sorted(unknown)}")
+    ranges: Dict[str, float] = {}
+    for op in _RANGE_OPS:
+        if op in condition:
+            bound = _numeric(condition[op])
+            if bound is None:
+                raise ValueError(f"range filter {op} needs a number or datetime bound")
+            ranges[op] = bound
+    equals = list(condition["$in"]) if "$in" in condition else None
+    if equals is None and not ranges:
+        raise ValueError(f"empty filter condition for {field!r}")
+    return equals, ranges
+
+
+def _in_range(value: float, ranges: Dict[str, float]) -> bool:
+    checks = {
+        "$gt": lambda b: value > b,
+        "$gte": lambda b: value >= b,
+        "$lt": lambda b: value < b,
+        "$lte": lambda b: value <= b,
+    }
+    return all(checks[op](bound) for op, bound in ranges.items())
+
+
+def _matches(meta: Dict[str, Any], field: str, equals: Optional[List[Any]], ranges: Dict[str, float]) -> bool:
+    """未建索引字段的逐行判断，与倒排索引的语义一致（列表字段任一元素命中即可）。"""
+    if field not in meta:
+        return False
+    items = list(_items(meta[field]))
+    if equals is not None:
+        keys = {_key(item) for item in items}
+        if not any(_key(v) in keys for v in equals if _key(v) is not None):
+            return False
+    if ranges:
+        numbers = [n for n in map(_numeric, items) if n is not None]
+        if not any(_in_range(n, ranges) for n in numbers):
+            return False
+    return True
+
+
+class _Postings:
+    """行号递增写入，天然有序；按需转为 numpy 数组并缓存到下次写入。"""
+
+    __slots__ = ("ids", "_array")
+
+    def __init__(self) -> None:
+        self.ids: List[int] = []
+        self._array: Optional[np.ndarray] = None
+
+    def append(self, row: int) -> None:
+        # 同一行的多值字段可能重复命中同一取值
+        if not self.ids or self.ids[-1] != row:
+            self.ids.append(row)
+            self._array = None
+
+    def array(self) -> np.ndarray:
+        if self._array is None:
+            self._array = np.array(self.ids, dtype=np.int64)
+        return self._array
+
+
+class _RangeColumn:
+    """数值列：(值, 行号) 追加写入，范围查询前按值排序一次，写入后失效。"""
+
+    def __init__(self) -> None:
+        self.values: List[float] = []
+        self.rows: List[int] = []
+        self._sorted: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def append(self, row: int, value: float) -> None:
+        self.values.append(value)
+        self.rows.append(row)
+        self._sorted = None
+
+    def select(self, ops: Dict[str, float]) -> np.ndarray:
+        if self._sorted is None:
+            values = np.asarray(self.values)
+            order = np.argsort(values, kind="stable")
+            self._sorted = (values[order], np.asarray(self.rows, dtype=np.int64)[order])
+        values, rows = self._sorted
+        lo, hi = 0, len(values)
+        for op, bound in ops.items():
+            if op in ("$gt", "$gte"):
+                lo = max(lo, int(np.searchsorted(values, bound, side="right" if op == "$gt" else "left")))
+            else:
+                hi = min(hi, int(np.searchsorted(values, bound, side="left" if op == "$lt" else "right")))
+        if lo >= hi:
+            return _EMPTY
+        return np.unique(rows[lo:hi])
+
+
+class MetadataIndex:
+    """
+    index_fields 中的每个字段一组倒排表（带类型标记的取值 -> 有序行号）及一列数值索引。
+    索引需显式开启：index_fields 为 None 时不建任何索引，where 条件全部退化为逐行扫描。
+    """
+
+    def __init__(self, index_fields: Optional[Sequence[str]] = None) -> None:
+        self.index_fields = set(index_fields or ())
+        self._postings: Dict[str, Dict[Any, _Postings]] = {}
+        self._ranges: Dict[str, _RangeColumn] = {}
+
+    def add(self, row: int, meta: Dict[str, Any]) -> None:
+        for field in self.index_fields.intersection(meta):
+            postings = self._postings.setdefault(field, {})
+            for item in _items(meta[field]):
+                key = _key(item)
+                if key is None:
+                    continue
+                postings.setdefault(key, _Postings()).append(row)
+                number = _numeric(item)
+                if number is not None:
+                    self._ranges.setdefault(field, _RangeColumn()).append(row, number)
+
+    def select(
+        self, where: Optional[Dict[str, Any]], metas: Optional[Sequence[Dict[str, Any]]] = None
+    ) -> Optional[np.ndarray]:
+        """
+        返回满足条件的有序行号；where 为空返回 None（不过滤）。
+        已索引字段先求最小的集合依次求交，未索引字段再对剩余候选（没有索引条件时为 metas 全部行）逐行判断；
+        条件涉及未索引字段时必须传入 metas，否则抛 ValueError。
+        """
+        if not where:
+            return None
+        conditions = {field: _split_condition(field, condition) for field, condition in where.items()}
+        indexed = [self._select_field(f, *c) for f, c in conditions.items() if f in self.index_fields]
+        scanned = [(f, *c) for f, c in conditions.items() if f not in self.index_fields]
+        if scanned and metas is None:
+            fields = sorted(f for f, *_ in scanned)
+            raise ValueError(f"fields {fields} are not in index_fields; pass metas to filter them by scanning")
+        result: Optional[np.ndarray] = None
+        for ids in sorted(indexed, key=len):
+            result = ids if result is None else np.intersect1d(result, ids, assume_unique=True)
+            if not len(result):
+                return result
+        if scanned:
+            candidates: Iterable[int] = range(len(metas)) if result is None else result.tolist()
+            kept = [row for row in candidates if all(_matches(metas[row], *c) for c in scanned)]
+            result = np.array(kept, dtype=np.int64)
+        return result
+
+    def _select_field(self, field: str, equals: Optional[List[Any]], ranges: Dict[str, float]) -> np.ndarray:
+        selected: List[np.ndarray] = []
+        if equals is not None:
+            selected.append(self._equal(field, equals))
+        if ranges:
+            column = self._ranges.get(field)
+            selected.append(column.select(ranges) if column is not None else _EMPTY)
+        if len(selected) == 2:
+            return np.intersect1d(selected[0], selected[1], assume_unique=True)
+        return selected[0]
+
+    def _equal(self, field: str, values: Iterable[Any]) -> np.ndarray:
+        postings = self._postings.get(field, {})
+        keys = [_key(v) for v in values]
+        arrays = [postings[k].array() for k in keys if k is not None and k in postings]
+        if not arrays:
+            return _EMPTY
+        if len(arrays) == 1:
+            return arrays[0]
+        return np.unique(np.concatenate(arrays))
@@ -1,26 +1,127 @@
-from typing import Any, Dict, List, Tuple
-import math
+from typing import Any, Dict, List, Optional, Sequence
 
+import numpy as np
 
-def _cosine(a: List[float], b: List[float]) -> float:
-    dot = sum(x * y for x, y in zip(a, b))
-    na = math.sqrt(sum(x * x for x in a))
-    nb = math.sqrt(sum(x * x for x in b))
-    if na == 0 or nb == 0:
-        return 0.0
-    return dot / (na * nb)
+from vectorstore.filters import MetadataIndex
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """按行 L2 归一化；零向量保持为零（与任意向量的相似度为 0）。"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def _to_matrix(vecs: Sequence[Sequence[float]] | np.ndarray, dim: Optional[int]) -> np.ndarray:
+    """转为 float32 二维副本（归一化在副本上原地进行，不修改调用方数据），并校验维度。"""
+    rows = np.array(vecs, dtype=np.float32, ndmin=2)
+    if rows.size == 0:
+        return rows.reshape(0, dim or 0)
+    if rows.ndim != 2:
+        raise ValueError(f"expected 2-d vectors, got shape {rows.shape}")
+    if dim is not None and rows.shape[1] != dim:
+        raise ValueError(f"vector dim {rows.shape[1]} does not match store dim {dim}")
+    return rows
+
+
+def _top_k(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """对最后一维取分数最高的 top_k 个下标（降序）：argpartition O(N) 选出候选，只对 k 个候选排序。"""
+    n = scores.shape[-1]
+    if top_k < n:
+        candidates = np.argpartition(-scores, top_k - 1, axis=-1)[..., :top_k]
+    else:
+        candidates = np.broadcast_to(np.arange(n), scores.shape[:-1] + (n,))
+    picked = np.take_along_axis(scores, candidates, axis=-1)
+    order = np.argsort(-picked, axis=-1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=-1)
 
 
 class SimpleVectorStore:
-    def __init__(self) -> None:
-        self._items: List[Tuple[List[float], Dict[str, Any]]] = []
+    """
+    内存向量库：向量写入时归一化为 float32 并存入连续矩阵（容量按倍增摊销扩容），
+    余弦相似度查询即一次矩阵-向量乘 + argpartition 取 top-k。
+    query 的 where 过滤（语法见 vectorstore.filters）先求出候选行，只对候选打分：
+    index_fields 中的字段走倒排索引，其余字段（默认不建索引）逐行判断。
+    """
+
+    def __init__(
+        self,
+        dim: Optional[int] = None,
+        initial_capacity: int = 1024,
+        index_fields: Optional[Sequence[str]] = None,
+    ) -> None:
+        self.dim = dim
+        self._initial_capacity = max(1, initial_capacity)
+        self._matrix: Optional[np.ndarray] = None
+        self._size = 0
+        self._metas: List[Dict[str, Any]] = []
+        self._index = MetadataIndex(index_fields)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, vec: Sequence[float], meta: Dict[str, Any]) -> None:
+        self.add_many([vec], [meta])
 
-    def add(self, vec: List[float], meta: Dict[str, Any]) -> None:
-        self._items.append((list(vec), dict(meta)))
+    def add_many(self, vecs: Sequence[Sequence[float]] | np.ndarray, metas: Sequence[Dict[str, Any]]) -> None:
+        rows = _to_matrix(vecs, self.dim)
+        if len(rows) != len(metas):
+            raise ValueError(f"got {len(rows)} vectors but {len(metas)} metas")
+        if not len(rows):
+            return
+        if self.dim is None:
+            # 维度只由第一次写入确定，查询不会改变库的状态
+            self.dim = rows.shape[1]
+        self._reserve(self._size + len(rows))
+        assert self._matrix is not None
+        self._matrix[self._size : self._size + len(rows)] = _normalize_rows(rows)
+        for offset, meta in enumerate(metas):
+            self._metas.append(dict(meta))
+            self._index.add(self._size + offset, meta)
+        self._size += len(rows)
 
-    def query(self, vec: List[float], top_k: int = 3) -> List[Dict[str, Any]]:
-        scored = [(_cosine(vec, v), m) for v, m in self._items]
-        scored.sort(key=lambda x: x[0], reverse=True)
-        return [{"score": s, "meta": m} for s, m in scored[:top_k]]
+    def query(
+        self,
+        vec: Sequence[float],
+        top_k: int = 3,
+        where: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        return self.query_many([vec], top_k=top_k, where=where)[0]
 
+    def query_many(
+        self,
+        vecs: Sequence[Sequence[float]] | np.ndarray,
+        top_k: int = 3,
+        chunk_size: int = 64,
+        where: Optional[Dict[str, Any]] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """批量查询：每 chunk_size 个查询向量做一次矩阵乘，限制中间分数矩阵的内存占用。"""
+        queries = _to_matrix(vecs, self.dim)
+        rows = self._index.select(where, self._metas)
+        if self._size == 0 or top_k <= 0 or (rows is not None and not len(rows)):
+            return [[] for _ in range(len(queries))]
+        assert self._matrix is not None
+        # 有过滤条件时只取出候选行打分，代价与命中子集大小成正比
+        data = self._matrix[: self._size] if rows is None else self._matrix[rows]
+        k = min(top_k, len(data))
+        results: List[List[Dict[str, Any]]] = []
+        for start in range(0, len(queries), chunk_size):
+            chunk = _normalize_rows(queries[start : start + chunk_size])
+            scores = chunk @ data.T
+            indices = _top_k(scores, k)
+            for row_scores, row_idx in zip(scores, indices):
+                ids = row_idx if rows is None else rows[row_idx]
+                results.append(
+                    [{"score": float(row_scores[i]), "meta": self._metas[j]} for i, j in zip(row_idx, ids)]
+                )
+        return results
 
+    def _reserve(self, needed: int) -> None:
+        capacity = 0 if self._matrix is None else len(self._matrix)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, self._initial_capacity)
+        grown = np.zeros((new_capacity, self.dim), dtype=np.float32)
+        if self._matrix is not None:
+            grown[: self._size] = self._matrix[: self._size]
+        self._matrix = grown
@@ -0,0 +1,260 @@
+"""
+持久化向量库：目录内由若干只读段 + 一个追加写 WAL 组成。
+
+    <path>/manifest.json              维度与已封存段列表（原子替换）
+    <path>/seg-000001.npy             归一化 float32 矩阵，np.load(mmap_mode="r") 打开
+    <path>/seg-000001.meta            元数据 JSON 紧凑拼接（不压缩，按偏移随机读取）
+    <path>/seg-000001.offsets.npy     uint64 偏移表，第 i 条元数据为 meta[off[i]:off[i+1]]
+    <path>/wal-000002.log             追加写日志：[u32 元数据长度][dim * f32 向量][元数据 JSON]
+
+启动时只读 manifest 并 memmap 各段，耗时与数据量无关；多个只读进程通过 page cache 共享同一份数据。
+WAL 达到 seal_threshold 条时封存为新段：段文件写完后原子替换 manifest（next_segment + 1）即为提交点，
+之后才切换到新编号的 WAL，因此任意时刻崩溃都不会丢数据或重复数据。
+单写者：同一目录只允许一个 readonly=False 的实例。
+"""
+import json
+import os
+import struct
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from vectorstore.memory import SimpleVectorStore, _normalize_rows, _to_matrix, _top_k
+
+_MANIFEST = "manifest.json"
+_WAL_HEADER = struct.Struct("<I")
+
+
+def _dump_meta(meta: Dict[str, Any]) -> bytes:
+    return json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _fsync_write(path: Path, data: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class _SealedSegment:
+    """只读段：向量与元数据均为 memmap，元数据在命中时才解码。"""
+
+    def __init__(self, root: Path, name: str) -> None:
+        self.name = name
+        self.vectors = np.load(root / f"{name}.npy", mmap_mode="r")
+        self.offsets = np.load(root / f"{name}.offsets.npy", mmap_mode="r")
+        meta_path = root / f"{name}.meta"
+        self.meta = np.memmap(meta_path, dtype=np.uint8, mode="r") if meta_path.stat().st_size else b""
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def get_meta(self, i: int) -> Dict[str, Any]:
+        return json.loads(bytes(self.meta[int(self.offsets[i]) : int(self.offsets[i + 1])]))
+
+    @staticmethod
+    def write(root: Path, name: str, vectors: np.ndarray, metas: Sequence[bytes]) -> None:
+        """先写临时文件并 fsync，再逐个 rename，保证段文件要么完整存在要么不存在。"""
+        offsets = np.zeros(len(metas) + 1, dtype=np.uint64)
+        np.cumsum([len(m) for m in metas], out=offsets[1:])
+        for suffix, writer in (
+            (".npy", lambda f: np.save(f, np.ascontiguousarray(vectors, dtype=np.float32))),
+            (".offsets.npy", lambda f: np.save(f, offsets)),
+            (".meta", lambda f: f.write(b"".join(metas))),
+        ):
+            tmp = root / f"{name}{suffix}.tmp"
+            with open(tmp, "wb") as f:
+                writer(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, root / f"{name}{suffix}")
+
+
+class PersistentVectorStore:
+    def __init__(
+        self,
+        path: str | Path,
+        dim: Optional[int] = None,
+        readonly: bool = False,
+        seal_threshold: int = 10_000,
+        fsync: bool = False,
+    ) -> None:
+        self.root = Path(path)
+        self.readonly = readonly
+        self.seal_threshold = seal_threshold
+        self.fsync = fsync
+        self.dim = dim
+        self._segments: List[_SealedSegment] = []
+        self._next_segment = 1
+        if not readonly:
+            self.root.mkdir(parents=True, exist_ok=True)
+        self._load_manifest()
+        # WAL 尾部数据常驻内存（最多 seal_threshold 条）
+        self._tail = SimpleVectorStore(dim=self.dim)
+        self._tail_raw: List[bytes] = []
+        self._wal = None
+        self._replay_wal()
+        if not readonly:
+            if self.dim is not None and not (self.root / _MANIFEST).exists():
+                self._write_manifest()
+            self._remove_stale()
+            self._wal = open(self._wal_path(), "ab")
+
+    def __len__(self) -> int:
+        return sum(len(s) for s in self._segments) + len(self._tail)
+
+    def add(self, vec: Sequence[float], meta: Dict[str, Any]) -> None:
+        self.add_many([vec], [meta])
+
+    def add_many(self, vecs: Sequence[Sequence[float]] | np.ndarray, metas: Sequence[Dict[str, Any]]) -> None:
+        if self._wal is None:
+            raise RuntimeError("vector store is opened read-only")
+        rows = _to_matrix(vecs, self.dim)
+        if len(rows) != len(metas):
+            raise ValueError(f"got {len(rows)} vectors but {len(metas)} metas")
+        if not len(rows):
+            return
+        if self.dim is None:
+            self.dim = rows.shape[1]
+            self._write_manifest()
+        rows = _normalize_rows(rows)
+        raw = [_dump_meta(m) for m in metas]
+        self._wal.write(b"".join(_WAL_HEADER.pack(len(m)) + r.tobytes() + m for r, m in zip(rows, raw)))
+        self._wal.flush()
+        if self.fsync:
+            os.fsync(self._wal.fileno())
+        self._tail.add_many(rows, metas)
+        self._tail_raw.extend(raw)
+        if len(self._tail) >= self.seal_threshold:
+            self.seal()
+
+    def seal(self) -> None:
+        """把当前 WAL 中的数据封存为新的只读段，并切换到新的 WAL。"""
+        if self._wal is None:
+            raise RuntimeError("vector store is opened read-only")
+        if not len(self._tail):
+            return
+        name = f"seg-{self._next_segment:06d}"
+        _SealedSegment.write(self.root, name, self._tail._matrix[: len(self._tail)], self._tail_raw)
+        self._segments.append(_SealedSegment(self.root, name))
+        self._next_segment += 1
+        # 提交点：manifest 替换前崩溃，新段文件不可见、旧 WAL 仍完整；替换后旧 WAL 即作废
+        self._write_manifest()
+        self._wal.close()
+        os.remove(self._wal_path(self._next_segment - 1))
+        self._wal = open(self._wal_path(), "ab")
+        self._tail = SimpleVectorStore(dim=self.dim)
+        self._tail_raw = []
+
+    def refresh(self) -> bool:
+        """只读实例重新加载 manifest 与 WAL（看到写者最新的封存段与追加），返回条数是否变化。"""
+        before = len(self)
+        self._load_manifest()
+        self._tail = SimpleVectorStore(dim=self.dim)
+        self._tail_raw = []
+        self._replay_wal()
+        return len(self) != before
+
+    def close(self) -> None:
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
+
+    def query(self, vec: Sequence[float], top_k: int = 3) -> List[Dict[str, Any]]:
+        return self.query_many([vec], top_k=top_k)[0]
+
+    def query_many(
+        self,
+        vecs: Sequence[Sequence[float]] | np.ndarray,
+        top_k: int = 3,
+        chunk_size: int = 64,
+    ) -> List[List[Dict[str, Any]]]:
+        queries = _normalize_rows(_to_matrix(vecs, self.dim))
+        if top_k <= 0 or not len(self):
+            return [[] for _ in range(len(queries))]
+        # 每段各取 top_k 候选，再按分数归并
+        candidates: List[List[Tuple[float, Any, Any]]] = [[] for _ in range(len(queries))]
+        for start in range(0, len(queries), chunk_size):
+            chunk = queries[start : start + chunk_size]
+            for segment in self._segments:
+                scores = chunk @ segment.vectors.T
+                for row, (row_scores, idx) in enumerate(zip(scores, _top_k(scores, min(top_k, len(segment))))):
+                    candidates[start + row].extend((float(row_scores[i]), segment, int(i)) for i in idx)
+        if len(self._tail):
+            for row, hits in enumerate(self._tail.query_many(queries, top_k=top_k)):
+                candidates[row].extend((h["score"], None, h["meta"]) for h in hits)
+        results = []
+        for found in candidates:
+            found.sort(key=lambda c: c[0], reverse=True)
+            # 段内命中只记录下标，归并后才解码进入最终 top_k 的元数据；WAL 命中直接携带元数据
+            results.append(
+                [{"score": s, "meta": seg.get_meta(ref) if seg is not None else ref} for s, seg, ref in found[:top_k]]
+            )
+        return results
+
+    def _load_manifest(self) -> None:
+        manifest = self.root / _MANIFEST
+        if not manifest.exists():
+            return
+        data = json.loads(manifest.read_text(encoding="utf-8"))
+        if self.dim is not None and data.get("dim") not in (None, self.dim):
+            raise ValueError(f"store dim {data['dim']} does not match requested dim {self.dim}")
+        self.dim = data.get("dim")
+        loaded = {s.name: s for s in self._segments}
+        self._segments = [loaded.get(name) or _SealedSegment(self.root, name) for name in data["segments"]]
+        self._next_segment = data["next_segment"]
+
+    def _write_manifest(self) -> None:
+        tmp = self.root / f"{_MANIFEST}.tmp"
+        payload = {
+            "version": 1,
+            "dim": self.dim,
+            "segments": [s.name for s in self._segments],
+            "next_segment": self._next_segment,
+        }
+        _fsync_write(tmp, json.dumps(payload).encode("utf-8"))
+        os.replace(tmp, self.root / _MANIFEST)
+
+    def _wal_path(self, number: Optional[int] = None) -> Path:
+        return self.root / f"wal-{number or self._next_segment:06d}.log"
+
+    def _remove_stale(self) -> None:
+        """清理崩溃遗留：已提交段对应的旧 WAL，以及未提交（不在 manifest 中）的段文件。"""
+        live = {s.name for s in self._segments}
+        for file in self.root.iterdir():
+            name = file.name
+            if name.startswith("wal-") and file != self._wal_path():
+                file.unlink()
+            elif name.startswith("seg-") and name.split(".")[0] not in live:
+                file.unlink()
+
+    def _replay_wal(self) -> None:
+        wal = self._wal_path()
+        if not self.dim:
+            return
+        try:
+            data = wal.read_bytes()
+        except FileNotFoundError:
+            # 只读实例与写者封存并发：旧 WAL 已删除，下次 refresh 会读到新段
+            return
+        vec_bytes = self.dim * 4
+        pos, rows, metas, raw = 0, [], [], []
+        while pos + _WAL_HEADER.size <= len(data):
+            (meta_len,) = _WAL_HEADER.unpack_from(data, pos)
+            end = pos + _WAL_HEADER.size + vec_bytes + meta_len
+            if end > len(data):
+                break
+            body = pos + _WAL_HEADER.size
+            rows.append(np.frombuffer(data, dtype=np.float32, count=self.dim, offset=body))
+            raw.append(data[body + vec_bytes : end])
+            metas.append(json.loads(raw[-1]))
+            pos = end
+        if pos < len(data) and not self.readonly:
+            # 末尾是崩溃时写了一半的记录：截掉，之后的追加从完整记录边界开始
+            with open(wal, "r+b") as f:
+                f.truncate(pos)
+        if rows:
+            # WAL 中的向量已归一化，直接写入尾部矩阵
+            self._tail.add_many(np.stack(rows), metas)
+            self._tail_raw.extend(raw)